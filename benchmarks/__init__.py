@@ -0,0 +1,7 @@
+"""
+Бенчмарки ядра (core/ssh_config, core/key_manager) на синтетических ~/.ssh
+
+Запуск из корня репозитория:
+    python -m benchmarks --sizes small,medium --output results.json
+    python -m benchmarks --baseline benchmarks/baseline.json
+"""
@@ -0,0 +1,46 @@
+import argparse
+import sys
+from pathlib import Path
+
+from benchmarks.fixtures import SIZES
+from benchmarks.runner import DEFAULT_THRESHOLD, compare, format_results, load_json, run, save_json
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Бенчмарки core/ssh_config и core/key_manager")
+    parser.add_argument("--sizes", default="small,medium",
+                        help=f"размеры через запятую: {', '.join(SIZES)} (по умолчанию small,medium)")
+    parser.add_argument("--repeat", type=int, default=5, help="повторов каждой операции")
+    parser.add_argument("--output", type=Path, help="куда сохранить результаты (JSON)")
+    parser.add_argument("--baseline", type=Path, help="эталон для поиска регрессий (JSON)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="во сколько раз должен вырасти лучший повтор, чтобы считаться регрессией")
+    parser.add_argument("--save-baseline", action="store_true", help="записать результаты в --baseline")
+    args = parser.parse_args()
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"неизвестные размеры: {', '.join(unknown)}")
+
+    current = run(sizes, args.repeat)
+    print(format_results(current))
+    if args.output:
+        save_json(args.output, current)
+
+    if args.baseline and args.save_baseline:
+        save_json(args.baseline, current)
+        print(f"эталон сохранён: {args.baseline}")
+    elif args.baseline:
+        regressions = compare(current, load_json(args.baseline), args.threshold)
+        for size, op, before, now, ratio in regressions:
+            print(f"[REGRESSION] {size} {op}: {before * 1000:.3f} ms -> {now * 1000:.3f} ms (x{ratio:.2f})")
+        if regressions:
+            return 1
+        print("регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from benchmarks.fixtures import SIZES, TreeSize, host_name, known_host_name, make_ssh_tree
+
+
+# замер считается регрессией, если лучший из повторов (min) вырос больше чем
+# в THRESHOLD раз и при этом больше чем на NOISE_FLOOR секунд. Минимум почти не
+# шумит, поэтому порог относительный, а абсолютный - только на разрешение таймера
+DEFAULT_THRESHOLD = 1.25
+NOISE_FLOOR = 0.00005
+
+Results = Dict[str, Dict[str, Dict[str, float]]]
+
+
+"""
+Переключает модули ssh_key_manager на временный HOME
+
+Пути (~/.ssh, ~/.ssh/config, ~/.ssh/known_hosts ...) вычисляются при импорте модулей, поэтому
+кроме переменной HOME каталог переключается через key_manager.set_ssh_dir и по выходу
+возвращается прежний; кэши сбрасываются
+"""
+@contextmanager
+def temporary_home(home: Path) -> Iterator[None]:
+    from ssh_key_manager.core import key_manager
+
+    saved_env = os.environ.get("HOME")
+    saved_dir = key_manager.SSH_DIR
+    os.environ["HOME"] = str(home)
+    key_manager.set_ssh_dir(home / ".ssh")
+    reset_caches()
+    try:
+        yield
+    finally:
+        key_manager.set_ssh_dir(saved_dir)
+        if saved_env is None:
+            os.environ.pop("HOME", None)
+        else:
+            os.environ["HOME"] = saved_env
+        reset_caches()
+
+
+"""
+Сбрасывает кэши разбора (для замеров «холодного» вызова)
+"""
+def reset_caches() -> None:
+    from ssh_key_manager.core import key_info, key_manager, known_hosts, ssh_config
+
+    ssh_config._documents.clear()
+    known_hosts._documents.clear()
+    key_manager._scan_cache.clear()
+    key_info._info_cache.clear()
+
+
+def _time(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], object]] = None) -> Dict[str, float]:
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    return {"min": min(runs), "median": statistics.median(runs), "max": max(runs), "runs": len(runs)}
+
+
+"""
+Замеры операций ядра на одном синтетическом дереве
+
+Операции, меняющие конфиг, откатывают свои изменения в конце каждого
+повтора, поэтому все повторы идут на одинаковом файле
+"""
+def bench_tree(size: TreeSize, repeat: int) -> Dict[str, Dict[str, float]]:
+    from ssh_key_manager.core import key_manager, known_hosts, ssh_config
+
+    results: Dict[str, Dict[str, float]] = {}
+    # хост из последнего подключённого файла - худший случай поиска
+    last_host = host_name(size.hosts - 1)
+    middle_host = host_name(size.hosts // 2)
+
+    results["list_keys.cold"] = _time(key_manager.list_keys, repeat, setup=reset_caches)
+    results["list_keys.warm"] = _time(key_manager.list_keys, repeat)
+    results["list_key_infos.cold"] = _time(key_manager.list_key_infos, repeat, setup=reset_caches)
+    results["list_key_infos.warm"] = _time(key_manager.list_key_infos, repeat)
+
+    results["read_config.cold"] = _time(ssh_config.read_config, repeat, setup=reset_caches)
+    results["read_config.warm"] = _time(ssh_config.read_config, repeat)
+
+    results["get_host_entry.cold"] = _time(lambda: ssh_config.get_host_entry(last_host), repeat, setup=reset_caches)
+    results["get_host_entry.warm"] = _time(lambda: ssh_config.get_host_entry(last_host), repeat)
+
+    assert ssh_config.get_host_entry(last_host) is not None, last_host
+    original = ssh_config.get_host_entry(middle_host)
+    changed = dict(original, Port="2222")
+    results["add_or_update_host.update"] = _time(lambda: ssh_config.add_or_update_host(changed), repeat,
+                                                 setup=lambda: ssh_config.add_or_update_host(original))
+    ssh_config.add_or_update_host(original)
+
+    new_entry = {"Host": "bench-new-host", "HostName": "192.0.2.1", "User": "bench"}
+    results["add_or_update_host.add"] = _time(lambda: ssh_config.add_or_update_host(new_entry), repeat,
+                                              setup=lambda: ssh_config.delete_host("bench-new-host"))
+    results["delete_host"] = _time(lambda: ssh_config.delete_host("bench-new-host"), repeat,
+                                   setup=lambda: ssh_config.add_or_update_host(new_entry))
+
+    # пакет изменений одной транзакцией против того же числа отдельных вызовов
+    batch = [ssh_config.get_host_entry(host_name(i)) for i in range(min(size.hosts, 100))]
+    batch_changed = [dict(entry, Port="2222") for entry in batch]
+
+    def apply_batch(entries: List[Dict[str, str]]) -> None:
+        with ssh_config.transaction() as tx:
+            for entry in entries:
+                tx.upsert(entry)
+
+    results["transaction.upsert_100"] = _time(lambda: apply_batch(batch_changed), repeat,
+                                              setup=lambda: apply_batch(batch))
+    apply_batch(batch)
+
+    blocks = ssh_config.read_config()
+    results["write_config"] = _time(lambda: ssh_config.write_config(blocks), repeat)
+
+    if size.known_hosts:
+        # две последние строки файла: одна открытая, одна хэшированная
+        last = [known_host_name(size.known_hosts - 1), known_host_name(size.known_hosts - 2)]
+        batch = [known_host_name(i) for i in range(0, size.known_hosts, max(1, size.known_hosts // 10))][:10]
+        doc = known_hosts.load_known_hosts
+        results["known_hosts.load"] = _time(lambda: doc().invalid, repeat, setup=reset_caches)
+        results["known_hosts.lookup.cold"] = _time(lambda: doc().lookup_many(last), repeat,
+                                                   setup=lambda: (reset_caches(), doc().invalid))
+        results["known_hosts.lookup.warm"] = _time(lambda: doc().lookup_many(last), repeat)
+        results["known_hosts.lookup_many.10"] = _time(lambda: doc().lookup_many(batch), repeat,
+                                                      setup=lambda: (reset_caches(), doc().invalid))
+        results["known_hosts.duplicates"] = _time(lambda: doc().duplicates(), repeat,
+                                                  setup=lambda: (reset_caches(), doc().invalid))
+    return results
+
+
+"""
+Прогоняет бенчмарки для перечисленных размеров, каждый во временном HOME
+"""
+def run(sizes: List[str], repeat: int) -> dict:
+    results: Results = {}
+    for name in sizes:
+        home = Path(tempfile.mkdtemp(prefix=f"ssh-km-bench-{name}-"))
+        try:
+            make_ssh_tree(home, SIZES[name])
+            with temporary_home(home):
+                results[name] = bench_tree(SIZES[name], repeat)
+        finally:
+            shutil.rmtree(home, ignore_errors=True)
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "sizes": {name: SIZES[name]._asdict() for name in sizes},
+        },
+        "results": results,
+    }
+
+
+"""
+Сравнение с сохранённым эталоном
+
+Возвращает [(размер, операция, эталон, сейчас, отношение)] для замеров,
+лучший повтор которых вырос больше порога
+"""
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[str, str, float, float, float]]:
+    regressions = []
+    for size, ops in current["results"].items():
+        base_ops = baseline.get("results", {}).get(size, {})
+        for op, stats in ops.items():
+            base = base_ops.get(op)
+            if base is None:
+                continue
+            now, before = stats["min"], base["min"]
+            if now - before > NOISE_FLOOR and now > before * threshold:
+                regressions.append((size, op, before, now, now / before if before else float("inf")))
+    return regressions
+
+
+def format_results(current: dict) -> str:
+    lines = []
+    for size, ops in current["results"].items():
+        lines.append(f"[{size}] {SIZES[size]._asdict()}")
+        for op, stats in ops.items():
+            lines.append(f"  {op:<28} median {stats['median'] * 1000:9.3f} ms   min {stats['min'] * 1000:9.3f} ms")
+    return "\n".join(lines)
+
+
+def load_json(path: Path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_json(path: Path, data: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
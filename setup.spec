@@ -10,7 +10,6 @@ Source:         https://github.com/threenet3/ssh_key_manager/archive/refs/tags/%
 BuildArch:      noarch
 BuildRequires:  python3-devel
 BuildRequires:  pyproject-rpm-macros
-BuildRequires:  python3dist(pillow)
 BuildRequires:  python3dist(pyperclip)
 
 %global _description %{expand:
@@ -22,7 +21,6 @@ SSH Key Manager — это графическая утилита для гене
 %package -n python3-ssh-key-manager
 Summary:        %{summary}
 Recommends:     python3dist(pyperclip)
-Recommends:     python3dist(pillow)
 
 %description -n python3-ssh-key-manager %_description
 
@@ -45,6 +43,7 @@ Recommends:     python3dist(pillow)
 %doc README.md
 %license LICENSE
 %{_bindir}/ssh-key-manager
+%{_bindir}/ssh-key-manager-cli
 
 %changelog
 * Wed Jun 25 2025 Vsevolod <v.mikh3@gmail.com> - 1.0.1-1
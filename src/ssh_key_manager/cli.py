@@ -0,0 +1,492 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+
+"""
+Ошибка команды: печатается как {"ok": false, "error": ...}, код выхода 1
+"""
+class CommandError(Exception):
+    pass
+
+
+def _parse_options(pairs: List[str]) -> Dict[str, str]:
+    options = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep or not key.strip():
+            raise CommandError(f"параметр должен быть в виде Ключ=Значение: {pair}")
+        options[key.strip()] = value.strip()
+    return options
+
+
+# --- ключи ---
+
+def cmd_list(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import key_manager
+
+    if not args.info:
+        return {"keys": key_manager.list_keys()}
+    return {"keys": [info._asdict() for info in key_manager.list_key_infos()]}
+
+
+def cmd_generate(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import key_manager
+
+    passphrase = sys.stdin.readline().rstrip("\n") if args.passphrase_stdin else None
+    specs = [key_manager.KeySpec(name, args.type, passphrase, args.comment, args.bits) for name in args.names]
+    try:
+        results = key_manager.generate_keypairs(specs, max_workers=args.jobs)
+    except ValueError as e:
+        raise CommandError(str(e))
+    failed = [r.key_name for r in results if not r.success]
+    if failed:
+        raise CommandError(f"не удалось создать: {', '.join(failed)}")
+    return {"generated": [r.key_name for r in results]}
+
+
+def cmd_delete(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import key_manager
+
+    ssh_dir = key_manager.SSH_DIR
+    if not (ssh_dir / args.name).exists() and not (ssh_dir / f"{args.name}.pub").exists():
+        raise CommandError(f"ключ не найден: {args.name}")
+    if not key_manager.delete_keypair(args.name):
+        raise CommandError(f"не удалось удалить ключ: {args.name}")
+    return {"deleted": args.name}
+
+
+def cmd_show_pub(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import key_manager
+
+    pubkey = key_manager.get_public_key(args.name)
+    if pubkey is None:
+        raise CommandError(f"публичный ключ не найден: {args.name}")
+    return {"name": args.name, "public_key": pubkey}
+
+
+def cmd_usage(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import key_manager, key_usage
+
+    if args.unused:
+        return {"unused": key_usage.unused_keys(include_defaults=args.include_defaults)}
+    names = args.names or key_manager.list_keys()
+    return {"usage": {name: [{"host": ref.host, "block": ref.label, "file": str(ref.source),
+                              "identity_file": ref.identity}
+                             for ref in key_usage.references(name)] for name in names}}
+
+
+def cmd_rotate(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import rotation
+
+    plan = rotation.plan_rotation(args.names, key_type=args.type, bits=args.bits, comment=args.comment,
+                                  allow_defaults=args.allow_default)
+    if args.dry_run:
+        return {"dry_run": True, **plan.to_json()}
+    if plan.problems:
+        raise CommandError("; ".join(f"{name}: {problem}" for name, problem in plan.problems.items()))
+    passphrase = sys.stdin.readline().rstrip("\n") if args.passphrase_stdin else None
+    try:
+        result = rotation.rotate(plan, passphrase=passphrase, max_workers=args.jobs)
+    except RuntimeError as e:
+        raise CommandError(str(e))
+    return result._asdict()
+
+
+# --- хосты ---
+
+def _host_entry(args: argparse.Namespace) -> Dict[str, str]:
+    entry = {"Host": args.name}
+    for option, value in (("HostName", args.hostname), ("User", args.user),
+                          ("Port", args.port), ("IdentityFile", args.identity_file)):
+        if value is not None:
+            entry[option] = str(value)
+    entry.update(_parse_options(args.option))
+    return entry
+
+
+def _upsert(tx, entry: Dict[str, str], prefix: str = "") -> bool:
+    # недопустимые имена и переводы строк в значениях отклоняет сама транзакция
+    try:
+        return tx.upsert(entry)
+    except ValueError as e:
+        raise CommandError(f"{prefix}{e}")
+
+
+def cmd_host_get(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import ssh_config
+
+    entry = ssh_config.get_host_entry(args.name)
+    if entry is None:
+        raise CommandError(f"хост не найден: {args.name}")
+    return {"host": entry}
+
+
+def cmd_host_add(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import ssh_config
+    from ssh_key_manager.utils import validators
+
+    if not validators.is_valid_host_alias(args.name):
+        raise CommandError(f"недопустимое имя Host: {args.name}")
+    entry = _host_entry(args)
+    # проверка и запись под одной блокировкой конфига
+    with ssh_config.transaction() as tx:
+        if tx.get(args.name) is not None:
+            raise CommandError(f"хост уже существует: {args.name}")
+        _upsert(tx, entry)
+    return {"added": entry}
+
+
+def cmd_host_update(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import ssh_config
+
+    entry = _host_entry(args)
+    with ssh_config.transaction() as tx:
+        current = tx.get(args.name)
+        if current is None:
+            raise CommandError(f"хост не найден: {args.name}")
+        if not args.replace:
+            # без --replace остальные параметры блока сохраняются
+            # (ключи ssh-конфига сравниваются без учёта регистра)
+            changed = {key.lower() for key in entry}
+            entry = {**{k: v for k, v in current.items() if k.lower() not in changed}, **entry}
+        _upsert(tx, entry)
+    return {"updated": entry}
+
+
+def cmd_host_delete(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import ssh_config
+
+    if not ssh_config.delete_host(args.name):
+        raise CommandError(f"хост не найден: {args.name}")
+    return {"deleted": args.name}
+
+
+"""
+Пакет изменений из JSON (файл или "-" для stdin) одной транзакцией:
+[{"op": "upsert", "host": {"Host": ..., ...}}, {"op": "delete", "name": ...}]
+"""
+def cmd_host_apply(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import ssh_config
+
+    try:
+        if args.file == "-":
+            changes = json.load(sys.stdin)
+        else:
+            with open(args.file, "r", encoding="utf-8") as f:
+                changes = json.load(f)
+    except ValueError as e:
+        raise CommandError(f"некорректный JSON: {e}")
+    if not isinstance(changes, list):
+        raise CommandError("ожидается список изменений")
+
+    added, updated, deleted, missing = [], [], [], []
+    with ssh_config.transaction() as tx:
+        for n, change in enumerate(changes):
+            op = change.get("op") if isinstance(change, dict) else None
+            if op == "upsert" and isinstance(change.get("host"), dict) and change["host"].get("Host"):
+                entry = {str(k): str(v) for k, v in change["host"].items()}
+                (added if _upsert(tx, entry, f"изменение #{n}: ") else updated).append(entry["Host"])
+            elif op == "delete" and change.get("name"):
+                (deleted if tx.delete(change["name"]) else missing).append(change["name"])
+            else:
+                raise CommandError(f"изменение #{n}: нужен op=upsert с host или op=delete с name")
+    return {"added": added, "updated": updated, "deleted": deleted, "missing": missing}
+
+
+def cmd_lint(args: argparse.Namespace) -> Any:
+    from pathlib import Path
+    from ssh_key_manager.core import lint
+
+    issues = lint.lint(Path(args.file) if args.file else None)
+    if args.severity:
+        wanted = lint.SEVERITIES[:lint.SEVERITIES.index(args.severity) + 1]
+        issues = [item for item in issues if item.severity in wanted]
+    return {"issues": [{**item._asdict(), "path": str(item.path)} for item in issues],
+            "counts": lint.summarize(issues)}
+
+
+# --- known_hosts ---
+
+def _known_host(entry) -> Dict[str, Any]:
+    return {"line": entry.line, "marker": entry.marker, "hosts": entry.hosts,
+            "key_type": entry.key_type, "key": entry.key, "comment": entry.comment}
+
+
+def cmd_known_list(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import known_hosts
+
+    return {"entries": [_known_host(e) for e in known_hosts.list_known_hosts(args.file)]}
+
+
+def cmd_known_find(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import known_hosts
+
+    doc = known_hosts.load_known_hosts(args.file)
+    names = [known_hosts.host_key_name(host, args.port) for host in args.hosts]
+    # все имена ищутся одним проходом по солям хэшированных строк
+    found = doc.lookup_many(names)
+    return {"found": {name: [_known_host(e) for e in found[name]] for name in names}}
+
+
+def cmd_known_remove(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import known_hosts
+
+    removed = known_hosts.remove_host(args.host, args.port, args.file)
+    if not removed:
+        raise CommandError(f"хост не найден в known_hosts: {args.host}")
+    return {"removed": removed}
+
+
+def cmd_known_dedupe(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import known_hosts
+
+    return {"removed": known_hosts.dedupe(args.names, args.file)}
+
+
+def cmd_known_prune(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import known_hosts
+
+    if args.host is None and args.keep is None:
+        return {"removed": known_hosts.remove_stale(args.file)}
+    if args.host is None or args.keep is None:
+        raise CommandError("--host и --keep указываются вместе")
+    try:
+        return {"removed": known_hosts.remove_superseded(args.host, args.keep, args.port, args.file)}
+    except ValueError as e:
+        raise CommandError(str(e))
+
+
+# --- authorized_keys ---
+
+def cmd_authorized_list(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import authorized_keys
+
+    doc = authorized_keys.load_authorized_keys(args.file)
+    return {"entries": [{"line": e.line, "options": e.options, "key_type": e.key_type,
+                         "fingerprint": e.fingerprint, "comment": e.comment} for e in doc.entries],
+            "invalid_lines": [number for number, _, _ in doc.invalid]}
+
+
+def cmd_authorized_add(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import authorized_keys
+
+    statuses = authorized_keys.add_inventory_keys(args.names, args.options, args.file)
+    missing = [name for name, status in statuses.items() if status in ("missing", "invalid")]
+    if missing:
+        raise CommandError(f"нет публичного ключа: {', '.join(missing)}")
+    return {"keys": statuses}
+
+
+def cmd_authorized_remove(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import authorized_keys
+
+    return {"removed": authorized_keys.remove_inventory_keys(args.names, args.file)}
+
+
+def cmd_authorized_dedupe(args: argparse.Namespace) -> Any:
+    from ssh_key_manager.core import authorized_keys
+
+    return {"removed": authorized_keys.dedupe(args.file)}
+
+
+# --- инвентаризация ---
+
+def cmd_scan(args: argparse.Namespace) -> Any:
+    import itertools
+    from pathlib import Path
+    from ssh_key_manager.core import inventory, key_manager
+
+    roots = [Path(root) for root in args.roots]
+    sources = [roots] + [inventory.find_roots(Path(base)) for base in args.homes]
+    if not args.roots and not args.homes:
+        sources = [[key_manager.SSH_DIR]]
+    items = inventory.scan(itertools.chain.from_iterable(sources), workers=args.jobs or inventory.DEFAULT_WORKERS)
+    # записи идут потоком по одной строке JSON, итог - последней строкой
+    if args.output and args.output != "-":
+        with open(args.output, "w", encoding="utf-8") as out:
+            keys, errors = inventory.write_jsonl(items, out)
+    else:
+        keys, errors = inventory.write_jsonl(items, sys.stdout)
+    return {"keys": keys, "errors": errors}
+
+
+def _add_host_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("name", help="имя Host")
+    parser.add_argument("--hostname", help="HostName")
+    parser.add_argument("--user", help="User")
+    parser.add_argument("--port", type=int, help="Port")
+    parser.add_argument("--identity-file", help="IdentityFile")
+    parser.add_argument("-o", "--option", action="append", default=[], metavar="КЛЮЧ=ЗНАЧЕНИЕ",
+                        help="любой другой параметр (можно несколько раз)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="ssh-key-manager-cli",
+                                     description="Управление SSH-ключами и ~/.ssh/config без графического интерфейса")
+    parser.add_argument("--audit-log", action="store_true",
+                        help="писать действия в журнал ~/.ssh/ssh-gui.log (как SSH_KEY_MANAGER_AUDIT_LOG=1)")
+    commands = parser.add_subparsers(dest="command", metavar="КОМАНДА")
+    commands.required = True
+
+    p = commands.add_parser("list", help="список ключей")
+    p.add_argument("--info", action="store_true", help="с типом, размером, отпечатками и комментарием")
+    p.set_defaults(func=cmd_list)
+
+    p = commands.add_parser("generate", help="создать один или несколько ключей")
+    p.add_argument("names", nargs="+", metavar="ИМЯ")
+    p.add_argument("-t", "--type", default="ed25519", help="тип ключа (по умолчанию ed25519)")
+    p.add_argument("-C", "--comment", default="", help="комментарий")
+    p.add_argument("-b", "--bits", type=int, help="размер ключа")
+    p.add_argument("-j", "--jobs", type=int, help="сколько ssh-keygen запускать одновременно")
+    p.add_argument("--passphrase-stdin", action="store_true", help="прочитать пароль из первой строки stdin")
+    p.set_defaults(func=cmd_generate)
+
+    p = commands.add_parser("delete", help="удалить пару ключей")
+    p.add_argument("name", metavar="ИМЯ")
+    p.set_defaults(func=cmd_delete)
+
+    p = commands.add_parser("show-pub", help="показать публичный ключ")
+    p.add_argument("name", metavar="ИМЯ")
+    p.set_defaults(func=cmd_show_pub)
+
+    p = commands.add_parser("usage", help="какие хосты ссылаются на ключи (IdentityFile)")
+    p.add_argument("names", nargs="*", metavar="ИМЯ", help="ключи (по умолчанию все)")
+    p.add_argument("--unused", action="store_true", help="только ключи, которые не использует ни один хост")
+    p.add_argument("--include-defaults", action="store_true",
+                   help="с --unused: считать и id_ed25519 и т.п., которые ssh пробует сам")
+    p.set_defaults(func=cmd_usage)
+
+    p = commands.add_parser("rotate", help="заменить ключи: новые пары, IdentityFile на них, старые в архив")
+    p.add_argument("names", nargs="+", metavar="ИМЯ")
+    p.add_argument("--dry-run", action="store_true", help="только показать план")
+    p.add_argument("-t", "--type", help="тип новых ключей (по умолчанию как у старых)")
+    p.add_argument("-b", "--bits", type=int, help="размер новых ключей")
+    p.add_argument("-C", "--comment", help="комментарий (по умолчанию как у старых)")
+    p.add_argument("-j", "--jobs", type=int, help="сколько ssh-keygen запускать одновременно")
+    p.add_argument("--passphrase-stdin", action="store_true", help="прочитать пароль из первой строки stdin")
+    p.add_argument("--allow-default", action="store_true",
+                   help="заменять и id_ed25519 и т.п. без IdentityFile (ssh перестанет пробовать их сам)")
+    p.set_defaults(func=cmd_rotate)
+
+    p = commands.add_parser("scan", help="инвентаризация ключей во многих каталогах (JSON lines)")
+    p.add_argument("roots", nargs="*", metavar="КАТАЛОГ", help="каталоги ssh (по умолчанию ~/.ssh)")
+    p.add_argument("--homes", action="append", default=[], metavar="КАТАЛОГ",
+                   help="сканировать КАТАЛОГ/*/.ssh, например /home (можно несколько раз)")
+    p.add_argument("-j", "--jobs", type=int, help="сколько каталогов читать одновременно (по умолчанию 8)")
+    p.add_argument("-o", "--output", help="файл для записей (по умолчанию stdout)")
+    p.set_defaults(func=cmd_scan)
+
+    p = commands.add_parser("lint", help="проверить ~/.ssh/config (повторы, перекрытые блоки, ошибки)")
+    p.add_argument("--file", help="конфиг (по умолчанию ~/.ssh/config)")
+    p.add_argument("--severity", choices=("error", "warning", "info"),
+                   help="показывать проблемы этого уровня и серьёзнее")
+    p.set_defaults(func=cmd_lint)
+
+    host = commands.add_parser("host", help="работа с блоками Host в ~/.ssh/config")
+    host_commands = host.add_subparsers(dest="host_command", metavar="ДЕЙСТВИЕ")
+    host_commands.required = True
+
+    p = host_commands.add_parser("get", help="параметры хоста")
+    p.add_argument("name", help="имя Host")
+    p.set_defaults(func=cmd_host_get)
+
+    p = host_commands.add_parser("add", help="добавить хост")
+    _add_host_options(p)
+    p.set_defaults(func=cmd_host_add)
+
+    p = host_commands.add_parser("update", help="изменить параметры хоста")
+    _add_host_options(p)
+    p.add_argument("--replace", action="store_true", help="заменить блок целиком, а не дополнить")
+    p.set_defaults(func=cmd_host_update)
+
+    p = host_commands.add_parser("delete", help="удалить хост")
+    p.add_argument("name", help="имя Host")
+    p.set_defaults(func=cmd_host_delete)
+
+    p = host_commands.add_parser("apply", help="применить пакет изменений из JSON одной записью")
+    p.add_argument("file", help='файл с изменениями или "-" для stdin')
+    p.set_defaults(func=cmd_host_apply)
+
+    known = commands.add_parser("known-hosts", help="работа с ~/.ssh/known_hosts")
+    known.add_argument("--file", help="другой файл known_hosts")
+    known_commands = known.add_subparsers(dest="known_command", metavar="ДЕЙСТВИЕ")
+    known_commands.required = True
+
+    p = known_commands.add_parser("list", help="все строки с ключами")
+    p.set_defaults(func=cmd_known_list)
+
+    p = known_commands.add_parser("find", help="ключи хостов (в том числе хэшированные строки)")
+    p.add_argument("hosts", nargs="+", metavar="ХОСТ")
+    p.add_argument("-p", "--port", type=int, default=22)
+    p.set_defaults(func=cmd_known_find)
+
+    p = known_commands.add_parser("remove", help="удалить ключи хоста (как ssh-keygen -R)")
+    p.add_argument("host", metavar="ХОСТ")
+    p.add_argument("-p", "--port", type=int, default=22)
+    p.set_defaults(func=cmd_known_remove)
+
+    p = known_commands.add_parser("dedupe", help="удалить повторяющиеся строки")
+    p.add_argument("names", nargs="*", metavar="ИМЯ",
+                   help="имена, под которыми искать хэшированные строки")
+    p.set_defaults(func=cmd_known_dedupe)
+
+    p = known_commands.add_parser("prune", help="удалить испорченные строки; с --host и --keep - "
+                                                "другие ключи того же типа у хоста")
+    p.add_argument("--host", metavar="ХОСТ", help="хост, у которого оставить один ключ")
+    p.add_argument("--keep", metavar="КЛЮЧ", help="ключ, который оставить: 'тип base64'")
+    p.add_argument("-p", "--port", type=int, default=22)
+    p.set_defaults(func=cmd_known_prune)
+
+    authorized = commands.add_parser("authorized-keys", help="работа с ~/.ssh/authorized_keys")
+    authorized.add_argument("--file", help="другой файл authorized_keys")
+    authorized_commands = authorized.add_subparsers(dest="authorized_command", metavar="ДЕЙСТВИЕ")
+    authorized_commands.required = True
+
+    p = authorized_commands.add_parser("list", help="ключи с опциями и отпечатками")
+    p.set_defaults(func=cmd_authorized_list)
+
+    p = authorized_commands.add_parser("add", help="добавить ключи из ~/.ssh одной записью")
+    p.add_argument("names", nargs="+", metavar="ИМЯ")
+    p.add_argument("--options", help='опции новых строк, например from="10.0.0.0/8",no-pty')
+    p.set_defaults(func=cmd_authorized_add)
+
+    p = authorized_commands.add_parser("remove", help="удалить ключи из ~/.ssh")
+    p.add_argument("names", nargs="+", metavar="ИМЯ")
+    p.set_defaults(func=cmd_authorized_remove)
+
+    p = authorized_commands.add_parser("dedupe", help="удалить повторы ключей")
+    p.set_defaults(func=cmd_authorized_dedupe)
+
+    return parser
+
+
+"""
+Консольный интерфейс без Tk и Pillow (ssh-key-manager-cli)
+
+Модули core и utils импортируются только внутри команд, поэтому запуск
+стоит десятки миллисекунд и подходит для вызова из систем управления
+конфигурацией. Результат любой команды печатается одной строкой JSON
+"""
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.audit_log:
+        from ssh_key_manager.utils import audit_log
+
+        audit_log.set_enabled(True)
+    try:
+        result = args.func(args)
+    except (CommandError, OSError) as e:
+        print(json.dumps({"ok": False, "error": str(e)}, ensure_ascii=False))
+        return 1
+    except Exception as e:
+        # вызывающая сторона разбирает stdout: даже непредвиденная ошибка - это JSON, а не трассировка
+        print(json.dumps({"ok": False, "error": f"{type(e).__name__}: {e}"}, ensure_ascii=False))
+        return 1
+    print(json.dumps({"ok": True, **result}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import asyncio
+import functools
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ssh_key_manager.core import host_resolver, key_manager, ssh_config
+from ssh_key_manager.core.key_info import KeyInfo
+from ssh_key_manager.core.key_manager import KeyResult, KeySpec
+from ssh_key_manager.utils import audit_log
+
+
+# сколько ssh-keygen может работать одновременно
+MAX_KEYGEN_PROCESSES = os.cpu_count() or 1
+
+# размер пула потоков для файловых операций с ключами
+MAX_IO_WORKERS = 8
+
+# файловые операции идут в пуле потоков, чтобы не блокировать цикл событий;
+# изменения ssh-конфига - строго по очереди в одном потоке (кэш разобранных
+# файлов не рассчитан на параллельный доступ)
+_io_pool: Optional[ThreadPoolExecutor] = None
+_config_pool: Optional[ThreadPoolExecutor] = None
+
+# семафоры привязаны к циклу событий, поэтому создаются для каждого цикла
+_keygen_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _pools() -> Tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+    global _io_pool, _config_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=MAX_IO_WORKERS, thread_name_prefix="ssh-km-aio")
+        _config_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ssh-km-aio-config")
+    return _io_pool, _config_pool
+
+
+def _keygen_limit() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _keygen_limits.get(loop)
+    if semaphore is None:
+        semaphore = _keygen_limits[loop] = asyncio.Semaphore(MAX_KEYGEN_PROCESSES)
+    return semaphore
+
+
+async def _io(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pools()[0], functools.partial(fn, *args, **kwargs))
+
+
+async def _config(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pools()[1], functools.partial(fn, *args, **kwargs))
+
+
+"""
+Останавливает пулы потоков (например, при завершении демона)
+"""
+def shutdown(wait: bool = True) -> None:
+    global _io_pool, _config_pool
+    for pool in (_io_pool, _config_pool):
+        if pool is not None:
+            pool.shutdown(wait=wait)
+    _io_pool = _config_pool = None
+
+
+# --- ключи ---
+
+"""
+Генерация пары ключей (как key_manager.generate_keypair)
+
+Ожидание ssh-keygen не блокирует цикл событий; при отмене корутины
+процесс завершается, а недописанные файлы удаляются
+"""
+async def generate_keypair(key_name: str,
+                           key_type: str = "ed25519",
+                           passphrase: Optional[str] = None,
+                           comment: str = "",
+                           bits: Optional[int] = None) -> bool:
+    async with _keygen_limit():
+        with audit_log.timed("key.generate", name=key_name, key_type=key_type, bits=bits) as record:
+            record["ok"] = await _run_keygen(key_name, key_type, passphrase, comment, bits)
+            return record["ok"]
+
+
+async def _run_keygen(key_name: str, key_type: str, passphrase: Optional[str], comment: str,
+                      bits: Optional[int]) -> bool:
+    args, existed = await _io(key_manager.prepare_keygen, key_name, key_type, passphrase, comment, bits)
+    try:
+        # stdin закрыт: ssh-keygen не должен ждать ответа на вопросы
+        proc = await asyncio.create_subprocess_exec(*args, stdin=asyncio.subprocess.DEVNULL,
+                                                    stdout=asyncio.subprocess.PIPE,
+                                                    stderr=asyncio.subprocess.PIPE)
+    except Exception as e:
+        print(f"[ERROR] generate_keypair: {e}")
+        return False
+
+    try:
+        await proc.communicate()
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        await _io(key_manager.remove_new_files, existed)
+        raise
+    return proc.returncode == 0
+
+
+"""
+Пакетная генерация (как key_manager.generate_keypairs)
+
+Весь пакет сначала проверяется; при ошибке не создаётся ни один ключ
+и выбрасывается ValueError. Параллельность ограничена MAX_KEYGEN_PROCESSES
+"""
+async def generate_keypairs(specs: Iterable[KeySpec]) -> List[KeyResult]:
+    specs = [KeySpec(*spec) if not isinstance(spec, KeySpec) else spec for spec in specs]
+    problems = await _io(key_manager.validate_key_specs, specs)
+    if problems:
+        details = "; ".join(f"{name}: {problem}" for name, problem in problems.items())
+        raise ValueError(f"некорректный пакет ключей: {details}")
+
+    async def run(spec: KeySpec) -> KeyResult:
+        try:
+            success = await generate_keypair(spec.key_name, spec.key_type, spec.passphrase,
+                                             spec.comment, spec.bits)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return KeyResult(spec.key_name, False, str(e))
+        return KeyResult(spec.key_name, success, "" if success else "ssh-keygen завершился с ошибкой")
+
+    workers = min(MAX_KEYGEN_PROCESSES, len(specs))
+    with audit_log.timed("key.generate_batch", count=len(specs), workers=workers) as record:
+        results = list(await asyncio.gather(*(run(spec) for spec in specs)))
+        record["failed"] = sum(1 for r in results if not r.success)
+        record["ok"] = record["failed"] == 0
+    return results
+
+
+async def list_keys() -> List[str]:
+    return await _io(key_manager.list_keys)
+
+
+async def list_key_infos() -> List[KeyInfo]:
+    return await _io(key_manager.list_key_infos)
+
+
+async def get_key_info(key_name: str) -> KeyInfo:
+    return await _io(key_manager.get_key_info, key_name)
+
+
+async def get_public_key(key_name: str) -> Optional[str]:
+    return await _io(key_manager.get_public_key, key_name)
+
+
+async def key_exists(key_name: str) -> bool:
+    return await _io(key_manager.key_exists, key_name)
+
+
+async def delete_keypair(key_name: str) -> bool:
+    return await _io(key_manager.delete_keypair, key_name)
+
+
+# --- ssh-конфиг (все операции по очереди в одном потоке) ---
+
+async def read_config() -> List[ssh_config.Block]:
+    return await _config(ssh_config.read_config)
+
+
+async def get_host_entry(host_name: str) -> Optional[Dict[str, str]]:
+    return await _config(ssh_config.get_host_entry, host_name)
+
+
+async def add_or_update_host(new_entry: Dict[str, str]) -> None:
+    await _config(ssh_config.add_or_update_host, new_entry)
+
+
+async def delete_host(host_name: str) -> bool:
+    return await _config(ssh_config.delete_host, host_name)
+
+
+async def replace_block_text(block: ssh_config.Block, text: str, path: Optional[Path] = None) -> None:
+    await _config(ssh_config.replace_block_text, block, text, path)
+
+
+"""
+Итоговые параметры подключения к хосту (как ssh -G)
+"""
+async def resolve_host(host: str, path: Optional[Path] = None) -> host_resolver.Options:
+    return await _config(host_resolver.resolve_host, host, path)
@@ -0,0 +1,362 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from ssh_key_manager.core.key_info import parse_public_line
+from ssh_key_manager.utils import audit_log
+from ssh_key_manager.utils.filesystem import splice_file
+
+# authorized_keys текущего пользователя
+AUTHORIZED_KEYS_PATH = Path.home() / ".ssh" / "authorized_keys"
+
+# поле опций в начале строки: без пробелов вне кавычек, \" внутри кавычек
+OPTIONS_REGEX = re.compile(r'(?:[^\s"]|"(?:[^"\\]|\\.)*")+')
+
+# одна опция: имя или имя="значение"
+OPTION_REGEX = re.compile(r'([A-Za-z0-9_-]+)(?:="((?:[^"\\]|\\.)*)")?(?:,|$)')
+
+
+"""
+Строка authorized_keys с ключом
+
+options - поле опций как в файле (command="...",no-pty) или None,
+line - номер строки (с 1), start / end - байтовые смещения строки в файле,
+digest - SHA256 блоба ключа (по нему ищутся повторы)
+"""
+class AuthorizedKey(NamedTuple):
+    line: int
+    options: Optional[str]
+    key_type: str
+    key: str
+    comment: str
+    start: int
+    end: int
+    digest: bytes
+
+    @property
+    def fingerprint(self) -> str:
+        return "SHA256:" + base64.b64encode(self.digest).decode("ascii").rstrip("=")
+
+    """
+    Опции строки: [(имя, значение или None)]
+    """
+    @property
+    def option_list(self) -> List[Tuple[str, Optional[str]]]:
+        return parse_options(self.options or "")
+
+    """
+    Строка для записи в файл (без перевода строки)
+    """
+    def format(self) -> str:
+        return format_line(self.key_type, self.key, self.comment, self.options)
+
+
+def parse_options(options: str) -> List[Tuple[str, Optional[str]]]:
+    return [(m.group(1), m.group(2).replace('\\"', '"') if m.group(2) is not None else None)
+            for m in OPTION_REGEX.finditer(options)]
+
+
+def format_line(key_type: str, key: str, comment: str = "", options: Optional[str] = None) -> str:
+    parts = [options] if options else []
+    parts += [key_type, key]
+    if comment:
+        parts.append(comment)
+    return " ".join(parts)
+
+
+def _key_blob(key_type: str, key: str) -> Optional[bytes]:
+    # как sshd: ключом считается пара "алгоритм base64", где блоб начинается с того же алгоритма
+    try:
+        blob = binascii.a2b_base64(key)
+    except (binascii.Error, ValueError):
+        return None
+    if len(blob) < 4:
+        return None
+    (size,) = struct.unpack(">I", blob[:4])
+    if blob[4:4 + size] != key_type.encode("ascii", errors="replace"):
+        return None
+    return blob
+
+
+"""
+Разбирает строку authorized_keys: [опции] алгоритм base64 [комментарий]
+
+Возвращает AuthorizedKey, None для пустых строк и комментариев
+и False для строк, в которых не нашлось ключа
+"""
+def parse_line(text: str, line: int = 0, start: int = 0, end: int = 0):
+    stripped = text.strip()
+    if not stripped or stripped.startswith("#"):
+        return None
+    options = None
+    fields = stripped.split(None, 2)
+    blob = _key_blob(fields[0], fields[1]) if len(fields) >= 2 else None
+    if blob is None:
+        # первое поле - не алгоритм, значит опции
+        m = OPTIONS_REGEX.match(stripped)
+        if m is None:
+            return False
+        options = m.group(0)
+        fields = stripped[m.end():].split(None, 2)
+        if len(fields) < 2:
+            return False
+        blob = _key_blob(fields[0], fields[1])
+        if blob is None:
+            return False
+    comment = fields[2] if len(fields) > 2 else ""
+    return AuthorizedKey(line, options, fields[0], fields[1], comment, start, end,
+                         hashlib.sha256(blob).digest())
+
+
+def _scan(f) -> Iterator[Tuple[int, int, int, object]]:
+    pos = 0
+    for number, raw in enumerate(f, 1):
+        start = pos
+        pos += len(raw)
+        yield number, start, pos, parse_line(raw.decode("utf-8", errors="replace"), number, start, pos)
+
+
+"""
+Потоково читает authorized_keys и отдаёт строки с ключами по одной
+
+В памяти держится только текущая строка
+"""
+def iter_authorized_keys(path: Optional[Path] = None) -> Iterator[AuthorizedKey]:
+    path = Path(path) if path is not None else AUTHORIZED_KEYS_PATH
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        for _, _, _, entry in _scan(f):
+            if entry:
+                yield entry
+
+
+"""
+Разобранный authorized_keys с индексом SHA256(блоб) -> строки
+
+Файл читается потоково и перечитывается, только если изменились inode,
+размер или mtime. Повтор ключа проверяется по индексу за O(1), поэтому
+пакетное добавление и удаление N ключей - один проход по файлу и одна
+атомарная запись, без повторного чтения файла на каждый ключ. Строки,
+которые успели дописать в конец файла после чтения, при записи сохраняются
+"""
+class AuthorizedKeys:
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._loaded = False
+        self._entries: List[AuthorizedKey] = []
+        self._invalid: List[Tuple[int, int, int]] = []
+        self._index: Dict[bytes, List[int]] = {}
+        self._size = 0
+        self._newline_at_end = True
+
+    def _current_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def is_stale(self) -> bool:
+        return not self._loaded or self._current_stamp() != self._stamp
+
+    """
+    Принудительно перечитывает файл
+    """
+    def reload(self) -> None:
+        stamp = self._current_stamp()
+        entries: List[AuthorizedKey] = []
+        invalid: List[Tuple[int, int, int]] = []
+        index: Dict[bytes, List[int]] = {}
+        size = 0
+        last = b"\n"
+        if stamp is not None:
+            with open(self.path, "rb") as f:
+                for number, start, end, entry in _scan(f):
+                    if entry is False:
+                        invalid.append((number, start, end))
+                    elif entry is not None:
+                        index.setdefault(entry.digest, []).append(len(entries))
+                        entries.append(entry)
+                    size = end
+                if size:
+                    f.seek(size - 1)
+                    last = f.read(1)
+        self._entries = entries
+        self._invalid = invalid
+        self._index = index
+        self._size = size
+        self._newline_at_end = last == b"\n"
+        self._stamp = stamp
+        self._loaded = True
+
+    def _ensure_fresh(self) -> None:
+        if self.is_stale():
+            self.reload()
+
+    @property
+    def entries(self) -> List[AuthorizedKey]:
+        self._ensure_fresh()
+        return self._entries
+
+    """
+    Строки без ключа: [(номер, начало, конец)]
+    """
+    @property
+    def invalid(self) -> List[Tuple[int, int, int]]:
+        self._ensure_fresh()
+        return self._invalid
+
+    """
+    Строки с этим ключом (блоб или строка публичного ключа)
+    """
+    def find(self, key) -> List[AuthorizedKey]:
+        self._ensure_fresh()
+        digest = _digest(key)
+        return [self._entries[i] for i in self._index.get(digest, ())] if digest else []
+
+    def __contains__(self, key) -> bool:
+        return bool(self.find(key))
+
+    """
+    Повторы: строки, чей ключ уже встречался выше (опции не сравниваются -
+    sshd всё равно применит первую строку с этим ключом)
+    """
+    def duplicates(self) -> List[AuthorizedKey]:
+        self._ensure_fresh()
+        return [self._entries[i] for hits in self._index.values() for i in hits[1:]]
+
+    """
+    Добавляет ключи, которых ещё нет в файле (одна запись в конец файла)
+
+    keys - строки публичных ключей ("алгоритм base64 [комментарий]"),
+    options - опции для новых строк (например 'from="10.0.0.0/8",no-pty')
+    Возвращает по каждому ключу: "added", "exists" или "invalid"
+    """
+    def add(self, keys: Iterable[str], options: Optional[str] = None) -> List[str]:
+        self._ensure_fresh()
+        statuses: List[str] = []
+        pending: Set[bytes] = set()
+        lines: List[str] = []
+        for key in keys:
+            parsed = parse_public_line(key)
+            if parsed is None:
+                statuses.append("invalid")
+                continue
+            blob, comment = parsed
+            digest = hashlib.sha256(blob).digest()
+            if digest in self._index or digest in pending:
+                statuses.append("exists")
+                continue
+            pending.add(digest)
+            key_type, encoded = key.split(None, 2)[:2]
+            lines.append(format_line(key_type, encoded, comment, options) + "\n")
+            statuses.append("added")
+
+        if lines:
+            data = "".join(lines).encode("utf-8")
+            if not self._newline_at_end:
+                data = b"\n" + data
+            splice_file(self.path, [(self._size, self._size, data)])
+            self._loaded = False
+        return statuses
+
+    """
+    Удаляет все строки с указанными ключами (одна потоковая перезапись)
+    Возвращает число удалённых строк
+    """
+    def remove(self, keys: Iterable) -> int:
+        self._ensure_fresh()
+        digests = {d for d in map(_digest, keys) if d}
+        return self._remove_lines([i for d in digests for i in self._index.get(d, ())])
+
+    """
+    Удаляет повторяющиеся строки, оставляя первую строку каждого ключа
+    """
+    def dedupe(self) -> int:
+        self._ensure_fresh()
+        return self._remove_lines([i for hits in self._index.values() for i in hits[1:]])
+
+    def _remove_lines(self, positions: List[int]) -> int:
+        if not positions:
+            return 0
+        spans = sorted((self._entries[i].start, self._entries[i].end) for i in positions)
+        splice_file(self.path, [(start, end, b"") for start, end in spans])
+        self._loaded = False
+        return len(spans)
+
+
+def _digest(key) -> Optional[bytes]:
+    if isinstance(key, AuthorizedKey):
+        return key.digest
+    if isinstance(key, (bytes, bytearray)):
+        return hashlib.sha256(key).digest()
+    parsed = parse_public_line(key)
+    return hashlib.sha256(parsed[0]).digest() if parsed else None
+
+
+# открытые файлы: путь -> AuthorizedKeys
+_documents: Dict[Path, AuthorizedKeys] = {}
+
+
+"""
+Возвращает закэшированный authorized_keys (по умолчанию ~/.ssh/authorized_keys)
+"""
+def load_authorized_keys(path: Optional[Path] = None) -> AuthorizedKeys:
+    path = Path(path) if path is not None else AUTHORIZED_KEYS_PATH
+    doc = _documents.get(path)
+    if doc is None:
+        doc = _documents[path] = AuthorizedKeys(path)
+    return doc
+
+
+def _inventory_keys(names: Iterable[str]) -> Dict[str, Optional[str]]:
+    from ssh_key_manager.core import key_manager
+
+    return {name: key_manager.get_public_key(name) for name in names}
+
+
+"""
+Добавляет публичные ключи из ~/.ssh (по именам key_manager) одной записью
+
+Возвращает {имя: "added" / "exists" / "invalid" / "missing"}
+"""
+def add_inventory_keys(names: Iterable[str], options: Optional[str] = None,
+                       path: Optional[Path] = None) -> Dict[str, str]:
+    doc = load_authorized_keys(path)
+    keys = _inventory_keys(names)
+    found = [name for name, key in keys.items() if key]
+    with audit_log.timed("authorized_keys.add", file=str(doc.path), keys=len(found)) as record:
+        statuses = dict(zip(found, doc.add([keys[name] for name in found], options)))
+        record.update(ok=True, added=sum(s == "added" for s in statuses.values()))
+    return {name: statuses.get(name, "missing") for name in keys}
+
+
+"""
+Удаляет из authorized_keys ключи из ~/.ssh (по именам key_manager)
+
+Возвращает {имя: сколько строк удалено} (ключи без .pub пропускаются)
+"""
+def remove_inventory_keys(names: Iterable[str], path: Optional[Path] = None) -> Dict[str, int]:
+    doc = load_authorized_keys(path)
+    keys = {name: key for name, key in _inventory_keys(names).items() if key}
+    counts = {name: len(doc.find(key)) for name, key in keys.items()}
+    with audit_log.timed("authorized_keys.remove", file=str(doc.path), keys=len(keys)) as record:
+        record.update(ok=True, removed=doc.remove(keys.values()))
+    return counts
+
+
+def dedupe(path: Optional[Path] = None) -> int:
+    doc = load_authorized_keys(path)
+    with audit_log.timed("authorized_keys.dedupe", file=str(doc.path)) as record:
+        record.update(ok=True, removed=doc.dedupe())
+        return record["removed"]
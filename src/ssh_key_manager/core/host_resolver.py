@@ -0,0 +1,378 @@
+import getpass
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple, Union
+
+from ssh_key_manager.core import ssh_config
+from ssh_key_manager.core.ssh_config import ConfigBlock
+
+# параметры, которые ssh накапливает, а не берёт первое значение
+MULTI_VALUE_OPTIONS = {
+    "identityfile",
+    "certificatefile",
+    "localforward",
+    "remoteforward",
+    "dynamicforward",
+    "sendenv",
+    "setenv",
+}
+
+# символы шаблонов в Host / Match (как в match_pattern у ssh)
+WILDCARD_CHARS = "*?"
+
+# "Параметр значение" или "Параметр=значение"
+OPTION_REGEX = re.compile(r"(\S+?)(?:\s*=\s*|\s+)(.*)")
+
+Options = Dict[str, Union[str, List[str]]]
+
+
+# скомпилированные шаблоны: шаблон -> регулярное выражение
+_pattern_cache: Dict[str, Pattern] = {}
+
+
+"""
+Переводит шаблон ssh (* и ?) в регулярное выражение
+"""
+def compile_pattern(pattern: str) -> Pattern:
+    parts = []
+    for ch in pattern:
+        if ch == "*":
+            parts.append(".*")
+        elif ch == "?":
+            parts.append(".")
+        else:
+            parts.append(re.escape(ch))
+    return re.compile("".join(parts), re.DOTALL)
+
+
+"""
+Проверяет имя (в нижнем регистре) по одному шаблону ssh
+
+Шаблоны с одной * (web-*, *.example.com) проверяются сравнением префикса
+и суффикса, остальные - регулярным выражением, скомпилированным один раз
+"""
+def match_pattern(name: str, pattern: str) -> bool:
+    if "?" not in pattern and pattern.count("*") == 1:
+        prefix, suffix = pattern.split("*")
+        return len(name) >= len(prefix) + len(suffix) and name.startswith(prefix) and name.endswith(suffix)
+    regex = _pattern_cache.get(pattern)
+    if regex is None:
+        regex = _pattern_cache[pattern] = compile_pattern(pattern)
+    return regex.fullmatch(name) is not None
+
+
+"""
+Проверяет имя по списку шаблонов через запятую ("a*,!b", как в Match host)
+"""
+def match_pattern_list(name: str, patterns: str) -> bool:
+    name = name.lower()
+    matched = False
+    for pattern in patterns.lower().split(","):
+        negated = pattern.startswith("!")
+        if negated:
+            pattern = pattern[1:]
+        if match_pattern(name, pattern):
+            if negated:
+                return False
+            matched = True
+    return matched
+
+
+def _split_option(line: str) -> Optional[Tuple[str, str]]:
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#"):
+        return None
+    m = OPTION_REGEX.fullmatch(stripped)
+    if not m:
+        return None
+    value = m.group(2).strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+    return m.group(1).lower(), value
+
+
+"""
+Скомпилированный блок конфига: шаблоны, условия Match и параметры по порядку
+"""
+class _CompiledBlock:
+    __slots__ = ("ordinal", "kind", "negatives", "criteria", "guard", "_source", "_options")
+
+    def __init__(self, ordinal: int, source: ConfigBlock):
+        self.ordinal = ordinal
+        self.kind = source.type
+        self.negatives: List[str] = []
+        self.criteria: List[Tuple[bool, str, str]] = []
+        self.guard: Optional[int] = None
+        self._source = source
+        self._options: Optional[List[Tuple[str, str]]] = None
+
+    """
+    Параметры блока по порядку; разбираются при первом применении блока
+    """
+    @property
+    def options(self) -> List[Tuple[str, str]]:
+        if self._options is None:
+            # у Host/Match первая строка - заголовок блока
+            lines = self._source.lines
+            body = lines if self.kind == "global" else lines[1:]
+            self._options = [opt for opt in map(_split_option, body) if opt]
+        return self._options
+
+
+"""
+Вычисляет итоговые параметры хоста так же, как `ssh -G`
+
+Учитываются шаблоны и отрицания в Host, несколько шаблонов в одной строке,
+блоки Match, Include и правило "первое значение побеждает"
+(IdentityFile, LocalForward и т.п. накапливаются)
+
+Индекс строится один раз: точные имена лежат в словаре, шаблоны с * и ?
+разложены по корзинам литерального префикса или суффикса, поэтому для имени
+проверяются только подходящие корзины, а не все блоки подряд. Параметры
+блока разбираются при первом его применении. Индекс перестраивается,
+когда меняется любой из файлов конфига
+
+Ограничения: Match exec не выполняется (считается ложным), canonical и
+localnetwork ложны, final истинно (разрешение идёт сразу как финальный проход)
+"""
+class HostResolver:
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._deps: List[Tuple[str, Optional[Tuple[int, int, int]]]] = []
+        self._blocks: List[_CompiledBlock] = []
+        self._exact: Dict[str, List[int]] = {}
+        self._by_prefix: Dict[str, List[Tuple[str, int]]] = {}
+        self._by_suffix: Dict[str, List[Tuple[str, int]]] = {}
+        self._always: List[int] = []
+        self._cache: Dict[Tuple[str, str], Options] = {}
+        self._built = False
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    """
+    Проверяет, изменился ли какой-нибудь файл конфига или каталог Include
+    """
+    def is_stale(self) -> bool:
+        if not self._built:
+            return True
+        return any(self._stamp(path) != stamp for path, stamp in self._deps)
+
+    def _ensure_index(self) -> None:
+        if self.is_stale():
+            self.rebuild()
+
+    """
+    Перестраивает индекс шаблонов по объединённому конфигу
+    """
+    def rebuild(self) -> None:
+        blocks: List[_CompiledBlock] = []
+        exact: Dict[str, List[int]] = {}
+        by_prefix: Dict[str, List[Tuple[str, int]]] = {}
+        by_suffix: Dict[str, List[Tuple[str, int]]] = {}
+        always: List[int] = []
+        ordinals: Dict[int, int] = {}
+        deps: Dict[str, None] = {}
+
+        root = ssh_config.load_config(self.path)
+        base_dir = root.path.parent
+        deps[str(root.path)] = None
+
+        for doc, block, guard in ssh_config.walk_config(self.path):
+            deps[str(doc.path)] = None
+            for pattern in block.includes or ():
+                # новые файлы в каталоге Include меняют mtime каталога
+                pattern = os.path.expanduser(pattern)
+                if not os.path.isabs(pattern):
+                    pattern = os.path.join(str(base_dir), pattern)
+                deps[os.path.dirname(pattern)] = None
+
+            ordinal = len(blocks)
+            ordinals[id(block)] = ordinal
+            compiled = _CompiledBlock(ordinal, block)
+            blocks.append(compiled)
+            if guard is not None:
+                # блок подключённого файла (или строки после Include) действует,
+                # только если применился охватывающий Host/Match
+                compiled.guard = ordinals.get(id(guard))
+
+            if block.type == "host":
+                for pattern in block.host.lower().split():
+                    if pattern.startswith("!"):
+                        compiled.negatives.append(pattern[1:])
+                        continue
+                    first = min((pattern.find(c) for c in WILDCARD_CHARS if c in pattern), default=-1)
+                    if first < 0:
+                        exact.setdefault(pattern, []).append(ordinal)
+                        continue
+                    last = max(pattern.rfind(c) for c in WILDCARD_CHARS)
+                    prefix, suffix = pattern[:first], pattern[last + 1:]
+                    entry = (pattern, ordinal)
+                    if len(prefix) >= len(suffix):
+                        by_prefix.setdefault(prefix, []).append(entry)
+                    else:
+                        by_suffix.setdefault(suffix, []).append(entry)
+            elif block.type == "match":
+                compiled.criteria = _parse_criteria(block.criteria)
+                always.append(ordinal)
+            else:
+                always.append(ordinal)
+
+        self._blocks = blocks
+        self._exact = exact
+        self._by_prefix = by_prefix
+        self._by_suffix = by_suffix
+        self._always = always
+        self._deps = [(path, self._stamp(path)) for path in deps]
+        self._cache = {}
+        self._built = True
+
+    """
+    Возвращает номера блоков Host, шаблоны которых совпадают с именем
+    (без учёта отрицаний)
+    """
+    def _host_candidates(self, name: str) -> Set[int]:
+        found = set(self._exact.get(name, ()))
+        for i in range(len(name) + 1):
+            for pattern, ordinal in self._by_prefix.get(name[:i], ()):
+                if ordinal not in found and match_pattern(name, pattern):
+                    found.add(ordinal)
+            for pattern, ordinal in self._by_suffix.get(name[i:], ()):
+                if ordinal not in found and match_pattern(name, pattern):
+                    found.add(ordinal)
+        return found
+
+    """
+    Возвращает итоговые параметры для хоста (ключи в нижнем регистре, как у ssh -G)
+
+    user - пользователь, от имени которого подключаемся (по умолчанию текущий)
+    """
+    def resolve(self, host: str, user: Optional[str] = None) -> Options:
+        self._ensure_index()
+        return self._resolve(host, user)
+
+    def _resolve(self, host: str, user: Optional[str]) -> Options:
+        local_user = getpass.getuser()
+        key = (host, user or "")
+        cached = self._cache.get(key)
+        if cached is not None:
+            return _copy_options(cached)
+
+        name = host.lower()
+        candidates = sorted(self._host_candidates(name).union(self._always))
+        options: Options = {}
+        if user:
+            options["user"] = user
+        applied: Dict[int, bool] = {}
+
+        for ordinal in candidates:
+            block = self._blocks[ordinal]
+            if block.guard is not None and not applied.get(block.guard, False):
+                ok = False
+            elif block.kind == "host":
+                ok = not any(match_pattern(name, pattern) for pattern in block.negatives)
+            elif block.kind == "match":
+                ok = _match_criteria(block.criteria, host, options, local_user)
+            else:
+                ok = True
+            applied[ordinal] = ok
+            if not ok:
+                continue
+            for opt, value in block.options:
+                if opt in MULTI_VALUE_OPTIONS:
+                    values = options.setdefault(opt, [])
+                    if value not in values:
+                        values.append(value)
+                elif opt not in options:
+                    options[opt] = value
+
+        # значения по умолчанию, как их печатает ssh -G
+        options["host"] = host
+        hostname = options.get("hostname", "%h")
+        options["hostname"] = hostname.replace("%%", "\0").replace("%h", host).replace("\0", "%")
+        options.setdefault("user", local_user)
+        options.setdefault("port", "22")
+
+        self._cache[key] = options
+        return _copy_options(options)
+
+    """
+    Разрешает сразу много имён, индекс строится один раз
+    """
+    def resolve_many(self, hosts: Iterable[str]) -> Dict[str, Options]:
+        self._ensure_index()
+        return {host: self._resolve(host, None) for host in hosts}
+
+
+def _copy_options(options: Options) -> Options:
+    return {k: list(v) if isinstance(v, list) else v for k, v in options.items()}
+
+
+def _parse_criteria(criteria: str) -> List[Tuple[bool, str, str]]:
+    words = ssh_config.split_args(criteria)
+    result = []
+    i = 0
+    while i < len(words):
+        word = words[i].lower()
+        negated = word.startswith("!")
+        if negated:
+            word = word[1:]
+        if word in ("all", "canonical", "final"):
+            result.append((negated, word, ""))
+            i += 1
+        else:
+            arg = words[i + 1] if i + 1 < len(words) else ""
+            result.append((negated, word, arg))
+            i += 2
+    return result
+
+
+def _match_criteria(criteria: List[Tuple[bool, str, str]], host: str, options: Options, local_user: str) -> bool:
+    for negated, word, arg in criteria:
+        if word in ("all", "final"):
+            ok = True
+        elif word == "host":
+            hostname = options.get("hostname", host)
+            ok = match_pattern_list(str(hostname).replace("%h", host), arg)
+        elif word == "originalhost":
+            ok = match_pattern_list(host, arg)
+        elif word == "user":
+            ok = match_pattern_list(str(options.get("user", local_user)), arg)
+        elif word == "localuser":
+            ok = match_pattern_list(local_user, arg)
+        elif word == "tagged":
+            ok = match_pattern_list(str(options.get("tag", "")), arg)
+        else:
+            # exec, canonical, localnetwork и неизвестные условия
+            ok = False
+        if ok == negated:
+            return False
+    return True
+
+
+# резолверы по пути конфига
+_resolvers: Dict[Optional[Path], HostResolver] = {}
+
+
+"""
+Возвращает закэшированный резолвер для конфига (по умолчанию ~/.ssh/config)
+"""
+def get_resolver(path: Optional[Path] = None) -> HostResolver:
+    resolver = _resolvers.get(path)
+    if resolver is None:
+        resolver = _resolvers[path] = HostResolver(path)
+    return resolver
+
+
+"""
+Возвращает итоговые параметры хоста, как `ssh -G host`
+"""
+def resolve_host(host: str, path: Optional[Path] = None) -> Options:
+    return get_resolver(path).resolve(host)
@@ -0,0 +1,231 @@
+import json
+import os
+import stat
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO, Tuple, Union
+
+from ssh_key_manager.core.key_info import MAX_KEY_FILE_SIZE, parse_key_info
+from ssh_key_manager.core.key_manager import key_format_from_header
+from ssh_key_manager.utils import audit_log
+
+# потоков по умолчанию: работа упирается в диск, а не в процессор
+DEFAULT_WORKERS = 8
+
+# сколько каталогов на поток может быть в работе одновременно
+ROOTS_PER_WORKER = 4
+
+# сколько секунд в сутках (для возраста ключа)
+DAY = 86400
+
+# файлы в чужих каталогах открываются без перехода по ссылкам и без
+# ожидания (FIFO или устройство не подвесят поток)
+OPEN_FLAGS = os.O_RDONLY | os.O_NOFOLLOW | os.O_NONBLOCK | getattr(os, "O_CLOEXEC", 0)
+
+
+"""
+Приватный ключ, найденный при сканировании
+
+mode - права файла (0o600), insecure - файл доступен группе или остальным
+(ssh откажется его использовать), age_days - дней с последнего изменения
+"""
+class KeyRecord(NamedTuple):
+    root: str
+    path: str
+    name: str
+    key_format: str
+    key_type: Optional[str]
+    algorithm: Optional[str]
+    bits: Optional[int]
+    encrypted: Optional[bool]
+    has_public: bool
+    comment: Optional[str]
+    fingerprint_sha256: Optional[str]
+    mode: int
+    insecure: bool
+    uid: int
+    size: int
+    mtime: float
+    age_days: float
+
+    def to_json(self) -> Dict[str, Any]:
+        data = self._asdict()
+        data["mode"] = f"{self.mode:04o}"
+        data["age_days"] = round(self.age_days, 1)
+        return data
+
+
+"""
+Каталог, который не удалось прочитать
+"""
+class ScanError(NamedTuple):
+    root: str
+    error: str
+
+    def to_json(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+ScanItem = Union[KeyRecord, ScanError]
+
+
+"""
+Каталоги ssh пользователей: base/*/subdir (например /home/*/.ssh)
+Отдаются по одному, весь список домашних каталогов в памяти не собирается
+"""
+def find_roots(base: Path = Path("/home"), subdir: str = ".ssh") -> Iterator[Path]:
+    try:
+        it = os.scandir(base)
+    except OSError as e:
+        print(f"[ERROR] Не удалось прочитать {base}: {e}")
+        return
+    with it:
+        for entry in it:
+            path = Path(entry.path) / subdir
+            try:
+                if entry.is_dir(follow_symlinks=False) and path.is_dir():
+                    yield path
+            except OSError:
+                continue
+
+
+"""
+Читает обычный файл (не больше MAX_KEY_FILE_SIZE байт): (stat, содержимое)
+
+Ссылки, FIFO, устройства и сокеты не читаются - None. stat берётся от
+открытого дескриптора, поэтому относится именно к прочитанному файлу,
+даже если его подменили между scandir и open
+"""
+def _read_regular(path: str) -> Optional[Tuple[os.stat_result, bytes]]:
+    try:
+        fd = os.open(path, OPEN_FLAGS)
+    except OSError:
+        return None
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        chunks = []
+        left = MAX_KEY_FILE_SIZE
+        while left > 0:
+            chunk = os.read(fd, left)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            left -= len(chunk)
+        return st, b"".join(chunks)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+def _read_public(path: str) -> Optional[bytes]:
+    try:
+        if not stat.S_ISREG(os.lstat(path).st_mode):
+            return None
+    except OSError:
+        return None
+    found = _read_regular(path)
+    return found[1] if found is not None else None
+
+
+"""
+Сканирует один каталог: приватные ключи на его верхнем уровне (как key_manager)
+
+Символьные ссылки, FIFO и прочие не обычные файлы не открываются (ни
+ключ, ни .pub): в чужом каталоге они могут вести куда угодно или
+заблокировать чтение
+"""
+def scan_root(root: Path, now: Optional[float] = None) -> List[ScanItem]:
+    now = time.time() if now is None else now
+    records: List[ScanItem] = []
+    try:
+        it = os.scandir(root)
+    except OSError as e:
+        return [ScanError(str(root), str(e))]
+    with it:
+        for entry in it:
+            if entry.name.endswith(".pub"):
+                continue
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+            except OSError:
+                continue
+            found = _read_regular(entry.path)
+            if found is None:
+                continue
+            st, data = found
+            key_format = key_format_from_header(data)
+            if key_format is None:
+                continue
+            info = parse_key_info(entry.name, data, _read_public(entry.path + ".pub"))
+            mode = stat.S_IMODE(st.st_mode)
+            records.append(KeyRecord(
+                str(root), entry.path, entry.name, key_format,
+                info.key_type, info.algorithm, info.bits, info.encrypted, info.has_public,
+                info.comment, info.fingerprint_sha256,
+                mode, bool(mode & 0o077), st.st_uid, st.st_size, st.st_mtime,
+                max(0.0, (now - st.st_mtime) / DAY)))
+    records.sort(key=lambda r: r.name)
+    return records
+
+
+"""
+Сканирует каталоги в пуле потоков и отдаёт KeyRecord / ScanError
+(инвентаризация многих каталогов ssh, например .ssh всех пользователей
+на бастионе)
+
+В работе одновременно не больше нескольких каталогов на поток, а кэши
+key_manager / key_info не используются, поэтому память не растёт с
+числом каталогов
+
+roots может быть ленивым (например, find_roots()): следующие каталоги
+берутся из него по мере освобождения потоков. Результаты идут в порядке
+каталогов, поэтому вывод воспроизводим
+"""
+def scan(roots: Iterable[Path], workers: int = DEFAULT_WORKERS) -> Iterator[ScanItem]:
+    workers = max(1, workers)
+    now = time.time()
+    roots = iter(roots)
+    pending = deque()
+    with audit_log.timed("inventory.scan", workers=workers) as record, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ssh-km-scan") as pool:
+        counts = {"roots": 0, "keys": 0, "errors": 0}
+        try:
+            for root in roots:
+                pending.append(pool.submit(scan_root, Path(root), now))
+                counts["roots"] += 1
+                if len(pending) >= workers * ROOTS_PER_WORKER:
+                    yield from _count(pending.popleft().result(), counts)
+            while pending:
+                yield from _count(pending.popleft().result(), counts)
+        finally:
+            # потребитель мог остановиться раньше - не ждём ненужные каталоги
+            for future in pending:
+                future.cancel()
+            record.update(ok=True, **counts)
+
+
+def _count(items: List[ScanItem], counts: Dict[str, int]) -> List[ScanItem]:
+    for item in items:
+        counts["errors" if isinstance(item, ScanError) else "keys"] += 1
+    return items
+
+
+"""
+Пишет результаты сканирования в формате JSON lines (одна запись на строку)
+Возвращает (ключей, ошибок)
+"""
+def write_jsonl(items: Iterable[ScanItem], out: TextIO) -> Tuple[int, int]:
+    keys = errors = 0
+    for item in items:
+        if isinstance(item, ScanError):
+            errors += 1
+        else:
+            keys += 1
+        out.write(json.dumps(item.to_json(), ensure_ascii=False) + "\n")
+    return keys, errors
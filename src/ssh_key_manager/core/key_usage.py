@@ -0,0 +1,251 @@
+import getpass
+import os
+import re
+import socket
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from ssh_key_manager.core import key_manager, ssh_config
+from ssh_key_manager.core.ssh_config import ConfigBlock
+
+# ключи, которые ssh пробует сам, если IdentityFile не указан
+DEFAULT_IDENTITIES = ("id_rsa", "id_ecdsa", "id_ecdsa_sk", "id_ed25519", "id_ed25519_sk", "id_dsa")
+
+# строка IdentityFile (с "=" или без, значение может быть в кавычках)
+IDENTITY_REGEX = re.compile(r'^[ \t]*identityfile(?:[ \t]*=[ \t]*|[ \t]+)(?:"([^"]*)"|(\S+))',
+                            re.IGNORECASE | re.MULTILINE)
+
+# %-последовательности в IdentityFile
+TOKEN_REGEX = re.compile(r"%(.)")
+
+
+"""
+Ссылка на ключ из конфига
+
+source - файл конфига, host - имя Host (или None для Match и глобальных
+строк), label - как показать блок ("Host web", "Match user git",
+"[Глобальные настройки]"), identity - значение IdentityFile как в файле
+"""
+class KeyReference(NamedTuple):
+    source: Path
+    host: Optional[str]
+    label: str
+    identity: str
+
+
+def _label(block: Optional[ConfigBlock]) -> Tuple[Optional[str], str]:
+    if block is None or block.type == "global":
+        return None, "[Глобальные настройки]"
+    if block.type == "match":
+        return None, f"Match {block.criteria}"
+    return block.host, f"Host {block.host}"
+
+
+"""
+Раскрывает путь IdentityFile в абсолютный путь (или None, если в нём
+остались подстановки, которые зависят от хоста подключения)
+
+Подстановки как у ssh: ~, %d (домашний каталог), %u (локальный
+пользователь), %l / %L (имя машины), %%; %h и %n - только если передан
+host (блок Host с одним точным именем)
+
+Относительные пути считаются от домашнего каталога: ssh запускается из
+него, а ssh_config не задаёт другой базы
+"""
+def expand_identity(value: str, host: Optional[str] = None) -> Optional[str]:
+    home = os.path.expanduser("~")
+    unresolved = False
+
+    def token(m: "re.Match") -> str:
+        nonlocal unresolved
+        ch = m.group(1)
+        if ch == "%":
+            return "%"
+        if ch == "d":
+            return home
+        if ch == "u":
+            return getpass.getuser()
+        if ch == "l":
+            return socket.gethostname()
+        if ch == "L":
+            return socket.gethostname().split(".")[0]
+        if ch in "hn" and host is not None:
+            return host
+        unresolved = True
+        return m.group(0)
+
+    value = TOKEN_REGEX.sub(token, os.path.expanduser(value))
+    if unresolved:
+        return None
+    if not os.path.isabs(value):
+        value = os.path.join(home, value)
+    path = os.path.normpath(value)
+    # IdentityFile может указывать на .pub - ssh тогда ищет приватную часть рядом
+    return path[:-4] if path.endswith(".pub") else path
+
+
+def _identities(block: ConfigBlock) -> List[str]:
+    text = block.text
+    if "identityfile" not in text.lower():
+        return []
+    return [m.group(1) if m.group(1) is not None else m.group(2) for m in IDENTITY_REGEX.finditer(text)]
+
+
+"""
+Индекс использования ключей по одному конфигу (по умолчанию ~/.ssh/config)
+
+Обратный индекс ключ -> блоки, которые ссылаются на него через IdentityFile,
+строится за один проход по объединённому конфигу (с Include); "какие хосты
+используют ключ" и "какие ключи не использует никто" - поиск в словаре.
+Индекс сам перестраивается, когда меняется любой файл конфига или каталог
+Include, при этом заново разбираются только блоки изменившихся файлов
+"""
+class KeyUsageIndex:
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._deps: List[Tuple[str, Optional[Tuple[int, int, int]]]] = []
+        self._by_key: Dict[str, List[KeyReference]] = {}
+        # по файлу: (список блоков, из которого строились ссылки, [(блок, значения IdentityFile)])
+        self._per_doc: Dict[Path, Tuple[List[ConfigBlock], List[Tuple[ConfigBlock, List[str]]]]] = {}
+        self._built = False
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def is_stale(self) -> bool:
+        if not self._built:
+            return True
+        return any(self._stamp(path) != stamp for path, stamp in self._deps)
+
+    def _ensure_index(self) -> None:
+        if self.is_stale():
+            self.rebuild()
+
+    def _doc_identities(self, doc: ssh_config.SSHConfig) -> Dict[int, List[str]]:
+        blocks = doc.blocks
+        cached = self._per_doc.get(doc.path)
+        if cached is None or cached[0] is not blocks:
+            found = [(block, values) for block in blocks for values in (_identities(block),) if values]
+            cached = self._per_doc[doc.path] = (blocks, found)
+        return {id(block): values for block, values in cached[1]}
+
+    """
+    Перестраивает индекс по объединённому конфигу
+    """
+    def rebuild(self) -> None:
+        by_key: Dict[str, List[KeyReference]] = {}
+        deps: Dict[str, None] = {}
+        per_doc: Dict[int, Dict[int, List[str]]] = {}
+        seen_docs = set()
+
+        root = ssh_config.load_config(self.path)
+        base_dir = root.path.parent
+        deps[str(root.path)] = None
+
+        for doc, block, guard in ssh_config.walk_config(self.path):
+            deps[str(doc.path)] = None
+            for pattern in block.includes or ():
+                # новые файлы в каталоге Include меняют mtime каталога
+                pattern = os.path.expanduser(pattern)
+                if not os.path.isabs(pattern):
+                    pattern = os.path.join(str(base_dir), pattern)
+                deps[os.path.dirname(pattern)] = None
+            seen_docs.add(doc.path)
+            identities = per_doc.get(id(doc))
+            if identities is None:
+                identities = per_doc[id(doc)] = self._doc_identities(doc)
+            # части блока, разрезанного по Include, в кэш файла не входят
+            values = identities.get(id(block)) if block.parent is None else _identities(block)
+            if not values:
+                continue
+            host, label = _label(guard if block.type == "global" else block)
+            # %h подставляется только для блока с одним точным именем
+            exact = host if host and not any(c in host for c in "*?! ") else None
+            for value in values:
+                path = expand_identity(value, exact)
+                if path is not None:
+                    by_key.setdefault(path, []).append(KeyReference(doc.path, host, label, value))
+
+        for path in [p for p in self._per_doc if p not in seen_docs]:
+            del self._per_doc[path]
+        self._by_key = by_key
+        self._deps = [(path, self._stamp(path)) for path in deps]
+        self._built = True
+
+    @staticmethod
+    def _key_path(key: str) -> str:
+        # имя ключа из ~/.ssh или путь к нему
+        if os.sep not in key:
+            key = str(key_manager.SSH_DIR / key)
+        path = os.path.normpath(os.path.expanduser(key))
+        return path[:-4] if path.endswith(".pub") else path
+
+    """
+    Блоки конфига, которые ссылаются на ключ (имя в ~/.ssh или путь)
+    """
+    def references(self, key: str) -> List[KeyReference]:
+        self._ensure_index()
+        return list(self._by_key.get(self._key_path(key), ()))
+
+    """
+    Имена Host, использующие ключ (без повторов, в порядке конфига)
+    """
+    def hosts_using(self, key: str) -> List[str]:
+        return list(dict.fromkeys(ref.host or ref.label for ref in self.references(key)))
+
+    """
+    Сколько блоков ссылается на каждый ключ
+    """
+    def usage_counts(self, keys: Iterable[str]) -> Dict[str, int]:
+        self._ensure_index()
+        return {key: len(self._by_key.get(self._key_path(key), ())) for key in keys}
+
+    """
+    Ключи, на которые не ссылается ни один блок
+
+    keys - имена ключей (по умолчанию все ключи ~/.ssh); ключи с
+    стандартными именами (id_ed25519 и т.п.) ssh пробует сам, поэтому
+    они считаются используемыми, если include_defaults=False
+    """
+    def unused(self, keys: Optional[Iterable[str]] = None, include_defaults: bool = False) -> List[str]:
+        self._ensure_index()
+        keys = key_manager.list_keys() if keys is None else keys
+        return [key for key in keys
+                if self._key_path(key) not in self._by_key
+                and (include_defaults or os.path.basename(key) not in DEFAULT_IDENTITIES)]
+
+
+# индексы по пути конфига
+_indexes: Dict[Optional[Path], KeyUsageIndex] = {}
+
+
+"""
+Возвращает закэшированный индекс для конфига (по умолчанию ~/.ssh/config)
+"""
+def get_index(path: Optional[Path] = None) -> KeyUsageIndex:
+    index = _indexes.get(path)
+    if index is None:
+        index = _indexes[path] = KeyUsageIndex(path)
+    return index
+
+
+def references(key: str, path: Optional[Path] = None) -> List[KeyReference]:
+    return get_index(path).references(key)
+
+
+def hosts_using(key: str, path: Optional[Path] = None) -> List[str]:
+    return get_index(path).hosts_using(key)
+
+
+def usage_counts(keys: Iterable[str], path: Optional[Path] = None) -> Dict[str, int]:
+    return get_index(path).usage_counts(keys)
+
+
+def unused_keys(path: Optional[Path] = None, include_defaults: bool = False) -> List[str]:
+    return get_index(path).unused(include_defaults=include_defaults)
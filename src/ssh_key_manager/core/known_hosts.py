@@ -0,0 +1,564 @@
+import base64
+import binascii
+import fnmatch
+import hashlib
+import hmac
+import os
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from ssh_key_manager.utils import audit_log
+from ssh_key_manager.utils.filesystem import splice_file
+
+# файл известных хостов текущего пользователя
+KNOWN_HOSTS_PATH = Path.home() / ".ssh" / "known_hosts"
+
+# префикс хэшированного имени (HashKnownHosts yes): |1|соль|HMAC-SHA1
+HASH_MAGIC = "|1|"
+
+DEFAULT_PORT = 22
+
+SHA1_SIZE = hashlib.sha1().digest_size
+SHA1_BLOCK_SIZE = hashlib.sha1().block_size
+
+# таблицы для ключей HMAC (key XOR ipad / opad), как в модуле hmac
+_IPAD = bytes(x ^ 0x36 for x in range(256))
+_OPAD = bytes(x ^ 0x5C for x in range(256))
+
+
+"""
+Строка known_hosts с ключом
+
+hosts - поле имён как в файле (через запятую, может быть |1|соль|хэш),
+marker - "@cert-authority" / "@revoked" или None,
+line - номер строки (с 1), start / end - байтовые смещения строки в файле
+(вместе с переводом строки)
+"""
+class KnownHost(NamedTuple):
+    line: int
+    marker: Optional[str]
+    hosts: str
+    key_type: str
+    key: str
+    comment: str
+    start: int
+    end: int
+
+    @property
+    def hashed(self) -> bool:
+        return self.hosts.startswith(HASH_MAGIC)
+
+    """
+    (соль, HMAC) хэшированного имени или None
+    """
+    @property
+    def salt_digest(self) -> Optional[Tuple[bytes, bytes]]:
+        return _parse_hashed(self.hosts) if self.hashed else None
+
+    @property
+    def patterns(self) -> List[str]:
+        return [] if self.hashed else self.hosts.lower().split(",")
+
+
+"""
+Имя хоста в том виде, в каком ssh пишет его в known_hosts:
+host для порта 22, иначе [host]:port
+"""
+def host_key_name(host: str, port: int = DEFAULT_PORT) -> str:
+    host = host.lower()
+    if port and port != DEFAULT_PORT:
+        return f"[{host}]:{port}"
+    return host
+
+
+"""
+Хэширует имя так же, как ssh-keygen -H (для новой соли - os.urandom(20))
+"""
+def hash_host(name: str, salt: Optional[bytes] = None) -> str:
+    salt = salt if salt is not None else os.urandom(20)
+    digest = hmac.new(salt, name.encode("utf-8"), hashlib.sha1).digest()
+    return f"{HASH_MAGIC}{base64.b64encode(salt).decode()}|{base64.b64encode(digest).decode()}"
+
+
+# символы шаблонов в поле имён: *, ? и отрицание !
+PATTERN_CHARS_REGEX = re.compile(r"[*?!]")
+
+
+def _is_pattern(pattern: str) -> bool:
+    return PATTERN_CHARS_REGEX.search(pattern) is not None
+
+
+"""
+Совпадает ли имя со списком шаблонов строки (как match_hostname в ssh):
+совпадение с отрицанием "!шаблон" исключает строку целиком
+"""
+def match_patterns(name: str, patterns: Iterable[str]) -> bool:
+    matched = False
+    for pattern in patterns:
+        negated = pattern.startswith("!")
+        if negated:
+            pattern = pattern[1:]
+        if pattern == name or (_is_pattern(pattern) and fnmatch.fnmatchcase(name, pattern)):
+            if negated:
+                return False
+            matched = True
+    return matched
+
+
+def _parse_hashed(field: str) -> Optional[Tuple[bytes, bytes]]:
+    parts = field[len(HASH_MAGIC):].split("|")
+    if len(parts) != 2:
+        return None
+    try:
+        salt = binascii.a2b_base64(parts[0])
+        digest = binascii.a2b_base64(parts[1])
+    except (binascii.Error, ValueError):
+        return None
+    if len(digest) != SHA1_SIZE:
+        return None
+    return salt, digest
+
+
+"""
+Разбирает строку known_hosts
+
+Возвращает KnownHost, None для пустых строк и комментариев,
+и False для испорченных строк (не хватает полей, битое хэшированное имя;
+base64 соли и хэша проверяется только при первом поиске по хэшам)
+"""
+def parse_line(text: str, line: int = 0, start: int = 0, end: int = 0):
+    stripped = text.strip()
+    if not stripped or stripped.startswith("#"):
+        return None
+    marker = None
+    if stripped.startswith("@"):
+        marker, _, stripped = stripped.partition(" ")
+        stripped = stripped.lstrip()
+    fields = stripped.split(None, 3)
+    if len(fields) < 3:
+        return False
+    hosts, key_type, key = fields[0], fields[1], fields[2]
+    comment = fields[3] if len(fields) > 3 else ""
+    if hosts.startswith(HASH_MAGIC) and hosts.count("|") != 3:
+        return False
+    return KnownHost(line, marker, hosts, key_type, key, comment, start, end)
+
+
+"""
+Разобранный known_hosts, который держится в памяти
+
+Файл разбирается один раз и перечитывается, только если изменились
+inode, размер или mtime. Индексы:
+- открытые имена без шаблонов - словарь имя -> строки (поиск за O(1)),
+- строки с шаблонами (*, ?, !) - отдельный список, проверяется fnmatch,
+- хэшированные строки - словарь HMAC -> строки и список различных солей
+  (строится при первом поиске: соли раскодируются только тогда)
+
+Для хэшированных строк имя нельзя достать из файла: при поиске
+HMAC-SHA1 считается для каждой соли. lookup_many считает сразу все имена
+для соли (состояние HMAC готовится один раз на соль), а результат для каждого
+имени кэшируется до изменения файла, поэтому повторные запросы не
+просматривают соли заново
+
+Удаление - потоковая перезапись: сохраняемые участки файла копируются
+большими кусками по смещениям строк во временный файл, затем rename
+"""
+class KnownHosts:
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._loaded = False
+        # строки с ключами: (номер, начало, конец, текст) и поле имён каждой
+        self._rows: List[Tuple[int, int, int, str]] = []
+        self._host_fields: List[str] = []
+        self._entries: Optional[List[KnownHost]] = None
+        self._invalid: List[Tuple[int, int, int]] = []
+        # текст испорченных строк (номер -> строка) - для проверки перед удалением
+        self._invalid_text: Dict[int, str] = {}
+        self._plain: Dict[str, List[int]] = {}
+        self._patterned: List[int] = []
+        self._hashed: List[int] = []
+        self._by_digest: Optional[Dict[bytes, List[int]]] = None
+        self._salts: Dict[bytes, List[int]] = {}
+        self._hash_cache: Dict[str, Tuple[int, ...]] = {}
+
+    def _current_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def is_stale(self) -> bool:
+        return not self._loaded or self._current_stamp() != self._stamp
+
+    """
+    Принудительно перечитывает файл
+    """
+    def reload(self) -> None:
+        stamp = self._current_stamp()
+        data = self.path.read_bytes() if stamp is not None else b""
+
+        rows: List[Tuple[int, int, int, str]] = []
+        host_fields: List[str] = []
+        invalid: List[Tuple[int, int, int]] = []
+        invalid_text: Dict[int, str] = {}
+        plain: Dict[str, List[int]] = {}
+        patterned: List[int] = []
+        hashed: List[int] = []
+
+        text = data.decode("utf-8", errors="replace")
+        # без многобайтных символов смещения в строке совпадают с байтовыми
+        single_byte = len(text) == len(data)
+        pos = 0
+        for number, line in enumerate(text.splitlines(keepends=True), 1):
+            start = pos
+            pos += len(line) if single_byte else len(line.encode("utf-8"))
+            # здесь нужно только поле имён, строка целиком разбирается parse_line по запросу
+            fields = line.split(None, 3)
+            if not fields or fields[0].startswith("#"):
+                continue
+            if fields[0].startswith("@"):
+                fields = fields[1:]
+            hosts = fields[0] if fields else ""
+            if len(fields) < 3 or (hosts.startswith(HASH_MAGIC) and hosts.count("|") != 3):
+                invalid.append((number, start, pos))
+                invalid_text[number] = line
+                continue
+
+            i = len(rows)
+            rows.append((number, start, pos, line))
+            host_fields.append(hosts)
+            if hosts.startswith(HASH_MAGIC):
+                hashed.append(i)
+            elif _is_pattern(hosts):
+                patterned.append(i)
+            else:
+                for name in dict.fromkeys(hosts.lower().split(",")):
+                    plain.setdefault(name, []).append(i)
+
+        self._rows = rows
+        self._host_fields = host_fields
+        self._entries = None
+        self._invalid = invalid
+        self._invalid_text = invalid_text
+        self._plain = plain
+        self._patterned = patterned
+        self._hashed = hashed
+        self._by_digest = None
+        self._salts = {}
+        self._hash_cache = {}
+        self._stamp = stamp
+        self._loaded = True
+
+    def _ensure_fresh(self) -> None:
+        if self.is_stale():
+            self.reload()
+
+    """
+    Все строки с ключами (KnownHost создаются при первом обращении)
+    """
+    @property
+    def entries(self) -> List[KnownHost]:
+        self._ensure_fresh()
+        if self._entries is None:
+            self._entries = [self._entry(i) for i in range(len(self._rows))]
+        return self._entries
+
+    def _entry(self, i: int) -> KnownHost:
+        if self._entries is not None:
+            return self._entries[i]
+        number, start, end, text = self._rows[i]
+        return parse_line(text, number, start, end)
+
+    """
+    Испорченные строки: [(номер, начало, конец)]
+    """
+    @property
+    def invalid(self) -> List[Tuple[int, int, int]]:
+        self._ensure_fresh()
+        return self._invalid
+
+    def _hash_index(self) -> Dict[bytes, List[int]]:
+        if self._by_digest is None:
+            by_digest: Dict[bytes, List[int]] = {}
+            salts: Dict[bytes, List[int]] = {}
+            for i in self._hashed:
+                parsed = _parse_hashed(self._host_fields[i])
+                if parsed is not None:
+                    salts.setdefault(parsed[0], []).append(i)
+                    by_digest.setdefault(parsed[1], []).append(i)
+            self._salts = salts
+            self._by_digest = by_digest
+        return self._by_digest
+
+    def _hashed_matches(self, names: List[str]) -> Dict[str, Tuple[int, ...]]:
+        found: Dict[str, List[int]] = {name: [] for name in names if name not in self._hash_cache}
+        if found and self._hashed:
+            pending = [(name, name.encode("utf-8")) for name in found]
+            by_digest = self._hash_index()
+            sha1 = hashlib.sha1
+            for salt, same_salt in self._salts.items():
+                # HMAC-SHA1 вручную: состояния ipad / opad готовятся один раз на соль,
+                # для каждого имени только копируются (hmac.new на каждую пару заметно дороже)
+                key = salt if len(salt) <= SHA1_BLOCK_SIZE else sha1(salt).digest()
+                key = key.ljust(SHA1_BLOCK_SIZE, b"\0")
+                inner = sha1(key.translate(_IPAD))
+                outer = sha1(key.translate(_OPAD))
+                for name, raw in pending:
+                    h = inner.copy()
+                    h.update(raw)
+                    o = outer.copy()
+                    o.update(h.digest())
+                    hits = by_digest.get(o.digest())
+                    if hits:
+                        found[name].extend(i for i in hits if i in same_salt)
+        for name, hits in found.items():
+            self._hash_cache[name] = tuple(sorted(hits))
+        return {name: self._hash_cache[name] for name in names}
+
+    """
+    Строки, подходящие каждому из имён (имена уже в виде host_key_name)
+
+    Возвращает {имя: [KnownHost в порядке файла]}
+    """
+    def lookup_many(self, names: Iterable[str]) -> Dict[str, List[KnownHost]]:
+        self._ensure_fresh()
+        names = list(dict.fromkeys(name.lower() for name in names))
+        hashed = self._hashed_matches(names)
+        fields = self._host_fields
+        result: Dict[str, List[KnownHost]] = {}
+        for name in names:
+            hits = set(hashed[name])
+            hits.update(self._plain.get(name, ()))
+            hits.update(i for i in self._patterned if match_patterns(name, fields[i].lower().split(",")))
+            result[name] = [self._entry(i) for i in sorted(hits)]
+        return result
+
+    """
+    Строки для хоста (и порта) в порядке файла
+    """
+    def lookup(self, host: str, port: int = DEFAULT_PORT) -> List[KnownHost]:
+        name = host_key_name(host, port)
+        return self.lookup_many([name])[name]
+
+    """
+    Отметка файла (inode, размер, mtime), по которой разобраны текущие строки
+
+    Номера строк для remove_lines нужно брать из того же разбора и
+    передавать вместе с этой отметкой (файл здесь не перечитывается)
+    """
+    @property
+    def stamp(self) -> Optional[Tuple[int, int, int]]:
+        return self._stamp
+
+    """
+    Потоково переписывает файл без строк с указанными номерами
+
+    based_on - отметка (stamp) разбора, из которого взяты номера строк.
+    Файл мог только дописаться (ssh добавляет новые ключи в конец) - хвост
+    после разобранной части копируется как есть. Если же с тех пор файл
+    перечитан, заменён (другой inode, стал короче) или переписан на месте
+    (байты удаляемых строк уже не те), ничего не удаляется, разбор
+    сбрасывается и возвращается 0: старые номера к новому содержимому не
+    применяются
+    """
+    def remove_lines(self, lines: Iterable[int], based_on: Optional[Tuple[int, int, int]]) -> int:
+        if not self._loaded or based_on is None or based_on != self._stamp:
+            return 0
+        remove = set(lines)
+        spans = [(start, end, text) for number, start, end, text in self._rows if number in remove]
+        spans += [(start, end, self._invalid_text[number]) for number, start, end in self._invalid
+                  if number in remove]
+        spans.sort()
+        if not spans:
+            return 0
+
+        stamp = self._current_stamp()
+        if (stamp is None or stamp[0] != based_on[0] or stamp[1] < based_on[1]
+                or not self._spans_unchanged(spans)):
+            self._loaded = False
+            return 0
+        splice_file(self.path, [(start, end, b"") for start, end, _ in spans])
+        self._loaded = False
+        return len(spans)
+
+    # mtime тут не помогает: запись в тот же тик таймера его не меняет
+    def _spans_unchanged(self, spans: List[Tuple[int, int, str]]) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                for start, end, text in spans:
+                    f.seek(start)
+                    if f.read(end - start).decode("utf-8", errors="replace") != text:
+                        return False
+        except OSError:
+            return False
+        return True
+
+    """
+    Удаляет выбранные строки по свежему разбору
+
+    select() возвращает номера строк (и при необходимости перечитывает файл);
+    если файл успели переписать между разбором и удалением, выбор
+    повторяется один раз по новому содержимому
+    """
+    def _remove_selected(self, select: Callable[[], List[int]]) -> int:
+        for _ in range(2):
+            lines = select()
+            removed = self.remove_lines(lines, self._stamp)
+            if removed or self._loaded:
+                return removed
+        return 0
+
+    """
+    Удаляет строки, для которых predicate(KnownHost) истинно
+    """
+    def remove_where(self, predicate: Callable[[KnownHost], bool]) -> int:
+        return self._remove_selected(lambda: [e.line for e in self.entries if predicate(e)])
+
+    """
+    Удаляет строки хоста (как ssh-keygen -R), в том числе хэшированные и шаблоны
+
+    Строки @revoked и @cert-authority остаются, как и у ssh-keygen: иначе
+    удаление хоста отменило бы отзыв ключа и доверие к CA
+    """
+    def remove_host(self, host: str, port: int = DEFAULT_PORT) -> int:
+        return self._remove_selected(lambda: [e.line for e in self.lookup(host, port) if e.marker is None])
+
+    def _identities(self, names: Optional[Iterable[str]]) -> Dict[int, object]:
+        # чей это ключ: набор имён для открытых строк; для хэшированных -
+        # найденное имя (если его передали в names), иначе сам хэш
+        identities: Dict[int, object] = {}
+        entries = self.entries
+        for i, entry in enumerate(entries):
+            if entry.hashed:
+                identities[i] = entry.hosts
+            else:
+                identities[i] = frozenset(entry.patterns)
+        if names:
+            resolved = self._hashed_matches(list(dict.fromkeys(n.lower() for n in names)))
+            for name, hits in resolved.items():
+                for i in hits:
+                    identities[i] = frozenset((name,))
+        return identities
+
+    """
+    Повторы: строки с тем же маркером, именами и ключом, что у более ранней
+
+    names - открытые имена, под которыми искать хэшированные строки
+    (без них хэшированные строки совпадают только побайтно по хэшу)
+    """
+    def duplicates(self, names: Optional[Iterable[str]] = None) -> List[KnownHost]:
+        identities = self._identities(names)
+        seen: Set[Tuple[object, ...]] = set()
+        duplicates = []
+        for i, entry in enumerate(self.entries):
+            key = (entry.marker, identities[i], entry.key_type, entry.key)
+            if key in seen:
+                duplicates.append(entry)
+            else:
+                seen.add(key)
+        return duplicates
+
+    """
+    Испорченные строки, которые ssh всё равно пропускает: номера строк
+
+    Несколько ключей одного типа у одного имени не считаются устаревшими:
+    при смене ключа ssh не дописывает новый, а отказывается подключаться,
+    так что такие строки добавлены намеренно (балансировщик, плановая
+    замена ключа). Их убирает только superseded с явно указанным ключом
+    """
+    def stale(self) -> List[int]:
+        self._ensure_fresh()
+        return [number for number, _, _ in self._invalid]
+
+    """
+    Строки хоста с ключом того же типа, что keep ("тип base64"), но другим
+
+    Строки с шаблонами и маркерами не трогаются. Если у хоста нет строки
+    с ключом keep - ValueError (иначе хост остался бы без ключа этого типа)
+    """
+    def superseded(self, host: str, keep: str, port: int = DEFAULT_PORT) -> List[int]:
+        fields = keep.split()
+        if len(fields) < 2:
+            raise ValueError(f"ожидается ключ в виде 'тип base64': {keep}")
+        key_type, key = fields[0], fields[1]
+        entries = [e for e in self.lookup(host, port) if e.marker is None and (e.hashed or not _is_pattern(e.hosts))]
+        if not any(e.key_type == key_type and e.key == key for e in entries):
+            raise ValueError(f"у {host} нет строки с этим ключом {key_type}")
+        return [e.line for e in entries if e.key_type == key_type and e.key != key]
+
+    def dedupe(self, names: Optional[Iterable[str]] = None) -> int:
+        return self._remove_selected(lambda: [e.line for e in self.duplicates(names)])
+
+    def remove_stale(self) -> int:
+        return self._remove_selected(self.stale)
+
+    def remove_superseded(self, host: str, keep: str, port: int = DEFAULT_PORT) -> int:
+        return self._remove_selected(lambda: self.superseded(host, keep, port))
+
+
+# открытые файлы: путь -> KnownHosts
+_documents: Dict[Path, KnownHosts] = {}
+
+
+"""
+Возвращает закэшированный known_hosts (по умолчанию ~/.ssh/known_hosts)
+"""
+def load_known_hosts(path: Optional[Path] = None) -> KnownHosts:
+    path = Path(path) if path is not None else KNOWN_HOSTS_PATH
+    doc = _documents.get(path)
+    if doc is None:
+        doc = _documents[path] = KnownHosts(path)
+    return doc
+
+
+def list_known_hosts(path: Optional[Path] = None) -> List[KnownHost]:
+    return list(load_known_hosts(path).entries)
+
+
+def lookup_host(host: str, port: int = DEFAULT_PORT, path: Optional[Path] = None) -> List[KnownHost]:
+    return load_known_hosts(path).lookup(host, port)
+
+
+"""
+Удаляет ключи хоста (строки @revoked и @cert-authority остаются), возвращает число удалённых строк
+"""
+def remove_host(host: str, port: int = DEFAULT_PORT, path: Optional[Path] = None) -> int:
+    doc = load_known_hosts(path)
+    with audit_log.timed("known_hosts.remove", file=str(doc.path), host=host, port=port) as record:
+        record["removed"] = doc.remove_host(host, port)
+        return record["removed"]
+
+
+"""
+Удаляет повторяющиеся строки, возвращает число удалённых
+"""
+def dedupe(names: Optional[Iterable[str]] = None, path: Optional[Path] = None) -> int:
+    doc = load_known_hosts(path)
+    with audit_log.timed("known_hosts.dedupe", file=str(doc.path)) as record:
+        record["removed"] = doc.dedupe(names)
+        return record["removed"]
+
+
+"""
+Удаляет испорченные строки, возвращает число удалённых
+"""
+def remove_stale(path: Optional[Path] = None) -> int:
+    doc = load_known_hosts(path)
+    with audit_log.timed("known_hosts.remove_stale", file=str(doc.path)) as record:
+        record["removed"] = doc.remove_stale()
+        return record["removed"]
+
+
+"""
+Оставляет у хоста из ключей типа keep только keep ("тип base64"),
+возвращает число удалённых строк
+"""
+def remove_superseded(host: str, keep: str, port: int = DEFAULT_PORT, path: Optional[Path] = None) -> int:
+    doc = load_known_hosts(path)
+    with audit_log.timed("known_hosts.remove_superseded", file=str(doc.path), host=host, port=port) as record:
+        record["removed"] = doc.remove_superseded(host, keep, port)
+        return record["removed"]
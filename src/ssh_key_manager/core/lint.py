@@ -0,0 +1,536 @@
+import bisect
+import itertools
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from ssh_key_manager.core import ssh_config
+from ssh_key_manager.core.host_resolver import MULTI_VALUE_OPTIONS, WILDCARD_CHARS, match_pattern
+from ssh_key_manager.core.key_usage import expand_identity
+from ssh_key_manager.utils import audit_log
+
+# параметры ssh_config(5) (OpenSSH 9.x), в нижнем регистре
+KNOWN_OPTIONS = frozenset("""
+host match include addkeystoagent addressfamily batchmode bindaddress bindinterface
+canonicaldomains canonicalizefallbacklocal canonicalizehostname canonicalizemaxdots
+canonicalizepermittedcnames casignaturealgorithms certificatefile challengeresponseauthentication
+channeltimeout checkhostip ciphers clearallforwardings compression connectionattempts
+connecttimeout controlmaster controlpath controlpersist dynamicforward enableescapecommandline
+enablesshkeysign escapechar exitonforwardfailure fingerprinthash forkafterauthentication
+forwardagent forwardx11 forwardx11timeout forwardx11trusted gatewayports globalknownhostsfile
+gssapiauthentication gssapidelegatecredentials gssapikeyexchange gssapitrustdns hashknownhosts
+hostbasedacceptedalgorithms hostbasedauthentication hostbasedkeytypes hostkeyalgorithms
+hostkeyalias hostname identitiesonly identityagent identityfile ignoreunknown ipqos
+kbdinteractiveauthentication kbdinteractivedevices kexalgorithms knownhostscommand localcommand
+localforward loglevel logverbose macs nohostauthenticationforlocalhost numberofpasswordprompts
+obscurekeystroketiming passwordauthentication permitlocalcommand permitremoteopen pkcs11provider
+port preferredauthentications protocol proxycommand proxyjump proxyusefdpass
+pubkeyacceptedalgorithms pubkeyacceptedkeytypes pubkeyauthentication rekeylimit remotecommand
+remoteforward requesttty requiredrsasize revokedhostkeys securitykeyprovider sendenv
+serveralivecountmax serveraliveinterval sessiontype setenv stdinnull streamlocalbindmask
+streamlocalbindunlink stricthostkeychecking syslogfacility tag tcpkeepalive tunnel tunneldevice
+updatehostkeys usekeychain user userknownhostsfile verifyhostkeydns visualhostkey xauthlocation
+dsaauthentication smartcarddevice
+""".split())
+
+# устаревшие и снятые параметры: ssh их принимает и пропускает (с предупреждением или молча)
+DEPRECATED_OPTIONS = frozenset("""
+afstokenpassing cipher compressionlevel fallbacktorsh globalknownhostsfile2 kerberosauthentication
+kerberostgtpassing rhostsauthentication rhostsrsaauthentication rsaauthentication useprivilegedport
+useroaming usersh userknownhostsfile2
+""".split())
+
+# параметры из патчей дистрибутивов (GSSAPI key exchange в Fedora / RHEL, Debian):
+# их сборка ssh принимает, обычный OpenSSH - нет
+DISTRO_OPTIONS = frozenset("""
+gssapiclientidentity gssapikexalgorithms gssapirenewalforcesrekey gssapiserveridentity
+""".split())
+
+SEVERITIES = ("error", "warning", "info")
+
+# заголовки и Include - не параметры блока
+SKIP_OPTIONS = frozenset(("host", "match", "include"))
+
+# символы, из-за которых имя Host - не одно точное имя
+NOT_EXACT_REGEX = re.compile(r"[*?! ]")
+
+# строка параметра: "Имя значение" или "Имя=значение" (как разбирает host_resolver)
+OPTION_LINE_REGEX = re.compile(r"^[ \t]*([^\s#=][^\s=]*)(?:[ \t]*=[ \t]*|[ \t]+)(\S[^\r\n]*?)[ \t]*\r?$",
+                               re.MULTILINE)
+
+# только имя параметра из такой строки (пусто, если строка - не параметр). Шаблон
+# начинается с "\n": findall даёт ровно одно совпадение на строку и ищет по
+# переводам строк, а не пробует каждую позицию; первую строку разбирает
+# FIRST_OPTION_NAME_REGEX
+OPTION_NAME = r"[ \t]*([^\s#=][^\s=]*(?=[ \t]*=[ \t]*\S|[ \t]+\S))?"
+OPTION_NAME_REGEX = re.compile("\n" + OPTION_NAME)
+FIRST_OPTION_NAME_REGEX = re.compile(OPTION_NAME)
+
+# параметры, которые в сведениях о блоке обрабатываются отдельно от single
+SPECIAL_OPTIONS = frozenset(MULTI_VALUE_OPTIONS | SKIP_OPTIONS | {"ignoreunknown"})
+
+
+"""
+Найденная проблема: path / line - где (строка с 1), block - заголовок блока
+"""
+class LintIssue(NamedTuple):
+    severity: str
+    code: str
+    path: Path
+    line: int
+    block: str
+    message: str
+
+
+"""
+Всё, что нужно проверке от одного блока и не зависит от остального конфига
+
+line - номер первой строки блока в файле (с 1), lines - сколько в блоке
+переводов строк; остальные номера строк - тоже номера в файле.
+Разбирается один раз на версию файла. Списки хранятся кортежами: на
+больших конфигах таких записей десятки тысяч, и лишние списки в каждой
+заметно добавляют работы сборщику мусора
+"""
+class _BlockFacts(NamedTuple):
+    line: int
+    lines: int
+    patterns: Tuple[str, ...]
+    positives: Tuple[str, ...]
+    # параметры с одним значением: имя -> строка первого появления
+    single: Dict[str, int]
+    has_multi: bool
+    repeated: Tuple[Tuple[str, int, int], ...]
+    unknown: Tuple[Tuple[str, int], ...]
+    identities: Tuple[Tuple[str, int], ...]
+    ignore_unknown: Optional[str]
+
+
+"""
+Ранний блок, который может покрывать последующие
+
+line - первая строка блока в source, single - параметры самого блока
+(строки в source), extra - параметры из подключённых внутри него файлов:
+имя -> (файл, строка)
+"""
+class _Cover(NamedTuple):
+    block: ssh_config.ConfigBlock
+    source: Path
+    line: int
+    single: Dict[str, int]
+    extra: Dict[str, Tuple[Path, int]]
+
+    @property
+    def label(self) -> str:
+        return _label(self.block)
+
+    def where(self, option: str) -> Tuple[Path, int]:
+        line = self.single.get(option)
+        return (self.source, line) if line is not None else self.extra[option]
+
+
+def _literal_ends(pattern: str) -> Tuple[str, str]:
+    first = min((pattern.find(c) for c in WILDCARD_CHARS if c in pattern), default=-1)
+    if first < 0:
+        return pattern, pattern
+    last = max(pattern.rfind(c) for c in WILDCARD_CHARS)
+    return pattern[:first], pattern[last + 1:]
+
+
+def _is_wildcard(pattern: str) -> bool:
+    return "*" in pattern or "?" in pattern
+
+
+def _label(block: ssh_config.ConfigBlock) -> str:
+    if block.type == "host":
+        return f"Host {block.host}"
+    if block.type == "match":
+        return f"Match {block.criteria}"
+    return "[Глобальные настройки]"
+
+
+def _block_facts(block: ssh_config.ConfigBlock, first_line: int) -> _BlockFacts:
+    lines = block.text.split("\n")
+    single: Dict[str, int] = {}
+    repeated: List[Tuple[str, int, int]] = []
+    unknown: List[Tuple[str, int]] = []
+    identities: List[Tuple[str, int]] = []
+    has_multi = False
+    ignore_unknown = None
+    # строки по одной: split быстрее регулярного выражения, OPTION_LINE_REGEX
+    # нужен только для записи через "=" (как разбирает host_resolver)
+    for line in range(0 if block.type == "global" else 1, len(lines)):
+        fields = lines[line].split(None, 1)
+        if not fields or fields[0][0] == "#":
+            continue
+        if len(fields) == 2 and "=" not in fields[0] and fields[1][0] != "=":
+            option, value = fields[0], fields[1].rstrip()
+        else:
+            m = OPTION_LINE_REGEX.match(lines[line])
+            if m is None:
+                continue
+            option, value = m.groups()
+        option = option.lower()
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        number = first_line + line
+        if option not in KNOWN_OPTIONS:
+            unknown.append((option, number))
+        elif option in MULTI_VALUE_OPTIONS:
+            has_multi = True
+            if option == "identityfile":
+                identities.append((value, number))
+        elif option in SKIP_OPTIONS:
+            continue
+        elif option in single:
+            repeated.append((option, number, single[option]))
+        else:
+            single[option] = number
+            if option == "ignoreunknown":
+                ignore_unknown = value
+
+    return _facts(block, first_line, len(lines) - 1, single, has_multi, tuple(repeated), tuple(unknown),
+                  tuple(identities), ignore_unknown)
+
+
+def _facts(block: ssh_config.ConfigBlock, line: int, lines: int, single: Dict[str, int], has_multi: bool,
+           repeated: Tuple[Tuple[str, int, int], ...], unknown: Tuple[Tuple[str, int], ...],
+           identities: Tuple[Tuple[str, int], ...], ignore_unknown: Optional[str]) -> _BlockFacts:
+    patterns: Tuple[str, ...] = ()
+    positives: Tuple[str, ...] = ()
+    if block.type == "host":
+        patterns = tuple(block.host.lower().split())
+        positives = tuple(p for p in patterns if p[0] != "!") if "!" in block.host else patterns
+    return _BlockFacts(line, lines, patterns, positives, single, has_multi, repeated, unknown,
+                       identities, ignore_unknown)
+
+
+def _exact_host(block: ssh_config.ConfigBlock) -> Optional[str]:
+    if block.type != "host" or NOT_EXACT_REGEX.search(block.host):
+        return None
+    return block.host
+
+
+def _option_value(line: str) -> str:
+    fields = line.split(None, 1)
+    if len(fields) == 2 and "=" not in fields[0] and fields[1][0] != "=":
+        value = fields[1].rstrip()
+    else:
+        m = OPTION_LINE_REGEX.match(line)
+        value = m.group(2) if m else ""
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+    return value
+
+
+"""
+Сведения обо всех блоках файла
+
+Имена параметров ищутся одним findall по тексту всего файла (по элементу
+на строку), номера строк-параметров и их имена выбираются из него без цикла
+в Python, а параметры блока - срез этих списков. Блок, где этого мало -
+повторы, неизвестные параметры (и то и другое редкость) - разбирается
+_block_facts построчно
+"""
+def _scan_doc(blocks: List[ssh_config.ConfigBlock]) -> Dict[int, _BlockFacts]:
+    texts = [block.text for block in blocks]
+    whole = "".join(texts)
+    lowered = whole.lower()
+    names = [FIRST_OPTION_NAME_REGEX.match(lowered).group(1) or ""] + OPTION_NAME_REGEX.findall(lowered)
+    numbers = list(itertools.compress(itertools.count(1), names))
+    options = list(filter(None, names))
+    # исходные строки - только для значений IdentityFile / IgnoreUnknown
+    source_lines: Optional[List[str]] = None
+    all_facts: Dict[int, _BlockFacts] = {}
+    line, i = 1, 0
+    for block, text in zip(blocks, texts):
+        count = text.count("\n")
+        # последняя строка без перевода строки - тоже строка блока
+        end = line + count + (0 if text.endswith("\n") else 1)
+        j = bisect.bisect_left(numbers, end, i)
+        # первый параметр блока Host / Match - сам заголовок
+        first = i + 1 if block.type != "global" and i < j and numbers[i] == line else i
+        single = dict(zip(options[first:j], numbers[first:j]))
+        if len(single) != j - first or not KNOWN_OPTIONS.issuperset(single):
+            all_facts[id(block)] = _block_facts(block, line)
+        else:
+            # без повторов IdentityFile в блоке не больше одного
+            identities: Tuple[Tuple[str, int], ...] = ()
+            ignore_unknown = None
+            has_multi = False
+            if not SPECIAL_OPTIONS.isdisjoint(single):
+                if source_lines is None:
+                    source_lines = whole.split("\n")
+                for option in single.keys() & SPECIAL_OPTIONS:
+                    if option == "ignoreunknown":
+                        ignore_unknown = _option_value(source_lines[single[option] - 1])
+                        continue
+                    number = single.pop(option)
+                    if option == "identityfile":
+                        identities = ((_option_value(source_lines[number - 1]), number),)
+                    has_multi = has_multi or option in MULTI_VALUE_OPTIONS
+            all_facts[id(block)] = _facts(block, line, count, single, has_multi, (), (), identities,
+                                          ignore_unknown)
+        line += count
+        i = j
+    return all_facts
+
+
+# разобранные блоки по файлу: (список блоков, {id(блок): сведения})
+_parsed: Dict[Path, Tuple[List[ssh_config.ConfigBlock], Dict[int, _BlockFacts]]] = {}
+
+
+def _doc_facts(doc: ssh_config.SSHConfig) -> Dict[int, _BlockFacts]:
+    blocks = doc.blocks
+    cached = _parsed.get(doc.path)
+    if cached is None or cached[0] is not blocks:
+        cached = _parsed[doc.path] = (blocks, _scan_doc(blocks))
+    return cached[1]
+
+
+"""
+Покрывает ли шаблон general все имена шаблона specific
+
+Для точного имени - обычное сопоставление; для шаблона - только
+надёжные случаи ("*" и шаблоны с одной "*"), в остальных считается,
+что не покрывает (проверка не даёт ложных срабатываний)
+"""
+def covers(general: str, specific: str) -> bool:
+    if not _is_wildcard(specific):
+        return match_pattern(specific, general)
+    if general == "*":
+        return True
+    if "?" in general or general.count("*") != 1:
+        return general == specific
+    prefix, suffix = general.split("*")
+    lit_prefix, lit_suffix = _literal_ends(specific)
+    return (lit_prefix.startswith(prefix) and lit_suffix.endswith(suffix)
+            and len(lit_prefix) >= len(prefix) and len(lit_suffix) >= len(suffix))
+
+
+"""
+Ранние блоки с шаблонами по корзинам литерального префикса или суффикса
+(как в HostResolver): для каждого блока проверяются только подходящие корзины
+"""
+class _Coverage:
+
+    def __init__(self):
+        self.exact: Dict[str, List[_Cover]] = {}
+        self.by_prefix: Dict[str, List[Tuple[str, _Cover]]] = {}
+        self.by_suffix: Dict[str, List[Tuple[str, _Cover]]] = {}
+        self.always: List[_Cover] = []
+        # параметры, заданные блоками с шаблонами и глобальными строками: если
+        # у блока нет ни одного из них и его имён нет в exact, искать незачем
+        self.options: Set[str] = set()
+        # длины префиксов и суффиксов, для которых есть корзины
+        self.prefix_lengths: List[int] = []
+        self.suffix_lengths: List[int] = []
+
+    def add(self, patterns: Tuple[str, ...], cover: _Cover) -> None:
+        for pattern in patterns:
+            if not _is_wildcard(pattern):
+                self.exact.setdefault(pattern, []).append(cover)
+                continue
+            self.options.update(cover.single)
+            self.options.update(cover.extra)
+            prefix, suffix = _literal_ends(pattern)
+            if len(prefix) >= len(suffix):
+                self.by_prefix.setdefault(prefix, []).append((pattern, cover))
+                if len(prefix) not in self.prefix_lengths:
+                    self.prefix_lengths.append(len(prefix))
+            else:
+                self.by_suffix.setdefault(suffix, []).append((pattern, cover))
+                if len(suffix) not in self.suffix_lengths:
+                    self.suffix_lengths.append(len(suffix))
+
+    def might_cover(self, facts: _BlockFacts) -> bool:
+        return (not self.options.isdisjoint(facts.single)
+                or any(p in self.exact for p in facts.positives))
+
+    """
+    Ранние блоки, которые действуют для всех имён шаблона
+    """
+    def covering(self, pattern: str) -> List[_Cover]:
+        found = list(self.always)
+        if _is_wildcard(pattern):
+            lit_prefix, lit_suffix = _literal_ends(pattern)
+        else:
+            found.extend(self.exact.get(pattern, ()))
+            lit_prefix = lit_suffix = pattern
+        for n in self.prefix_lengths:
+            if n <= len(lit_prefix):
+                for general, cover in self.by_prefix.get(lit_prefix[:n], ()):
+                    if covers(general, pattern):
+                        found.append(cover)
+        for n in self.suffix_lengths:
+            if n <= len(lit_suffix):
+                for general, cover in self.by_suffix.get(lit_suffix[len(lit_suffix) - n:], ()):
+                    if covers(general, pattern):
+                        found.append(cover)
+        return found
+
+
+def _shadowing(coverage: _Coverage, facts: _BlockFacts) -> Dict[str, _Cover]:
+    # параметр не действует, если для каждого шаблона его уже задал покрывающий блок
+    shadowing: Dict[str, _Cover] = {}
+    for n, pattern in enumerate(facts.positives):
+        found: Dict[str, _Cover] = {}
+        for cover in coverage.covering(pattern):
+            for options in (cover.single, cover.extra):
+                for option in options:
+                    if option in facts.single and option not in found:
+                        found[option] = cover
+        shadowing = found if n == 0 else {o: c for o, c in shadowing.items() if o in found}
+        if not shadowing:
+            break
+    return shadowing
+
+
+"""
+Проверяет объединённый конфиг (по умолчанию ~/.ssh/config, с Include) за один проход
+
+Находит:
+- duplicate-host: повтор блока Host с тем же списком шаблонов
+  (add_or_update_host меняет только первый из них),
+- shadowed-host: блок Host, все параметры которого уже заданы более ранними
+  блоками, покрывающими все его имена (первое значение побеждает),
+- overridden-option: отдельный параметр такого блока, который не действует,
+- repeated-option: повтор параметра внутри блока (действует первый),
+- unknown-option: неизвестный ssh параметр (ssh с ним не запустится),
+- deprecated-option: устаревший параметр, который ssh пропускает,
+- distro-option: параметр из патчей дистрибутивов (другая сборка ssh
+  с ним не запустится),
+- missing-identity: IdentityFile указывает на несуществующий файл
+
+Возвращает проблемы в порядке обхода конфига; stat файлов ключей
+кэшируется на время прохода
+"""
+def lint(path: Optional[Path] = None) -> List[LintIssue]:
+    issues: List[LintIssue] = []
+    coverage = _Coverage()
+    # первый блок с этим списком шаблонов (его же _Cover - без отдельной записи на блок)
+    first_host: Dict[Tuple[str, ...], _Cover] = {}
+    covers_by_block: Dict[int, _Cover] = {}
+    ignore_unknown: List[str] = []
+    # раскрытые пути IdentityFile и есть ли такие файлы - на время прохода
+    identity_cache: Dict[Tuple[str, Optional[str]], Optional[str]] = {}
+    exists_cache: Dict[str, bool] = {}
+    # по файлу: (конец последней части блока, номер строки после неё)
+    part_ends: Dict[int, Tuple[int, int]] = {}
+    doc_facts: Dict[int, Dict[int, _BlockFacts]] = {}
+
+    with audit_log.timed("config.lint") as record:
+        for doc, block, guard in ssh_config.walk_config(path):
+            all_facts = doc_facts.get(id(doc))
+            if all_facts is None:
+                all_facts = doc_facts[id(doc)] = _doc_facts(doc)
+            facts = all_facts.get(id(block))
+            if facts is None:
+                # часть блока, разрезанного по Include (части кэширует сам документ):
+                # первая начинается с блока, следующие - там, где кончилась предыдущая
+                end, line_no = part_ends.get(id(doc), (-1, 0))
+                if end != block.start:
+                    line_no = all_facts[id(block.parent)].line
+                facts = all_facts[id(block)] = _block_facts(block, line_no)
+            if block.parent is not None:
+                part_ends[id(doc)] = (block.end, facts.line + facts.lines)
+            source, line_no = doc.path, facts.line
+            # строки после Include и строки подключённого файла относятся к охватывающему блоку
+            owner = guard if block.type == "global" and guard is not None else block
+
+            if facts.ignore_unknown is not None and not ignore_unknown:
+                ignore_unknown = [p for p in facts.ignore_unknown.lower().split(",") if p]
+            for option, line in facts.unknown:
+                if option in DEPRECATED_OPTIONS:
+                    # IgnoreUnknown на них не действует: ssh их знает
+                    issues.append(LintIssue("warning", "deprecated-option", source, line, _label(owner),
+                                            f"устаревший параметр {option}: ssh его пропускает"))
+                elif any(match_pattern(option, p) for p in ignore_unknown):
+                    continue
+                elif option in DISTRO_OPTIONS:
+                    issues.append(LintIssue("warning", "distro-option", source, line, _label(owner),
+                                            f"параметр {option} есть только в сборках ssh с патчами "
+                                            "дистрибутивов, другая сборка с ним не запустится"))
+                else:
+                    issues.append(LintIssue("error", "unknown-option", source, line, _label(owner),
+                                            f"неизвестный параметр {option}"))
+            for option, line, first in facts.repeated:
+                issues.append(LintIssue("info", "repeated-option", source, line, _label(owner),
+                                        f"{option} уже задан в строке {first} этого блока, "
+                                        "действует первое значение"))
+            for value, line in facts.identities:
+                # %h / %n зависят от хоста, остальное раскрывается одинаково
+                key = (value, _exact_host(owner) if "%" in value else None)
+                if key in identity_cache:
+                    expanded = identity_cache[key]
+                else:
+                    expanded = identity_cache[key] = expand_identity(value, key[1])
+                if expanded is None:
+                    continue
+                exists = exists_cache.get(expanded)
+                if exists is None:
+                    exists = exists_cache[expanded] = os.path.exists(expanded)
+                if not exists:
+                    issues.append(LintIssue("warning", "missing-identity", source, line, _label(owner),
+                                            f"файл ключа не найден: {value}"))
+
+            if block.type == "global":
+                if guard is None:
+                    # строки вне блоков действуют для всех хостов
+                    coverage.always.append(_Cover(block, source, line_no, facts.single, {}))
+                    coverage.options.update(facts.single)
+                else:
+                    # строки подключённого файла - часть охватывающего Host
+                    cover = covers_by_block.get(id(guard))
+                    if cover is not None:
+                        for option, line in facts.single.items():
+                            if option not in cover.single:
+                                cover.extra.setdefault(option, (source, line))
+                        coverage.options.update(facts.single)
+                continue
+            if block.type != "host":
+                continue
+
+            first = first_host.get(facts.patterns)
+            if first is not None:
+                label = _label(block)
+                issues.append(LintIssue("warning", "duplicate-host", source, line_no, label,
+                                        f"повтор {label} (первый блок: {first.source.name}:{first.line}); "
+                                        "изменения попадут только в первый"))
+                continue
+
+            if facts.single and facts.positives and coverage.might_cover(facts):
+                shadowing = _shadowing(coverage, facts)
+                if len(shadowing) == len(facts.single) and not facts.has_multi:
+                    issues.append(LintIssue("warning", "shadowed-host", source, line_no, _label(block),
+                                            "все параметры блока уже заданы раньше: "
+                                            + ", ".join(f"{o} ({c.label})" for o, c in shadowing.items())))
+                else:
+                    for option, cover in shadowing.items():
+                        where = cover.where(option)
+                        issues.append(LintIssue("warning", "overridden-option", source,
+                                                facts.single[option], _label(block),
+                                                f"{option} не действует: уже задан в {cover.label} "
+                                                f"({where[0].name}:{where[1]})"))
+
+            cover = first_host[facts.patterns] = _Cover(block, source, line_no, facts.single, {})
+            if block.includes:
+                covers_by_block[id(block)] = cover
+            # Host из файла, подключённого внутри Host / Match, действует только
+            # когда совпал охватывающий блок - последующие блоки он покрывает не
+            # всегда, поэтому в coverage не попадает (без ложных срабатываний)
+            if guard is None and len(facts.positives) == len(facts.patterns):
+                coverage.add(facts.positives, cover)
+
+        record.update(ok=True, issues=len(issues))
+    return issues
+
+
+"""
+Сколько проблем каждого уровня
+"""
+def summarize(issues: List[LintIssue]) -> Dict[str, int]:
+    counts = {severity: 0 for severity in SEVERITIES}
+    for item in issues:
+        counts[item.severity] += 1
+    return counts
@@ -0,0 +1,308 @@
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from ssh_key_manager.core import key_manager, ssh_config
+from ssh_key_manager.core.key_manager import KeyResult, KeySpec
+from ssh_key_manager.core.key_usage import DEFAULT_IDENTITIES, IDENTITY_REGEX, KeyReference, expand_identity
+from ssh_key_manager.utils import audit_log
+from ssh_key_manager.utils.filesystem import atomic_write
+
+# подкаталог ~/.ssh для выведенных из работы ключей
+ARCHIVE_DIR_NAME = "retired"
+
+# суффикс даты, который добавляет ротация (снимается при следующей)
+DATE_SUFFIX_REGEX = re.compile(r"-\d{8}(?:-\d+)?$")
+
+# символы, из-за которых имя Host - не одно точное имя
+NOT_EXACT_CHARS = "*?! "
+
+
+"""
+Замена одного ключа
+
+references - блоки конфига, в которых будет переписан IdentityFile
+"""
+class RotationItem(NamedTuple):
+    old_name: str
+    new_name: str
+    spec: KeySpec
+    references: List[KeyReference]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"old": self.old_name, "new": self.new_name, "key_type": self.spec.key_type,
+                "bits": self.spec.bits, "comment": self.spec.comment,
+                "references": [{"file": str(ref.source), "block": ref.label, "identity_file": ref.identity}
+                               for ref in self.references]}
+
+
+"""
+План ротации
+
+problems - {имя ключа: почему его нельзя заменить}; план с проблемами
+не выполняется. archive_dir - куда будут перенесены старые пары
+"""
+class RotationPlan(NamedTuple):
+    items: List[RotationItem]
+    problems: Dict[str, str]
+    archive_dir: Path
+
+    @property
+    def files(self) -> List[Path]:
+        return list(dict.fromkeys(ref.source for item in self.items for ref in item.references))
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"keys": [item.to_json() for item in self.items], "problems": self.problems,
+                "files": [str(path) for path in self.files], "archive_dir": str(self.archive_dir)}
+
+
+"""
+Результат ротации: пары старое -> новое имя, переписанные файлы конфига
+и каталог со старыми ключами
+"""
+class RotationResult(NamedTuple):
+    rotated: Dict[str, str]
+    files: List[str]
+    archive_dir: str
+
+
+"""
+Имя для новой пары: имя без прежнего суффикса даты + -ГГГГММДД
+
+taken - имена, которые уже заняты в этом пакете
+"""
+def new_key_name(name: str, stamp: Optional[float] = None, taken: Iterable[str] = ()) -> str:
+    base = DATE_SUFFIX_REGEX.sub("", name) or name
+    candidate = f"{base}-{time.strftime('%Y%m%d', time.localtime(stamp))}"
+    taken = set(taken)
+    n = 1
+    while (candidate == name or candidate in taken or (key_manager.SSH_DIR / candidate).exists()
+           or (key_manager.SSH_DIR / f"{candidate}.pub").exists()):
+        n += 1
+        candidate = f"{base}-{time.strftime('%Y%m%d', time.localtime(stamp))}-{n}"
+    return candidate
+
+
+def _key_spec(name: str, new_name: str, key_type: Optional[str], bits: Optional[int],
+              comment: Optional[str]) -> Tuple[Optional[KeySpec], str]:
+    info = key_manager.get_key_info(name)
+    old_type = info.key_type.lower() if info.key_type else None
+    if key_type is None and old_type not in key_manager.KEY_TYPES:
+        return None, f"не удалось определить тип ключа: {info.key_type or 'неизвестен'}"
+    new_type = (key_type or old_type).lower()
+    if bits is None and new_type == old_type and new_type in ("rsa", "ecdsa"):
+        # тот же тип - тот же размер
+        bits = info.bits
+    if comment is None:
+        comment = info.comment or ""
+    return KeySpec(new_name, new_type, None, comment, bits), ""
+
+
+def _block_host(block: ssh_config.ConfigBlock, guard: Optional[ssh_config.ConfigBlock]) -> Tuple[Optional[str], str]:
+    owner = guard if block.type == "global" and guard is not None else block
+    if owner.type == "host":
+        return owner.host, f"Host {owner.host}"
+    if owner.type == "match":
+        return None, f"Match {owner.criteria}"
+    return None, "[Глобальные настройки]"
+
+
+def _new_identity(value: str, new_path: str) -> str:
+    stripped = value[:-4] if value.endswith(".pub") else value
+    base = os.path.basename(stripped)
+    if base and "%" not in base:
+        # каталог оставляем как в файле (~/.ssh/, %d/.ssh/ ...), меняем только имя
+        new_value = stripped[:len(stripped) - len(base)] + os.path.basename(new_path)
+    else:
+        home = os.path.expanduser("~")
+        new_value = "~" + new_path[len(home):] if new_path.startswith(home + os.sep) else new_path
+    return new_value + ".pub" if value.endswith(".pub") else new_value
+
+
+"""
+Новые тексты блоков, в которых IdentityFile указывает на заменяемые ключи
+
+by_path - {путь старого ключа: путь нового}
+Возвращает [(документ, блок, новый текст, [(ссылка, путь нового ключа)])]
+в порядке конфига
+"""
+def _rewrites(by_path: Dict[str, str]) -> List[Tuple[ssh_config.SSHConfig, ssh_config.ConfigBlock, str,
+                                                     List[Tuple[KeyReference, str]]]]:
+    found = []
+    for doc, part, guard in ssh_config.walk_config():
+        # блок, разрезанный по Include, переписывается целиком один раз
+        block = part.parent or part
+        if part is not block and part.start != block.start:
+            continue
+        text = block.text
+        if "identityfile" not in text.lower():
+            continue
+        host, label = _block_host(block, guard)
+        exact = host if host and not any(c in host for c in NOT_EXACT_CHARS) else None
+        parts: List[str] = []
+        refs: List[Tuple[KeyReference, str]] = []
+        pos = 0
+        for m in IDENTITY_REGEX.finditer(text):
+            group = 1 if m.group(1) is not None else 2
+            value = m.group(group)
+            new_path = by_path.get(expand_identity(value, exact) or "")
+            if new_path is None:
+                continue
+            new_value = _new_identity(value, new_path)
+            if group == 2 and " " in new_value:
+                new_value = f'"{new_value}"'
+            parts += [text[pos:m.start(group)], new_value]
+            pos = m.end(group)
+            refs.append((KeyReference(doc.path, host, label, value), new_path))
+        if refs:
+            found.append((doc, block, "".join(parts) + text[pos:], refs))
+    return found
+
+
+"""
+Строит план замены ключей (ничего не меняет на диске)
+
+names - имена ключей в ~/.ssh; key_type / bits / comment - параметры новых
+пар (по умолчанию как у старых: тот же тип, размер и комментарий)
+
+Ключ со стандартным именем (id_ed25519 и т.п.) без ссылок IdentityFile
+ssh пробует сам: после ротации он пропадёт, а на новое имя ничего не
+укажет. Такой ключ попадает в problems, если не передан allow_defaults
+"""
+def plan_rotation(names: Iterable[str], key_type: Optional[str] = None, bits: Optional[int] = None,
+                  comment: Optional[str] = None, stamp: Optional[float] = None,
+                  allow_defaults: bool = False) -> RotationPlan:
+    stamp = time.time() if stamp is None else stamp
+    items: List[RotationItem] = []
+    problems: Dict[str, str] = {}
+    taken: List[str] = []
+    for name in dict.fromkeys(names):
+        if not key_manager.is_private_key_file(key_manager.SSH_DIR / name):
+            problems[name] = "ключ не найден"
+            continue
+        new_name = new_key_name(name, stamp, taken)
+        spec, problem = _key_spec(name, new_name, key_type, bits, comment)
+        if spec is None:
+            problems[name] = problem
+            continue
+        taken.append(new_name)
+        items.append(RotationItem(name, new_name, spec, []))
+
+    for name, problem in key_manager.validate_key_specs([item.spec for item in items]).items():
+        old = next(item.old_name for item in items if item.new_name == name)
+        problems[old] = f"{name}: {problem}"
+    items = [item for item in items if item.old_name not in problems]
+
+    by_path = {str(key_manager.SSH_DIR / item.old_name): str(key_manager.SSH_DIR / item.new_name) for item in items}
+    refs: Dict[str, List[KeyReference]] = {}
+    for _, _, _, block_refs in _rewrites(by_path):
+        for ref, new_path in block_refs:
+            refs.setdefault(new_path, []).append(ref)
+    items = [item._replace(references=refs.get(str(key_manager.SSH_DIR / item.new_name), [])) for item in items]
+    if not allow_defaults:
+        for item in items:
+            if item.old_name in DEFAULT_IDENTITIES and not item.references:
+                problems[item.old_name] = ("стандартный ключ без IdentityFile: ssh пробует его сам, "
+                                           "а на новое имя ни один хост не укажет")
+        items = [item for item in items if item.old_name not in problems]
+    archive_dir = key_manager.SSH_DIR / ARCHIVE_DIR_NAME / time.strftime("%Y%m%d-%H%M%S", time.localtime(stamp))
+    return RotationPlan(items, problems, archive_dir)
+
+
+def _key_files(name: str) -> List[str]:
+    return [name, f"{name}.pub", f"{name}-cert.pub"]
+
+
+def _delete_new(items: List[RotationItem]) -> None:
+    for item in items:
+        key_manager.delete_keypair(item.new_name)
+
+
+# вызывается под config_lock той же ротации: иначе между записью и откатом
+# успеет записать кто-то другой, и откат молча затрёт его изменения
+def _restore_config(backups: Dict[Path, bytes]) -> None:
+    for path, data in backups.items():
+        try:
+            if path.read_bytes() == data:
+                continue
+        except FileNotFoundError:
+            pass
+        with atomic_write(path) as f:
+            f.write(data)
+
+
+"""
+Выполняет план (пакетная замена ключей):
+1. новые пары генерируются параллельно (key_manager.generate_keypairs),
+2. все строки IdentityFile, которые указывают на старые ключи (во всех
+   подключённых файлах), переписываются в одной транзакции ssh_config -
+   одна запись на файл, сколько бы ключей и хостов ни менялось,
+3. старые пары переносятся в ~/.ssh/retired/<время>/ (list_keys их уже не видит)
+
+Если шаг не удался, сделанное откатывается (файлы конфига - к прежнему
+содержимому, старые ключи - на место, новые удаляются) и выбрасывается
+RuntimeError; план с проблемами не выполняется (ValueError).
+passphrase - пароль для новых ключей, max_workers / on_result - как у
+generate_keypairs
+"""
+def rotate(plan: RotationPlan, passphrase: Optional[str] = None, max_workers: Optional[int] = None,
+           on_result: Optional[Callable[[KeyResult], None]] = None) -> RotationResult:
+    if plan.problems:
+        details = "; ".join(f"{name}: {problem}" for name, problem in plan.problems.items())
+        raise ValueError(f"план ротации содержит ошибки: {details}")
+    items = plan.items
+    if not items:
+        return RotationResult({}, [], str(plan.archive_dir))
+
+    with audit_log.timed("key.rotate", count=len(items)) as record:
+        results = key_manager.generate_keypairs([item.spec._replace(passphrase=passphrase) for item in items],
+                                                max_workers=max_workers, on_result=on_result)
+        failed = [r for r in results if not r.success]
+        if failed:
+            _delete_new(items)
+            raise RuntimeError("не удалось создать новые ключи: "
+                               + "; ".join(f"{r.key_name}: {r.error}" for r in failed))
+
+        # ссылки ищутся заново под блокировкой: конфиг мог измениться после плана
+        by_path = {str(key_manager.SSH_DIR / item.old_name): str(key_manager.SSH_DIR / item.new_name)
+                   for item in items}
+        backups: Dict[Path, bytes] = {}
+        # блокировка держится до конца отката: транзакция внутри берёт её повторно
+        with ssh_config.config_lock():
+            try:
+                with ssh_config.transaction() as tx:
+                    for doc, block, text, _ in _rewrites(by_path):
+                        if doc.path not in backups:
+                            backups[doc.path] = doc.path.read_bytes()
+                        tx.replace(block, text, doc.path)
+            except Exception as e:
+                _restore_config(backups)
+                _delete_new(items)
+                raise RuntimeError(f"не удалось обновить ssh-конфиг: {e}") from e
+
+            moved: List[Tuple[Path, Path]] = []
+            try:
+                plan.archive_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+                for item in items:
+                    for name in _key_files(item.old_name):
+                        src = key_manager.SSH_DIR / name
+                        if src.exists():
+                            dst = plan.archive_dir / name
+                            os.replace(src, dst)
+                            moved.append((src, dst))
+            except OSError as e:
+                for src, dst in reversed(moved):
+                    os.replace(dst, src)
+                try:
+                    plan.archive_dir.rmdir()
+                except OSError:
+                    pass
+                _restore_config(backups)
+                _delete_new(items)
+                raise RuntimeError(f"не удалось перенести старые ключи в {plan.archive_dir}: {e}") from e
+
+        files = [str(path) for path in backups]
+        record.update(ok=True, files=files, archive_dir=str(plan.archive_dir))
+    return RotationResult({item.old_name: item.new_name for item in items}, files, str(plan.archive_dir))
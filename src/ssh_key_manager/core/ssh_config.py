@@ -1,12 +1,644 @@
+import glob
+import itertools
 import os
+import re
+import shlex
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Optional, Union
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # не POSIX: остаётся только блокировка внутри процесса
+    fcntl = None
+
+from ssh_key_manager.utils import audit_log, validators
+from ssh_key_manager.utils.filesystem import atomic_write, splice_file
 
 # путь к ssh конигу текущего пользователя
 CONFIG_PATH = Path.home() / ".ssh" / "config"
 
+# предельная глубина вложенности Include (как в ssh)
+MAX_INCLUDE_DEPTH = 16
+
+# как часто повторять попытку взять занятую блокировку конфига (секунды)
+LOCK_POLL_INTERVAL = 0.05
+
+# после скольких поисков хоста транзакция строит общий индекс всех файлов
+INDEX_AFTER_LOOKUPS = 8
+
+# строка, открывающая новый блок: "Host a b", "Match user x", "Host=a"
+BLOCK_HEADER_REGEX = re.compile(
+    rb"^[ \t]*(host|match)(?:[ \t]*=[ \t]*|[ \t]+)(\S[^\r\n]*?)[ \t\r]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# директива Include (может повторяться в одном блоке)
+INCLUDE_REGEX = re.compile(
+    rb"^[ \t]*include(?:[ \t]*=[ \t]*|[ \t]+)(\S[^\r\n]*?)[ \t\r]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# то же для разбора всего файла за один проход: Host / Match / Include с начала
+# строки (группа 1 - пустая, на начале строки). Шаблон начинается с "\n", чтобы
+# поиск шёл по переводам строк, а не пробовал каждую позицию; первую строку
+# проверяет FIRST_DIRECTIVE_REGEX
+DIRECTIVE_LINE = rb"()[ \t]*(host|match|include)(?:[ \t]*=[ \t]*|[ \t]+)(\S(?:[^\r\n]*\S)?)[ \t\r]*$"
+DIRECTIVE_REGEX = re.compile(rb"\n" + DIRECTIVE_LINE, re.IGNORECASE | re.MULTILINE)
+FIRST_DIRECTIVE_REGEX = re.compile(DIRECTIVE_LINE, re.IGNORECASE | re.MULTILINE)
+
+
+"""
+Блок ssh-конфига в компактном виде
+
+Хранит только заголовок (тип, Host или условия Match, пути Include) и
+диапазон байт в исходном буфере. Строки и параметры не копируются при
+разборе, а декодируются из буфера при обращении к lines / params
+
+include_ends - для каждой строки Include: (смещение конца строки от
+начала блока, её пути); parent - исходный блок, если это часть блока,
+разрезанного по строкам Include (см. parts)
+
+Для совместимости с прежним представлением поддерживает чтение как словарь:
+block["type"], block.get("host"), block["lines"], block.get("params", {})
+"""
+class ConfigBlock:
+    __slots__ = ("type", "host", "criteria", "includes", "include_ends", "parent", "start", "end", "_buf", "_off")
+
+    def __init__(self, block_type: str, buf: bytes, off: int, start: int, end: int,
+                 host: Optional[str] = None, criteria: Optional[str] = None,
+                 includes: Optional[List[str]] = None,
+                 include_ends: Optional[List[Tuple[int, List[str]]]] = None,
+                 parent: Optional["ConfigBlock"] = None):
+        self.type = block_type
+        self.host = host
+        self.criteria = criteria
+        self.includes = includes
+        self.include_ends = include_ends
+        self.parent = parent
+        self.start = start
+        self.end = end
+        self._buf = buf
+        self._off = off
+
+    """
+    Исходный текст блока
+    """
+    @property
+    def text(self) -> str:
+        return self._buf[self._off:self._off + self.end - self.start].decode("utf-8", errors="replace")
+
+    @property
+    def lines(self) -> List[str]:
+        return self.text.splitlines(keepends=True)
+
+    """
+    Параметры блока (последнее значение ключа побеждает, как и раньше)
+    """
+    @property
+    def params(self) -> Dict[str, str]:
+        params: Dict[str, str] = {}
+        lines = self.lines if self.type == "global" else self.lines[1:]
+        for line in lines:
+            stripped = line.strip()
+            if stripped and not stripped.startswith("#"):
+                parts = stripped.split(maxsplit=1)
+                if len(parts) == 2:
+                    params[parts[0]] = parts[1]
+        return params
+
+    """
+    Копия блока, сдвинутая на delta байт в файле (буфер тот же)
+    """
+    def shifted(self, delta: int) -> "ConfigBlock":
+        if not delta:
+            return self
+        return ConfigBlock(self.type, self._buf, self._off, self.start + delta, self.end + delta,
+                           self.host, self.criteria, self.includes, self.include_ends)
+
+    """
+    Блок, разрезанный после каждой строки Include
+
+    ssh читает подключённый файл на месте директивы, поэтому строки блока
+    после Include идут уже после блоков подключённого файла. Первая часть -
+    заголовок и строки до первого Include включительно, остальные - "global"
+    части (строки, действующие в рамках этого Host/Match). У каждой части
+    includes - пути её последней строки Include (или None)
+    """
+    def parts(self) -> List["ConfigBlock"]:
+        ends = self.include_ends or []
+        size = self.end - self.start
+        if not ends or (len(ends) == 1 and ends[0][0] >= size):
+            return [self]
+        parts: List[ConfigBlock] = []
+        pos = 0
+        for end, args in ends + [(size, None)]:
+            if end <= pos:
+                continue
+            first = not parts
+            parts.append(ConfigBlock(self.type if first else "global", self._buf, self._off + pos,
+                                     self.start + pos, self.start + end,
+                                     self.host if first else None, self.criteria if first else None,
+                                     args, parent=self))
+            pos = end
+        return parts
+
+    # чтение как словарь (прежний формат блоков)
+    _KEYS = ("type", "host", "criteria", "includes", "start", "end", "lines", "params")
+
+    def __getitem__(self, key: str):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        value = getattr(self, key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._KEYS and getattr(self, key) is not None
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self) -> str:
+        return f"ConfigBlock({self.type!r}, host={self.host!r}, start={self.start}, end={self.end})"
+
+
 # Для определения блоков для глобальных строк (доп. настройки), для хостов с параметрами
-Block = Dict[str, Union[str, List[str], Dict[str, str]]]
+Block = ConfigBlock
+
+
+def _make_block(buf: bytes, off: int, size: int, start: int,
+                include_ends: Optional[List[Tuple[int, List[str]]]] = None) -> ConfigBlock:
+    # заголовок - первая строка блока, если это Host или Match
+    header = BLOCK_HEADER_REGEX.match(buf, off, off + size)
+    return _header_block(header.group(1).lower() if header else None, header.group(2) if header else None,
+                         buf, off, size, start, include_ends)
+
+
+def _header_block(keyword: Optional[bytes], value: Optional[bytes], buf: bytes, off: int, size: int, start: int,
+                  include_ends: Optional[List[Tuple[int, List[str]]]]) -> ConfigBlock:
+    block_type, host, criteria = "global", None, None
+    if keyword is not None:
+        text = value.decode("utf-8", errors="replace")
+        if keyword == b"host":
+            block_type, host = "host", text
+        else:
+            block_type, criteria = "match", text
+    includes = [arg for _, args in include_ends for arg in args] if include_ends else None
+    return ConfigBlock(block_type, buf, off, start, start + size, host, criteria, includes, include_ends)
+
+
+def _include_args(match) -> List[str]:
+    return split_args(match.group(1).decode("utf-8", errors="replace"))
+
+
+"""
+Проверяет словарь блока Host перед записью
+
+Возвращает описание проблемы или None: имя Host должно проходить
+validators.is_valid_host_alias, имена параметров - быть словами, а
+значения - без переводов строки, иначе запись добавила бы в конфиг
+чужие директивы
+"""
+def entry_problem(entry: Dict[str, str]) -> Optional[str]:
+    host_name = entry.get("Host")
+    if not isinstance(host_name, str) or not validators.is_valid_host_alias(host_name):
+        return f"недопустимое имя Host: {host_name!r}"
+    for key, value in entry.items():
+        if key == "Host":
+            continue
+        if not isinstance(key, str) or not validators.is_valid_config_option(key):
+            return f"{host_name}: недопустимое имя параметра: {key!r}"
+        if not isinstance(value, str) or not validators.is_valid_config_value(value):
+            return f"{host_name}: недопустимое значение {key}: {value!r}"
+    return None
+
+
+"""
+Разбирает содержимое ssh-конфига в список блоков в исходном порядке
+
+Каждый блок, либо:
+- строки вне блоков Host, сохраняющие порядок и комментарии,
+- блок Host с параметрами,
+- блок Match с условиями ("criteria") и параметрами
+
+Границы блоков и директивы Include ищутся одним проходом регулярного
+выражения по всему буферу; блоки ссылаются на data по смещениям,
+строки не копируются.
+start / end - байтовые смещения блока в файле, base - смещение data в файле
+"""
+def parse_config(data: bytes, base: int = 0) -> List[ConfigBlock]:
+    size = len(data)
+    directives = DIRECTIVE_REGEX.finditer(data)
+    first = FIRST_DIRECTIVE_REGEX.match(data)
+    if first is not None:
+        directives = itertools.chain((first,), directives)
+
+    blocks: List[ConfigBlock] = []
+    # строки до первого Host - глобальный блок (без заголовка)
+    block_start, keyword, value = 0, None, None
+    include_ends: Optional[List[Tuple[int, List[str]]]] = None
+    for m in directives:
+        word = m.group(2).lower()
+        if word == b"include":
+            # Include может повторяться: конец строки вместе с переводом строки и пути
+            line_end = data.find(b"\n", m.end())
+            end = line_end + 1 if line_end >= 0 else size
+            include_ends = include_ends or []
+            include_ends.append((end - block_start, split_args(m.group(3).decode("utf-8", errors="replace"))))
+            continue
+        line_start = m.start(1)
+        if line_start > block_start:
+            blocks.append(_header_block(keyword, value, data, block_start, line_start - block_start,
+                                        base + block_start, include_ends))
+        block_start, keyword, value, include_ends = line_start, word, m.group(3), None
+    if size > block_start:
+        blocks.append(_header_block(keyword, value, data, block_start, size - block_start,
+                                    base + block_start, include_ends))
+    return blocks
+
+
+"""
+Потоково читает ssh-конфиг и отдаёт блоки по мере разбора
+
+В памяти держится только текущий блок: каждый отданный блок ссылается на
+собственный небольшой буфер, а не на весь файл. Подходит для read-only
+обхода больших конфигов (список хостов, поиск) без загрузки файла целиком
+"""
+def iter_blocks(path: Optional[Path] = None) -> Iterator[ConfigBlock]:
+    path = Path(path) if path is not None else CONFIG_PATH
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        chunk: List[bytes] = []
+        include_ends: Optional[List[Tuple[int, List[str]]]] = None
+        block_start = 0
+        pos = 0
+        for line in f:
+            if chunk and BLOCK_HEADER_REGEX.match(line):
+                data = b"".join(chunk)
+                yield _make_block(data, 0, len(data), block_start, include_ends)
+                chunk = []
+                include_ends = None
+                block_start = pos
+            else:
+                m = INCLUDE_REGEX.match(line)
+                if m:
+                    include_ends = (include_ends or []) + [(pos + len(line) - block_start, _include_args(m))]
+            chunk.append(line)
+            pos += len(line)
+        if chunk:
+            data = b"".join(chunk)
+            yield _make_block(data, 0, len(data), block_start, include_ends)
+
+
+"""
+Разбивает аргументы директивы на слова с учётом кавычек
+"""
+def split_args(value: str) -> List[str]:
+    try:
+        return shlex.split(value)
+    except ValueError:
+        return value.split()
+
+
+"""
+Формирует строки блока Host из словаря {"Host": ..., параметр: значение}
+"""
+def format_host_block(entry: Dict[str, str]) -> str:
+    lines = [f"Host {entry.get('Host')}\n"]
+    for k, v in entry.items():
+        if k != "Host":
+            lines.append(f"    {k} {v}\n")
+    return "".join(lines)
+
+
+"""
+Разобранный ssh-конфиг, который держится в памяти
+
+Файл разбирается один раз, затем перечитывается только если у него
+изменились inode, размер или mtime. Для блоков Host строится индекс
+имя -> позиция первого блока, поэтому поиск хоста выполняется за O(1)
+
+Изменения записываются точечно: неизменённые участки файла копируются
+во временный файл большими кусками по смещениям блоков, изменённый
+участок вставляется целиком, затем fsync и атомарный rename
+"""
+class SSHConfig:
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._loaded = False
+        self._blocks: List[Block] = []
+        self._index: Dict[str, int] = {}
+        self._include_at: List[int] = []
+        # части блоков с Include: id(блок) -> (блок, части)
+        self._parts: Dict[int, Tuple[Block, List[Block]]] = {}
+        self._size = 0
+
+    def _current_stamp(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    """
+    Проверяет, изменился ли файл с момента последнего разбора
+    """
+    def is_stale(self) -> bool:
+        return not self._loaded or self._current_stamp() != self._stamp
+
+    """
+    Принудительно перечитывает файл
+    """
+    def reload(self) -> None:
+        stamp = self._current_stamp()
+        if stamp is None:
+            data = b""
+        else:
+            data = self.path.read_bytes()
+        self._set_blocks(parse_config(data), stamp)
+
+    def _set_blocks(self, blocks: List[Block], stamp: Optional[Tuple[int, int, int]]) -> None:
+        index: Dict[str, int] = {}
+        include_at: List[int] = []
+        for i, block in enumerate(blocks):
+            if block.type == "host":
+                index.setdefault(block.host, i)
+            if block.includes:
+                include_at.append(i)
+        self._blocks = blocks
+        self._index = index
+        self._include_at = include_at
+        self._parts = {}
+        self._stamp = stamp
+        self._size = blocks[-1].end if blocks else 0
+        self._loaded = True
+
+    """
+    Запоминает содержимое, только что записанное в файл, без чтения с диска
+    """
+    def adopt(self, data: bytes) -> None:
+        self._set_blocks(parse_config(data), self._current_stamp())
+
+    def _ensure_fresh(self) -> None:
+        if self.is_stale():
+            self.reload()
+
+    @property
+    def blocks(self) -> List[Block]:
+        self._ensure_fresh()
+        return self._blocks
+
+    """
+    Возвращает первый блок Host с указанным именем или None
+    """
+    def get_block(self, host_name: str) -> Optional[Block]:
+        self._ensure_fresh()
+        i = self._index.get(host_name)
+        return self._blocks[i] if i is not None else None
+
+    """
+    Возвращает позицию первого блока Host с указанным именем или None
+    """
+    def index_of(self, host_name: str) -> Optional[int]:
+        self._ensure_fresh()
+        return self._index.get(host_name)
+
+    """
+    Части блока, разрезанного по строкам Include (ConfigBlock.parts)
+    Кэшируются, пока файл не изменится: у частей постоянная identity
+    """
+    def parts(self, block: Block) -> List[Block]:
+        cached = self._parts.get(id(block))
+        if cached is None or cached[0] is not block:
+            cached = self._parts[id(block)] = (block, block.parts())
+        return cached[1]
+
+    """
+    Возвращает позиции блоков, в которых есть директивы Include
+    """
+    @property
+    def include_at(self) -> List[int]:
+        self._ensure_fresh()
+        return self._include_at
+
+    """
+    Возвращает имена всех блоков Host в порядке файла
+    """
+    def hosts(self) -> List[str]:
+        return [b.host for b in self.blocks if b.type == "host"]
+
+    """
+    Заменяет блоки [first, last) текстом text (пустой текст - удаление)
+
+    edits - список (first, last, text) по возрастанию, без пересечений;
+    first == last == len(blocks) означает добавление в конец файла
+    Переписывается только изменённый участок, остальное копируется потоком
+    """
+    def splice(self, edits: List[Tuple[int, int, str]]) -> None:
+        self._ensure_fresh()
+        blocks = self._blocks
+        byte_edits: List[Tuple[int, int, bytes]] = []
+        block_edits: List[Tuple[int, int, str]] = []
+
+        for first, last, text in edits:
+            if text and not text.endswith("\n"):
+                text += "\n"
+            if first == last == len(blocks) and blocks and not blocks[-1].text.endswith("\n"):
+                # файл без перевода строки в конце: дописываем его к последнему блоку
+                first -= 1
+                text = blocks[first].text + "\n" + text
+            start = blocks[first].start if first < len(blocks) else self._size
+            end = blocks[last - 1].end if last > first else start
+            byte_edits.append((start, end, text.encode("utf-8")))
+            block_edits.append((first, last, text))
+
+        splice_file(self.path, byte_edits)
+        self._apply_edits(block_edits, byte_edits)
+
+    def _apply_edits(self, block_edits: List[Tuple[int, int, str]],
+                     byte_edits: List[Tuple[int, int, bytes]]) -> None:
+        old = self._blocks
+        blocks: List[Block] = []
+        delta = 0
+        pos = 0
+        reparse = False
+        for (first, last, _), (start, end, data) in zip(block_edits, byte_edits):
+            for block in old[pos:first]:
+                blocks.append(block.shifted(delta))
+            new_blocks = parse_config(data, base=start + delta)
+            if first > 0 and new_blocks and new_blocks[0].type == "global":
+                # текст без Host продолжил бы предыдущий блок, проще перечитать
+                reparse = True
+            if new_blocks and new_blocks[-1].type == "global" \
+                    and last < len(old) and old[last].type == "global":
+                # два глобальных блока подряд при чтении сольются в один
+                reparse = True
+            blocks.extend(new_blocks)
+            delta += len(data) - (end - start)
+            pos = last
+        for block in old[pos:]:
+            blocks.append(block.shifted(delta))
+
+        self._set_blocks(blocks, self._current_stamp())
+        if reparse:
+            self._loaded = False
+
+
+# открытые документы: путь -> SSHConfig
+_documents: Dict[Path, SSHConfig] = {}
+
+
+"""
+Возвращает закэшированный документ для ssh-конфига (по умолчанию ~/.ssh/config)
+
+Документ создаётся один раз на путь и сам следит за изменениями файла
+"""
+def load_config(path: Optional[Path] = None) -> SSHConfig:
+    path = Path(path) if path is not None else CONFIG_PATH
+    doc = _documents.get(path)
+    if doc is None:
+        doc = _documents[path] = SSHConfig(path)
+    return doc
+
+
+"""
+Раскрывает аргумент Include в список файлов
+
+Относительные пути считаются от каталога пользовательского конфига (~/.ssh),
+шаблоны раскрываются glob-ом в отсортированном порядке, как это делает ssh
+"""
+def resolve_include(pattern: str, base_dir: Path) -> List[Path]:
+    pattern = os.path.expanduser(pattern)
+    if not os.path.isabs(pattern):
+        pattern = os.path.join(str(base_dir), pattern)
+    return [Path(p) for p in sorted(glob.glob(pattern)) if os.path.isfile(p)]
+
+
+def _included_docs(block: Block, base_dir: Path, stack: Tuple[str, ...]) -> Iterator[Tuple[SSHConfig, Tuple[str, ...]]]:
+    if len(stack) > MAX_INCLUDE_DEPTH:
+        return
+    for pattern in block.includes or ():
+        for path in resolve_include(pattern, base_dir):
+            real = os.path.realpath(path)
+            if real in stack:
+                # цикл Include — пропускаем
+                continue
+            yield load_config(path), stack + (real,)
+
+
+def _walk(doc: SSHConfig, base_dir: Path, stack: Tuple[str, ...],
+          guard: Optional[Block]) -> Iterator[Tuple[SSHConfig, Block, Optional[Block]]]:
+    for block in doc.blocks:
+        if not block.includes:
+            yield doc, block, guard
+            continue
+        # подключённые файлы и строки блока после Include действуют в рамках
+        # этого Host/Match (у глобальных строк - в рамках внешнего условия)
+        parts = doc.parts(block)
+        inner = parts[0] if block.type != "global" else guard
+        for n, part in enumerate(parts):
+            yield doc, part, guard if n == 0 else inner
+            if part.includes:
+                for sub, sub_stack in _included_docs(part, base_dir, stack):
+                    yield from _walk(sub, base_dir, sub_stack, inner)
+
+
+"""
+Обходит объединённый конфиг в том порядке, в котором его читает ssh:
+файлы из Include отдаются на месте директивы, поэтому блок с Include
+приходит частями (ConfigBlock.parts, у частей задан parent)
+
+Для каждого блока возвращает ещё и условие, в рамках которого он
+действует: Host/Match (первую часть), внутри которого стоит Include
+подключённого файла или строка после Include, иначе None. Блоки Host/Match
+подключённого файла действуют, только если выполнено и это условие
+(как NEVERMATCH у ssh)
+"""
+def walk_config(path: Optional[Path] = None) -> Iterator[Tuple[SSHConfig, Block, Optional[Block]]]:
+    root = load_config(path)
+    yield from _walk(root, root.path.parent, (os.path.realpath(root.path),), None)
+
+
+"""
+Обходит объединённый конфиг: блоки корневого файла и, на месте директив
+Include, блоки подключённых файлов (рекурсивно, с защитой от циклов)
+
+Возвращает пары (документ, блок). Каждый подключённый файл разбирается только
+когда обход до него доходит, и кэшируется отдельно по своему mtime
+"""
+def iter_merged(path: Optional[Path] = None) -> Iterator[Tuple[SSHConfig, Block]]:
+    for doc, block, _ in walk_config(path):
+        # разрезанный по Include блок отдаётся целиком на месте первой части
+        if block.parent is None:
+            yield doc, block
+        elif block.start == block.parent.start:
+            yield doc, block.parent
+
+
+"""
+Что нужно отслеживать, чтобы заметить изменение объединённого конфига
+
+Возвращает (каталоги, шаблоны): каталоги основного и подключённых файлов
+и каталоги из шаблонов Include (до первого символа шаблона) - в них может
+появиться новый подключаемый файл; шаблоны - абсолютные glob-шаблоны путей
+этих файлов. Изменение файла, путь которого подходит под шаблон, меняет конфиг
+"""
+def watch_targets(path: Optional[Path] = None) -> Tuple[Set[Path], List[str]]:
+    root = load_config(path)
+    base_dir = root.path.parent
+    dirs = {base_dir}
+    patterns = [glob.escape(str(root.path))]
+    for doc, block, _ in walk_config(path):
+        if doc is not root:
+            dirs.add(doc.path.parent)
+            patterns.append(glob.escape(str(doc.path)))
+        for pattern in block.includes or ():
+            pattern = os.path.expanduser(pattern)
+            if not os.path.isabs(pattern):
+                pattern = os.path.join(str(base_dir), pattern)
+            patterns.append(pattern)
+            static = os.path.dirname(pattern)
+            while glob.escape(static) != static:
+                static = os.path.dirname(static)
+            dirs.add(Path(static))
+    return dirs, list(dict.fromkeys(patterns))
+
+
+def _find(doc: SSHConfig, host_name: str, base_dir: Path, stack: Tuple[str, ...]) -> Optional[Tuple[SSHConfig, Block]]:
+    i = doc.index_of(host_name)
+    for j in doc.include_at:
+        # Include внутри блока j идёт после самого блока j
+        if i is not None and j >= i:
+            break
+        for sub, sub_stack in _included_docs(doc.blocks[j], base_dir, stack):
+            found = _find(sub, host_name, base_dir, sub_stack)
+            if found:
+                return found
+    return (doc, doc.blocks[i]) if i is not None else None
+
+
+"""
+Ищет первый блок Host с указанным именем в объединённом конфиге
+
+Используются индексы файлов, а не перебор блоков: подключённые файлы
+просматриваются (и разбираются) только если они стоят раньше найденного блока
+Возвращает (документ, блок) или None
+"""
+def find_host(host_name: str, path: Optional[Path] = None) -> Optional[Tuple[SSHConfig, Block]]:
+    root = load_config(path)
+    return _find(root, host_name, root.path.parent, (os.path.realpath(root.path),))
 
 
 """
@@ -17,6 +649,7 @@ Block = Dict[str, Union[str, List[str], Dict[str, str]]]
 - блок Host с параметрами
 
 Позволяет сохранить произвольный порядок блоков и смешанные настройки
+Повторный вызов без изменений файла не перечитывает его
 
 Возвращает List[Block] - список блоков с их содержимым
 """
@@ -26,46 +659,7 @@ def read_config() -> List[Block]:
         CONFIG_PATH.touch(mode=0o600, exist_ok=True)
         return []
 
-    blocks: List[Block] = []
-    current_block: Optional[Block] = None
-
-    with CONFIG_PATH.open("r", encoding="utf-8") as f:
-        for line in f:
-            stripped = line.strip()
-            if stripped.lower().startswith("host "):
-                # новый блок host
-                if current_block:
-                    blocks.append(current_block)
-                host_name = stripped.split(maxsplit=1)[1]
-                current_block = {
-                    "type": "host",
-                    "host": host_name,
-                    "lines": [line],
-                    "params": {}
-                }
-            else:
-                if current_block is None or current_block["type"] == "global":
-                    # продолжаем или создаём глобальный блок
-                    if current_block is None:
-                        current_block = {"type": "global", "lines": []}
-                    if stripped and not stripped.startswith("#"):
-                        parts = stripped.split(maxsplit=1)
-                        if len(parts) == 2:
-                            current_block.setdefault("params", {})[parts[0]] = parts[1]
-                    current_block["lines"].append(line)
-                else:
-                    # в блоке host, но строка не "Host" — параметры или комментарии
-                    current_block["lines"].append(line)
-                    if stripped and not stripped.startswith("#"):
-                        parts = stripped.split(maxsplit=1)
-                        if len(parts) == 2:
-                            current_block["params"][parts[0]] = parts[1]
-
-        # добавить последний блок
-        if current_block:
-            blocks.append(current_block)
-
-    return blocks
+    return list(load_config().blocks)
 
 
 """
@@ -73,18 +667,296 @@ def read_config() -> List[Block]:
 
 Сохраняет исходные строки, порядок и комментарии, 
 добавляя пустую строку между блоками
+blocks - блоки ConfigBlock или словари со списком строк "lines"
+Запись атомарная: временный файл, fsync и rename
 """
 def write_config(blocks: List[Block]) -> None:
-    lines = []
+    chunks: List[bytes] = []
     for block in blocks:
-        lines.extend(block["lines"])
+        lines = block["lines"]
+        text = "".join(lines)
         # проверка, что между блоками есть пустая строка
-        if not block["lines"][-1].endswith("\n"):
-            lines.append("\n") # добавляем пустую строку
-    CONFIG_PATH.parent.mkdir(mode=0o700, exist_ok=True)
-    CONFIG_PATH.write_text("".join(lines), encoding="utf-8")
+        if lines and not lines[-1].endswith("\n"):
+            text += "\n" # добавляем пустую строку
+        chunks.append(text.encode("utf-8"))
+    data = b"".join(chunks)
+    with config_lock():
+        with atomic_write(CONFIG_PATH) as f:
+            f.write(data)
+        load_config().adopt(data)
+
 
 
+# блокировка внутри процесса и глубина вложенных захватов по файлам блокировок
+_config_lock = threading.RLock()
+_held_locks: Dict[Path, Tuple[int, Optional[int]]] = {}
+
+
+"""
+Файл-блокировка рядом с конфигом: ~/.ssh/.config.lock
+"""
+def lock_path(path: Optional[Path] = None) -> Path:
+    path = Path(path) if path is not None else CONFIG_PATH
+    return path.with_name(f".{path.name}.lock")
+
+
+def _flock(lock_file: Path, deadline: Optional[float]) -> Optional[int]:
+    if fcntl is None:
+        return None
+    lock_file.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    fd = os.open(lock_file, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if deadline is None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return fd
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"ssh-конфиг занят другим процессом: {lock_file}")
+                time.sleep(LOCK_POLL_INTERVAL)
+    except BaseException:
+        os.close(fd)
+        raise
+
+
+"""
+Эксклюзивная блокировка ssh-конфига на время изменения
+
+Между процессами - рекомендательная блокировка flock на отдельном файле
+(сам конфиг заменяется через rename, поэтому блокировать его нельзя),
+между потоками - общий RLock. Повторный захват тем же потоком не ждёт.
+timeout - сколько секунд ждать (None - без ограничения), затем TimeoutError
+"""
+@contextmanager
+def config_lock(path: Optional[Path] = None, timeout: Optional[float] = None) -> Iterator[None]:
+    lock_file = lock_path(path)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    if not _config_lock.acquire(timeout=-1 if timeout is None else timeout):
+        raise TimeoutError(f"ssh-конфиг занят: {lock_file}")
+    try:
+        depth, fd = _held_locks.get(lock_file, (0, None))
+        if depth == 0:
+            fd = _flock(lock_file, deadline)
+        _held_locks[lock_file] = (depth + 1, fd)
+        try:
+            yield
+        finally:
+            depth, fd = _held_locks.pop(lock_file)
+            if depth > 1:
+                _held_locks[lock_file] = (depth - 1, fd)
+            elif fd is not None:
+                os.close(fd)  # закрытие дескриптора снимает flock
+    finally:
+        _config_lock.release()
+
+
+_MISSING = object()
+
+
+"""
+Пакет изменений ssh-конфига, применяемый одной записью на файл
+
+Изменения копятся в памяти поверх разобранных документов: upsert / delete /
+replace только запоминают, какие блоки заменить, а commit() для каждого
+затронутого файла выполняет один splice (одна атомарная запись). Первые
+поиски хостов идут через find_host, а при большом пакете индекс
+имя -> блок по всем файлам строится один раз на транзакцию
+
+Обычно используется через transaction(), которая держит config_lock от
+чтения до записи, поэтому параллельные писатели (GUI, CLI) не теряют
+изменения друг друга. Каждый файл записывается атомарно, но несколько
+файлов (конфиг и подключённые через Include) - по очереди
+"""
+class ConfigTransaction:
+
+    def __init__(self, path: Optional[Path] = None):
+        self.root = load_config(path)
+        # документ -> {позиция блока: новый текст ("" - удалить)}
+        self._replace: Dict[SSHConfig, Dict[int, str]] = {}
+        # документ -> тексты, которые вставляются в начало файла
+        self._prepend: Dict[SSHConfig, List[str]] = {}
+        # новые блоки Host в конце основного конфига: имя -> текст
+        self._append: Dict[str, str] = {}
+        # актуальные в транзакции параметры хостов (None - удалён)
+        self._entries: Dict[str, Optional[Dict[str, str]]] = {}
+        # блоки документов на момент первого обращения (для проверки при commit)
+        self._snapshot: Dict[SSHConfig, List[Block]] = {}
+        self._first: Optional[Dict[str, Tuple[SSHConfig, int]]] = None
+        self._locations: Optional[Dict[str, List[Tuple[SSHConfig, int]]]] = None
+        self._lookups = 0
+        self.upserts = 0
+        self.deletes = 0
+
+    def _use(self, doc: SSHConfig) -> SSHConfig:
+        if doc not in self._snapshot:
+            self._snapshot[doc] = doc.blocks
+        return doc
+
+    def _find(self, host_name: str) -> Optional[Tuple[SSHConfig, int]]:
+        self._lookups += 1
+        if self._first is None and self._lookups <= INDEX_AFTER_LOOKUPS:
+            # несколько поисков дешевле делать по индексам файлов
+            found = find_host(host_name, self.root.path)
+            if found is None:
+                return None
+            doc = self._use(found[0])
+            return doc, doc.index_of(host_name)
+
+        if self._first is None:
+            # много поисков: один обход объединённого конфига на транзакцию
+            first: Dict[str, Tuple[SSHConfig, int]] = {}
+            for doc, block in iter_merged(self.root.path):
+                if block.type == "host" and block.host not in first:
+                    first[block.host] = (self._use(doc), doc._index[block.host])
+            self._first = first
+        return self._first.get(host_name)
+
+    def _all_locations(self) -> Dict[str, List[Tuple[SSHConfig, int]]]:
+        if self._locations is None:
+            locations: Dict[str, List[Tuple[SSHConfig, int]]] = {}
+            for doc in dict.fromkeys(doc for doc, _ in iter_merged(self.root.path)):
+                for i, block in enumerate(self._use(doc).blocks):
+                    if block.type == "host":
+                        locations.setdefault(block.host, []).append((doc, i))
+            self._locations = locations
+        return self._locations
+
+    """
+    Параметры хоста с учётом изменений транзакции или None
+    """
+    def get(self, host_name: str) -> Optional[Dict[str, str]]:
+        entry = self._entries.get(host_name, _MISSING)
+        if entry is not _MISSING:
+            return dict(entry) if entry is not None else None
+        found = self._find(host_name)
+        if found is None:
+            return None
+        doc, i = found
+        entry = {"Host": host_name}
+        entry.update(doc.blocks[i].params)
+        return entry
+
+    """
+    Добавляет или обновляет блок Host (как add_or_update_host)
+    Возвращает True, если блок будет добавлен, а не обновлён
+
+    Недопустимое имя Host, имя параметра или значение с переводом строки -
+    ValueError (ничего не запоминается)
+    """
+    def upsert(self, new_entry: Dict[str, str]) -> bool:
+        host_name = new_entry.get("Host")
+        problem = entry_problem(new_entry)
+        if problem:
+            raise ValueError(problem)
+        text = format_host_block(new_entry)
+        deleted = self._entries.get(host_name, _MISSING) is None
+        self._entries[host_name] = dict(new_entry)
+        self.upserts += 1
+
+        found = None if deleted or host_name in self._append else self._find(host_name)
+        if found is None:
+            self._use(self.root)
+            self._append[host_name] = text
+            return True
+        doc, i = found
+        self._replace.setdefault(doc, {})[i] = text
+        return False
+
+    """
+    Удаляет все блоки Host с указанным именем (как delete_host)
+    Возвращает True, если хост был
+    """
+    def delete(self, host_name: str) -> bool:
+        existed = self._append.pop(host_name, None) is not None
+        if self._entries.get(host_name, _MISSING) is not None:
+            for doc, i in self._all_locations().get(host_name, ()):
+                edits = self._replace.setdefault(doc, {})
+                existed = existed or edits.get(i) != ""
+                edits[i] = ""
+        self._entries[host_name] = None
+        if existed:
+            self.deletes += 1
+        return existed
+
+    """
+    Заменяет содержимое блока на text (как replace_block_text)
+    """
+    def replace(self, block: Block, text: str, path: Optional[Path] = None) -> None:
+        doc = self._use(load_config(path) if path is not None else self.root)
+        for i, b in enumerate(doc.blocks):
+            if b is block or (b.start == block.get("start") and b.lines == block.get("lines")):
+                self._replace.setdefault(doc, {})[i] = text
+                return
+        self._prepend.setdefault(doc, []).append(text)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self._append or self._prepend or any(self._replace.values()))
+
+    def _edits(self, doc: SSHConfig) -> List[Tuple[int, int, str]]:
+        edits: List[Tuple[int, int, str]] = []
+        prepend = self._prepend.get(doc)
+        if prepend:
+            edits.append((0, 0, "".join(t if t.endswith("\n") else t + "\n" for t in prepend)))
+        replace = self._replace.get(doc, {})
+        for i in sorted(replace):
+            edits.append((i, i + 1, replace[i]))
+        if doc is self.root and self._append:
+            text = "".join(self._append.values())
+            end = len(doc.blocks)
+            if end and edits and edits[-1][1] == end:
+                # последний блок тоже заменяется - дописываем новые блоки к нему
+                first, last, prev = edits.pop()
+                if prev and not prev.endswith("\n"):
+                    prev += "\n"
+                edits.append((first, last, prev + text))
+            else:
+                edits.append((end, end, text))
+        return edits
+
+    """
+    Записывает накопленные изменения: один splice на каждый изменённый файл
+    """
+    def commit(self) -> None:
+        if not self.changed:
+            return
+        docs = list(self._snapshot)
+        for doc in docs:
+            if doc.is_stale() or doc._blocks is not self._snapshot[doc]:
+                raise RuntimeError(f"ssh-конфиг изменён во время транзакции: {doc.path}")
+        with audit_log.timed("config.transaction", upserts=self.upserts, deletes=self.deletes) as record:
+            files = []
+            for doc in docs:
+                edits = self._edits(doc)
+                if edits:
+                    doc.splice(edits)
+                    files.append(str(doc.path))
+            record.update(ok=True, files=files)
+        self._replace.clear()
+        self._prepend.clear()
+        self._append.clear()
+
+
+"""
+Транзакция над ssh-конфигом:
+
+    with ssh_config.transaction() as tx:
+        tx.upsert({"Host": "web", "HostName": "10.0.0.5"})
+        tx.delete("old")
+
+Блокировка берётся до чтения и держится до записи; при исключении внутри
+блока with ничего не записывается
+"""
+@contextmanager
+def transaction(path: Optional[Path] = None, timeout: Optional[float] = None) -> Iterator[ConfigTransaction]:
+    with config_lock(path, timeout):
+        tx = ConfigTransaction(path)
+        yield tx
+        tx.commit()
+
 
 """
 Добавляет новый блок Host или обновляет существующий по ключу 'Host'
@@ -93,66 +965,50 @@ def write_config(blocks: List[Block]) -> None:
 новый блок добавляется в конец файла
 
 При обновлении исходные строки блока заменяются на новые, сформированные
-из переданного словаря new_entry
+из переданного словаря new_entry. Переписывается только этот участок файла
 """
 def add_or_update_host(new_entry: Dict[str, str]) -> None:
-    blocks = read_config()
-    host_name = new_entry.get("Host")
-    updated = False
-
-    for block in blocks:
-        if block["type"] == "host" and block.get("host") == host_name:
-            # Обновляем блок, делаем новые строки из new_entry
-            new_lines = [f"Host {host_name}\n"]
-            for k, v in new_entry.items():
-                if k != "Host":
-                    new_lines.append(f"    {k} {v}\n")
-            block["lines"] = new_lines
-            block["params"] = {k: v for k, v in new_entry.items() if k != "Host"}
-            updated = True
-            break
-
-    if not updated:
-        # Добавляем новый блок в конец
-        new_lines = [f"Host {host_name}\n"]
-        for k, v in new_entry.items():
-            if k != "Host":
-                new_lines.append(f"    {k} {v}\n")
-        blocks.append({
-            "type": "host",
-            "host": host_name,
-            "lines": new_lines,
-            "params": {k: v for k, v in new_entry.items() if k != "Host"},
-        })
-
-    write_config(blocks)
+    with audit_log.timed("config.host_upsert", host=new_entry.get("Host")) as record:
+        with transaction() as tx:
+            created = tx.upsert(new_entry)
+        record.update(ok=True, created=created)
 
 
 """
-Удаляет блок Host с указанным именем
+Удаляет блок Host с указанным именем (во всех подключённых файлах тоже)
 
 Возвращает True, если блок был найден и удалён, иначе False
 """
 def delete_host(host_name: str) -> bool:
-    blocks = read_config()
-    new_blocks = [b for b in blocks if not (b["type"] == "host" and b.get("host") == host_name)]
+    with audit_log.timed("config.host_delete", host=host_name) as record:
+        with transaction() as tx:
+            record["ok"] = tx.delete(host_name)
+        return record["ok"]
 
-    if len(new_blocks) == len(blocks):
-        return False
 
-    write_config(new_blocks)
-    return True
+"""
+Заменяет содержимое блока (например, глобальных настроек) на text
+path - файл, в котором лежит блок (по умолчанию ~/.ssh/config)
+
+Если блока больше нет в актуальном файле, текст добавляется в начало
+"""
+def replace_block_text(block: Block, text: str, path: Optional[Path] = None) -> None:
+    doc = load_config(path)
+    with audit_log.timed("config.block_replace", file=str(doc.path), block_type=block.get("type")) as record:
+        with transaction() as tx:
+            tx.replace(block, text, path)
+            record.update(ok=True, inserted=bool(tx._prepend))
 
 
 """
 Возвращает словарь параметров для указанного Host, 
-если блок найден, иначе None
+если блок найден (в том числе в подключённых через Include файлах), иначе None
 """
 def get_host_entry(host_name: str) -> Optional[Dict[str, str]]:
-    blocks = read_config()
-    for block in blocks:
-        if block["type"] == "host" and block.get("host") == host_name:
-            entry = {"Host": host_name}
-            entry.update(block.get("params", {}))
-            return entry
-    return None
+    found = find_host(host_name)
+    if found is None:
+        return None
+    _, block = found
+    entry = {"Host": host_name}
+    entry.update(block.params)
+    return entry
@@ -0,0 +1,298 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Iterable, NamedTuple, Optional, Set, Tuple
+
+# тишина, после которой накопленные изменения отдаются
+DEBOUNCE = 0.2
+
+# не дольше этого после первого события, даже если события идут без перерыва
+MAX_DELAY = 1.0
+
+# период опроса каталогов, когда inotify недоступен
+POLL_INTERVAL = 1.0
+
+# события inotify (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+# заголовок struct inotify_event: wd, mask, cookie, len
+EVENT_HEADER = struct.Struct("iIII")
+
+
+"""
+Накопленные изменения
+
+paths - изменившиеся файлы (и сами каталоги, если они удалены или
+перемещены), overflow - события потеряны (переполнение очереди inotify),
+нужно перечитать всё
+"""
+class ChangeSet(NamedTuple):
+    paths: FrozenSet[Path]
+    overflow: bool = False
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def _dir_stamps(directory: Path) -> Dict[str, Tuple[int, int, int, int]]:
+    stamps = {}
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                stamps[entry.name] = (st.st_ino, st.st_size, st.st_mtime_ns, st.st_mode)
+    except OSError:
+        pass
+    return stamps
+
+
+"""
+Фоновый поток, следящий за набором каталогов (~/.ssh и каталоги
+подключённого конфига)
+
+На Linux события приходят от inotify (через ctypes, без сторонних
+зависимостей), на остальных системах и при недоступном inotify каталоги
+опрашиваются раз в poll_interval секунд сравнением stat файлов. Пачка
+событий (ssh-keygen, редактор с атомарной записью) схлопывается в один
+ChangeSet: он отдаётся, когда debounce секунд не было новых событий,
+но не позже max_delay секунд после первого
+
+on_change(ChangeSet) вызывается из потока наблюдателя; интерфейс должен
+сам передать его в свой поток (например, через очередь и after()).
+Набор каталогов можно менять на ходу через watch()
+"""
+class Watcher:
+
+    def __init__(self, on_change: Callable[[ChangeSet], None],
+                 debounce: float = DEBOUNCE, max_delay: float = MAX_DELAY,
+                 poll_interval: float = POLL_INTERVAL, use_inotify: bool = True):
+        self.on_change = on_change
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._libc = _load_inotify() if use_inotify else None
+        self._lock = threading.Lock()
+        self._wanted: Set[Path] = set()
+        self._dirty = False
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        self._fd = -1
+        if self._libc is not None:
+            self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if self._fd < 0:
+                self._libc = None
+        # накопленные изменения
+        self._pending: Set[Path] = set()
+        self._overflow = False
+        self._first_at: Optional[float] = None
+        self._last_at = 0.0
+
+    @property
+    def backend(self) -> str:
+        return "inotify" if self._libc is not None else "poll"
+
+    """
+    Задаёт набор каталогов для слежения (заменяет предыдущий)
+
+    Повторный вызов с тем же набором заново ставит наблюдение на каталоги,
+    которые были удалены и созданы снова
+    """
+    def watch(self, directories: Iterable[Path]) -> None:
+        with self._lock:
+            self._wanted = {Path(d) for d in directories}
+            self._dirty = True
+        self._wake()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ssh-km-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            if fd >= 0:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._fd = self._wake_r = self._wake_w = -1
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_w, b"x")
+        except OSError:
+            pass
+
+    def _note(self, path: Optional[Path], overflow: bool = False) -> None:
+        now = time.monotonic()
+        if path is not None:
+            self._pending.add(path)
+        self._overflow = self._overflow or overflow
+        if self._first_at is None:
+            self._first_at = now
+        self._last_at = now
+
+    # сколько ждать до отдачи накопленного (None - ничего не накоплено)
+    def _flush_timeout(self) -> Optional[float]:
+        if self._first_at is None:
+            return None
+        deadline = min(self._last_at + self.debounce, self._first_at + self.max_delay)
+        return max(0.0, deadline - time.monotonic())
+
+    def _flush(self) -> None:
+        changes = ChangeSet(frozenset(self._pending), self._overflow)
+        self._pending = set()
+        self._overflow = False
+        self._first_at = None
+        try:
+            self.on_change(changes)
+        except Exception as e:
+            print(f"[ERROR] Ошибка обработчика изменений: {e}")
+
+    def _run(self) -> None:
+        if self._libc is not None:
+            self._run_inotify()
+        else:
+            self._run_poll()
+
+    def _take_wanted(self) -> Optional[Set[Path]]:
+        with self._lock:
+            if not self._dirty:
+                return None
+            self._dirty = False
+            return set(self._wanted)
+
+    def _drain_wake(self) -> None:
+        try:
+            while os.read(self._wake_r, 4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _wait(self, fds, timeout: Optional[float]):
+        try:
+            return select.select(fds, [], [], timeout)[0]
+        except (OSError, ValueError):
+            return []
+
+    def _run_inotify(self) -> None:
+        watches: Dict[int, Path] = {}
+        by_dir: Dict[Path, int] = {}
+        while not self._stopping:
+            wanted = self._take_wanted()
+            if wanted is not None:
+                for directory in [d for d in by_dir if d not in wanted]:
+                    self._libc.inotify_rm_watch(self._fd, by_dir.pop(directory))
+                for directory in wanted - set(by_dir):
+                    wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+                    if wd >= 0:
+                        by_dir[directory] = wd
+                        watches[wd] = directory
+                    # отсутствующий каталог появится в событиях родителя,
+                    # после чего набор каталогов пересчитают и вызовут watch()
+
+            ready = self._wait([self._fd, self._wake_r], self._flush_timeout())
+            if self._wake_r in ready:
+                self._drain_wake()
+            if self._fd in ready:
+                self._read_events(watches, by_dir)
+            timeout = self._flush_timeout()
+            if timeout is not None and timeout <= 0:
+                self._flush()
+
+    def _read_events(self, watches: Dict[int, Path], by_dir: Dict[Path, int]) -> None:
+        try:
+            data = os.read(self._fd, 65536)
+        except (BlockingIOError, OSError):
+            return
+        pos = 0
+        while pos + EVENT_HEADER.size <= len(data):
+            wd, mask, _, size = EVENT_HEADER.unpack_from(data, pos)
+            pos += EVENT_HEADER.size
+            name = data[pos:pos + size].rstrip(b"\x00")
+            pos += size
+            if mask & IN_Q_OVERFLOW:
+                self._note(None, overflow=True)
+                continue
+            directory = watches.get(wd)
+            if mask & IN_IGNORED:
+                # наблюдение снято ядром (каталог удалён) или нами
+                watches.pop(wd, None)
+                if directory is not None and by_dir.get(directory) == wd:
+                    del by_dir[directory]
+                continue
+            if directory is None:
+                continue
+            self._note(directory / os.fsdecode(name) if name else directory)
+
+    def _run_poll(self) -> None:
+        snapshots: Dict[Path, Dict[str, Tuple[int, int, int, int]]] = {}
+        next_poll = 0.0
+        while not self._stopping:
+            wanted = self._take_wanted()
+            if wanted is not None:
+                # новые каталоги только запоминаются, старые забываются
+                snapshots = {d: snapshots[d] if d in snapshots else _dir_stamps(d) for d in wanted}
+
+            now = time.monotonic()
+            if now >= next_poll:
+                next_poll = now + self.poll_interval
+                for directory, old in snapshots.items():
+                    new = _dir_stamps(directory)
+                    if new != old:
+                        for name in old.keys() | new.keys():
+                            if old.get(name) != new.get(name):
+                                self._note(directory / name)
+                        snapshots[directory] = new
+
+            timeout = max(0.0, next_poll - time.monotonic())
+            flush = self._flush_timeout()
+            if flush is not None:
+                timeout = min(timeout, flush)
+            if self._wait([self._wake_r], timeout):
+                self._drain_wake()
+            flush = self._flush_timeout()
+            if flush is not None and flush <= 0:
+                self._flush()
@@ -2,17 +2,21 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from ssh_key_manager.core import key_manager
 from ssh_key_manager.utils import validators
+from ssh_key_manager.gui.tasks import TaskRunner
 
 
 class GenerateKeyDialog(tk.Toplevel):
 
-    def __init__(self, parent, on_success=None):
+    def __init__(self, parent, on_success=None, tasks=None):
         super().__init__(parent) # окно поверх главного
         self.title("Создание нового ключа")
-        self.geometry("400x300")
+        self.geometry("400x330")
         self.resizable(False, False)
         self.parent = parent
         self.on_success = on_success # при успешном создании ключа
+        self.tasks = tasks or TaskRunner(self) # фоновый запуск ssh-keygen
+        self._task = None # текущая генерация
+        self.protocol("WM_DELETE_WINDOW", self.on_cancel)
 
         self.init_widgets()
         self.transient(parent) # вспомогательное, поверх главного
@@ -54,8 +58,22 @@ class GenerateKeyDialog(tk.Toplevel):
         # кнопки "создать" и "отмена"
         button_frame = ttk.Frame(self)
         button_frame.pack(pady=pady)
-        ttk.Button(button_frame, text="Создать", command=self.on_submit).pack(side="left", padx=5)
-        ttk.Button(button_frame, text="Отмена", command=self.destroy).pack(side="left", padx=5)
+        self.submit_btn = ttk.Button(button_frame, text="Создать", command=self.on_submit)
+        self.submit_btn.pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Отмена", command=self.on_cancel).pack(side="left", padx=5)
+
+        # индикатор генерации (показывается, пока работает ssh-keygen)
+        self.progress = ttk.Progressbar(self, mode="indeterminate")
+
+
+    """
+    Отмена: прерывает идущую генерацию и закрывает окно
+    """
+    def on_cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.destroy()
 
 
     """
@@ -76,14 +94,31 @@ class GenerateKeyDialog(tk.Toplevel):
             messagebox.showwarning("Ошибка", "Недопустимое или уже существующее имя ключа.")
             return
 
-        # генерация ключа через key_manager
-        success = key_manager.generate_keypair(
+        # генерация ключа через key_manager в фоне, окно не блокируется
+        self.submit_btn.state(["disabled"])
+        self.progress.pack(fill="x", padx=10, pady=(0, 8))
+        self.progress.start(10)
+        self._task = self.tasks.submit(
+            key_manager.generate_keypair,
             key_name=name,
             key_type=key_type,
             passphrase=password,
-            comment=comment
+            comment=comment,
+            cancellable=True,
+            on_done=lambda success: self.on_generated(name, success),
+            label=f"Генерация ключа {name}..."
         )
 
+
+    """
+    Результат генерации (вызывается в главном потоке)
+    """
+    def on_generated(self, name, success):
+        self._task = None
+        self.progress.stop()
+        self.progress.pack_forget()
+        self.submit_btn.state(["!disabled"])
+
         if success:
             messagebox.showinfo("Успешно", f"Ключ '{name}' создан.")
             if self.on_success:
@@ -91,3 +126,150 @@ class GenerateKeyDialog(tk.Toplevel):
             self.destroy()
         else:
             messagebox.showerror("Ошибка", "Не удалось создать ключ.")
+
+
+
+"""
+Пакетное создание ключей: по одному имени на строку
+(после имени через пробел можно указать комментарий)
+"""
+class BulkGenerateKeyDialog(tk.Toplevel):
+
+    def __init__(self, parent, on_success=None, tasks=None):
+        super().__init__(parent)
+        self.title("Создание нескольких ключей")
+        self.geometry("420x460")
+        self.resizable(False, False)
+        self.parent = parent
+        self.on_success = on_success
+        self.tasks = tasks or TaskRunner(self)
+        self._task = None
+        self._done = [] # результаты, которые уже пришли из рабочих потоков
+        self._total = 0
+        self.protocol("WM_DELETE_WINDOW", self.on_cancel)
+
+        self.init_widgets()
+        self.transient(parent)
+        self.grab_set()
+        self.wait_window()
+
+
+    def init_widgets(self):
+        padx, pady = 10, 8
+
+        tk.Label(self, text="Имена ключей (по одному на строку, через пробел - комментарий):").pack(
+            anchor="w", padx=padx, pady=(pady, 0))
+        self.names_text = tk.Text(self, height=10, font=("Courier", 10))
+        self.names_text.pack(fill="both", expand=True, padx=padx)
+
+        tk.Label(self, text="Тип ключа:").pack(anchor="w", padx=padx, pady=(pady, 0))
+        self.key_type_var = tk.StringVar(value="ed25519")
+        self.type_combo = ttk.Combobox(self, textvariable=self.key_type_var, values=["ed25519", "rsa", "ECDSA"])
+        self.type_combo.state(["readonly"])
+        self.type_combo.pack(fill="x", padx=padx)
+
+        tk.Label(self, text="Размер ключа в битах (опционально):").pack(anchor="w", padx=padx, pady=(pady, 0))
+        self.bits_entry = ttk.Entry(self)
+        self.bits_entry.pack(fill="x", padx=padx)
+
+        tk.Label(self, text="Пароль для всех ключей (опционально):").pack(anchor="w", padx=padx, pady=(pady, 0))
+        self.pass_entry = ttk.Entry(self, show="*")
+        self.pass_entry.pack(fill="x", padx=padx)
+
+        button_frame = ttk.Frame(self)
+        button_frame.pack(pady=pady)
+        self.submit_btn = ttk.Button(button_frame, text="Создать", command=self.on_submit)
+        self.submit_btn.pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Отмена", command=self.on_cancel).pack(side="left", padx=5)
+
+        # прогресс: сколько ключей из пакета уже готово
+        self.progress = ttk.Progressbar(self, mode="determinate")
+        self.progress_label = ttk.Label(self, text="")
+
+
+    def on_cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.destroy()
+
+
+    """
+    Разбор списка имён в описания ключей
+    """
+    def _specs(self):
+        key_type = self.key_type_var.get()
+        password = self.pass_entry.get()
+        bits_text = self.bits_entry.get().strip()
+        bits = int(bits_text) if bits_text else None
+        specs = []
+        for line in self.names_text.get("1.0", "end").splitlines():
+            parts = line.strip().split(maxsplit=1)
+            if parts:
+                specs.append(key_manager.KeySpec(parts[0], key_type, password,
+                                                 parts[1] if len(parts) > 1 else "", bits))
+        return specs
+
+
+    def on_submit(self):
+        try:
+            specs = self._specs()
+        except ValueError:
+            messagebox.showwarning("Ошибка", "Размер ключа должен быть числом.")
+            return
+        if not specs:
+            messagebox.showwarning("Ошибка", "Введите хотя бы одно имя ключа.")
+            return
+
+        # пакет проверяется целиком: при ошибке не создаётся ни один ключ
+        problems = key_manager.validate_key_specs(specs)
+        if problems:
+            details = "\n".join(f"{name}: {problem}" for name, problem in list(problems.items())[:20])
+            messagebox.showwarning("Ошибка", f"Ключи не созданы:\n\n{details}")
+            return
+
+        self._done = []
+        self._total = len(specs)
+        self.submit_btn.state(["disabled"])
+        self.progress.config(maximum=self._total, value=0)
+        self.progress.pack(fill="x", padx=10, pady=(0, 4))
+        self.progress_label.pack(pady=(0, 8))
+        self._task = self.tasks.submit(
+            key_manager.generate_keypairs, specs,
+            on_result=self._done.append, # list.append безопасен из рабочих потоков
+            cancellable=True,
+            on_done=self.on_generated,
+            on_error=self.on_failed,
+            label=f"Генерация {self._total} ключей..."
+        )
+        self._update_progress()
+
+
+    def _update_progress(self):
+        if self._task is None:
+            return
+        self.progress.config(value=len(self._done))
+        self.progress_label.config(text=f"Готово {len(self._done)} из {self._total}")
+        self.after(100, self._update_progress)
+
+
+    def on_failed(self, error):
+        self._task = None
+        self.progress.pack_forget()
+        self.progress_label.pack_forget()
+        self.submit_btn.state(["!disabled"])
+        messagebox.showerror("Ошибка", str(error))
+
+
+    def on_generated(self, results):
+        self._task = None
+        failed = [r for r in results if not r.success]
+        if self.on_success:
+            self.on_success()
+        if failed:
+            details = "\n".join(f"{r.key_name}: {r.error}" for r in failed[:20])
+            messagebox.showwarning("Готово с ошибками",
+                                   f"Создано {len(results) - len(failed)} из {len(results)}.\n\n{details}")
+        else:
+            messagebox.showinfo("Успешно", f"Создано ключей: {len(results)}.")
+        self.destroy()
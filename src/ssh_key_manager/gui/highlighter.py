@@ -0,0 +1,122 @@
+import re
+import tkinter as tk
+from typing import Dict, List, Optional
+
+
+# цвета подсветки
+TAG_COLORS = {
+    "keyword": "blue",
+    "comment": "gray",
+    "number": "darkgreen",
+    "path": "purple",
+}
+
+# одно выражение на все виды токенов, компилируется один раз
+TOKEN_REGEX = re.compile(
+    r"(?P<comment>#.*)"
+    r"|(?P<keyword>\b(?:ServerAliveInterval|ControlMaster|ControlPersist|User|Port|HostName|IdentityFile|ForwardAgent|ProxyJump)\b)"
+    r"|(?P<path>(?:~|/)[\w/\.-]+)"
+    r"|(?P<number>\b\d+\b)",
+    re.IGNORECASE,
+)
+
+
+"""
+Подсветка синтаксиса ssh-конфига в tk.Text
+
+Правки не подсвечиваются сразу: изменённые строки копятся и через
+delay_ms после последнего нажатия перекрашиваются только они.
+Текст строк берётся одним вызовом text.get, токены ищутся одним
+регулярным выражением, индексы считаются как "строка.колонка",
+а теги добавляются одним вызовом tag_add на каждый вид токена
+"""
+class ConfigHighlighter:
+
+    def __init__(self, text: tk.Text, delay_ms: int = 150):
+        self.text = text
+        self.delay_ms = delay_ms
+        self._first: Optional[int] = None
+        self._last: Optional[int] = None
+        self._after_id: Optional[str] = None
+
+        for tag, color in TAG_COLORS.items():
+            text.tag_config(tag, foreground=color)
+
+        text.bind("<KeyPress>", self._on_key_press, add="+")
+        text.bind("<KeyRelease>", self._on_key_release, add="+")
+        text.bind("<<Paste>>", self._on_key_press, add="+")
+        text.bind("<ButtonRelease-2>", self._on_key_release, add="+")
+        text.bind("<<Undo>>", lambda e: self.schedule_all(), add="+")
+        text.bind("<<Redo>>", lambda e: self.schedule_all(), add="+")
+
+    def _line(self, index: str) -> int:
+        return int(self.text.index(index).split(".")[0])
+
+    def _on_key_press(self, event=None) -> None:
+        # строка курсора и выделение до правки
+        self.mark_dirty(self._line("insert"))
+        ranges = self.text.tag_ranges("sel")
+        if ranges:
+            self.mark_dirty(self._line(ranges[0]), self._line(ranges[-1]))
+
+    def _on_key_release(self, event=None) -> None:
+        # строка курсора после правки (для вставки - конец вставленного)
+        self.mark_dirty(self._line("insert"))
+        self.schedule()
+
+    """
+    Отмечает строки first..last (включительно) для перекраски
+    """
+    def mark_dirty(self, first: int, last: Optional[int] = None) -> None:
+        last = first if last is None else last
+        self._first = first if self._first is None else min(self._first, first)
+        self._last = last if self._last is None else max(self._last, last)
+
+    """
+    Откладывает перекраску на delay_ms (повторный вызов сдвигает срок)
+    """
+    def schedule(self) -> None:
+        if self._after_id is not None:
+            self.text.after_cancel(self._after_id)
+        self._after_id = self.text.after(self.delay_ms, self.flush)
+
+    def schedule_all(self) -> None:
+        self.mark_dirty(1, self._line("end"))
+        self.schedule()
+
+    """
+    Перекрашивает накопленные строки немедленно
+    """
+    def flush(self) -> None:
+        self._after_id = None
+        if self._first is None:
+            return
+        last_line = self._line("end-1c")
+        first, last = max(1, self._first), min(self._last, last_line)
+        self._first = self._last = None
+        if first > last:
+            return
+        self.highlight_lines(first, last)
+
+    """
+    Перекрашивает весь текст
+    """
+    def highlight_all(self) -> None:
+        self._first = self._last = None
+        self.highlight_lines(1, self._line("end-1c"))
+
+    def highlight_lines(self, first: int, last: int) -> None:
+        text = self.text
+        start, end = f"{first}.0", f"{last}.end"
+        for tag in TAG_COLORS:
+            text.tag_remove(tag, start, end)
+
+        ranges: Dict[str, List[str]] = {tag: [] for tag in TAG_COLORS}
+        content = text.get(start, end)
+        for lineno, line in enumerate(content.split("\n"), start=first):
+            for match in TOKEN_REGEX.finditer(line):
+                ranges[match.lastgroup].extend((f"{lineno}.{match.start()}", f"{lineno}.{match.end()}"))
+
+        for tag, indices in ranges.items():
+            if indices:
+                text.tag_add(tag, *indices)
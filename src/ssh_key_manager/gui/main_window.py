@@ -1,38 +1,138 @@
 import tkinter as tk
-import re, os, json
-from datetime import datetime
+import os, json, queue
+from fnmatch import fnmatch
 from tkinter import ttk, messagebox, simpledialog
-from ssh_key_manager.core import key_manager, ssh_config
-from ssh_key_manager.utils import validators
-from ssh_key_manager.gui.dialogs import GenerateKeyDialog
+from ssh_key_manager.core import key_manager, key_usage, lint, rotation, ssh_config
+from ssh_key_manager.core.watcher import Watcher
+from ssh_key_manager.core.search_index import SearchIndex, config_block_keys, config_block_tokens, key_tokens
+from ssh_key_manager.utils import audit_log, validators
+from ssh_key_manager.gui.dialogs import BulkGenerateKeyDialog, GenerateKeyDialog
+from ssh_key_manager.gui.highlighter import ConfigHighlighter
+from ssh_key_manager.gui.tasks import TaskRunner
+from ssh_key_manager.gui.startup import StartupTimer
+from ssh_key_manager.gui.virtual_list import VirtualList
 from pathlib import Path
-from PIL import Image, ImageTk
 
 SETTINGS_PATH = os.path.expanduser("~/.ssh/ssh-gui-settings.json")
 
-def log_to_file(msg: str):
-    log_path = os.path.expanduser("~/.ssh/ssh-gui.log")
-    with open(log_path, "a", encoding="utf-8") as f:
-        f.write(f"{datetime.now().isoformat()} — {msg}\n")
+# файлы ~/.ssh, которые заведомо не ключи: их изменения список ключей не трогают
+NOT_KEY_FILES = {"config", "known_hosts", "known_hosts.old", "authorized_keys",
+                 "ssh-gui.log", "ssh-gui-settings.json"}
+
+# как часто главный поток забирает изменения от наблюдателя за файлами
+WATCH_POLL_MS = 100
+
+# колонки списка ключей: (id, заголовок, ширина)
+KEY_COLUMNS = (
+    ("name", "Имя", 140),
+    ("type", "Тип", 80),
+    ("bits", "Бит", 45),
+    ("fingerprint", "Отпечаток SHA256", 200),
+    ("comment", "Комментарий", 130),
+    ("hosts", "Хостов", 50),
+)
+
+# поля редактора хоста: (подпись, параметр ssh_config); подписи только для показа
+HOST_FIELDS = (
+    ("Имя хоста", "HostName"),
+    ("Пользователь", "User"),
+    ("Порт", "Port"),
+    ("Идентификационный файл", "IdentityFile"),
+)
+
+# колонки результатов проверки конфига
+LINT_COLUMNS = (
+    ("severity", "Уровень", 80),
+    ("where", "Файл:строка", 140),
+    ("block", "Блок", 160),
+    ("message", "Проблема", 460),
+)
+
+LINT_SEVERITY_TITLES = {"error": "ошибка", "warning": "предупреждение", "info": "замечание"}
+
+"""
+Чтение объединённого конфига для списка хостов (в фоновом потоке):
+блоки, их ключи для поиска и готовые строки индекса
+"""
+def load_config_list():
+    merged = list(ssh_config.iter_merged())
+    keys = config_block_keys(merged)
+    tokens = {key: config_block_tokens(block) for key, (_, block) in zip(keys, merged)}
+    return merged, keys, SearchIndex.prepare(tokens), ssh_config.watch_targets()
+
+
+"""
+Сколько блоков конфига ссылается на каждый ключ и что отслеживать,
+чтобы заметить изменение этих ссылок (в фоновом потоке)
+"""
+def load_key_usage(names):
+    return key_usage.usage_counts(names), ssh_config.watch_targets()
+
+
+"""
+Значение параметра для поля редактора хоста (имя параметра в конфиге
+может быть записано в любом регистре: hostname, HostName)
+"""
+def host_field_value(existing, option):
+    for key, value in existing.items():
+        if key.lower() == option.lower():
+            return value
+    return ""
+
+
+"""
+Запись Host для ssh_config.add_or_update_host из полей редактора
+
+values - {параметр: текст поля}; пустые поля не записываются
+"""
+def host_entry_from_fields(host, values):
+    new_entry = {"Host": host}
+    for option, value in values.items():
+        value = value.strip()
+        if value:
+            new_entry[option] = value
+    return new_entry
 
 
 class MainWindow(tk.Tk):
-    def __init__(self):
+    """
+    started_at - момент начала запуска (time.perf_counter()) для замера
+    времени до первого кадра, on_startup_report - куда отдать замеры
+    """
+    def __init__(self, started_at=None, on_startup_report=None):
         super().__init__()
-
-        # иконка приложения
-        icon_path = Path(__file__).parent.parent / "assets" / "ssh.png"
-        if icon_path.exists():
-            try:
-                icon_img = ImageTk.PhotoImage(Image.open(icon_path))
-                self.iconphoto(False, icon_img)
-            except Exception as e:
-                print(f"[WARNING] Не удалось установить иконку: {e}")
+        self.startup = StartupTimer(self, started_at, on_startup_report)
 
         self.title("SSH Key Manager")
-        self.geometry("700x500")
+        self.geometry("900x500")
         self.resizable(False, False)
 
+        # фоновые операции (диск, ssh-keygen) и индикатор их выполнения
+        self.tasks = TaskRunner(self, on_busy_change=self._on_busy_change)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # индексы для поиска по спискам и полные (неотфильтрованные) списки
+        self.config_index = SearchIndex()
+        self.keys_index = SearchIndex()
+        self._config_rows = []
+        self._config_payloads = []
+        self._config_keys = []
+        self._key_infos = []
+        # сколько блоков конфига ссылается на каждый ключ (IdentityFile)
+        self._key_usage = {}
+
+        # слежение за ~/.ssh и файлами конфига: изменения на диске попадают
+        # в списки сами, без кнопки "Обновить"
+        self.watcher = None
+        self._changes = queue.Queue()
+        self._config_watch = (set(), [])
+
+        self.status_frame = ttk.Frame(self)
+        self.status_frame.pack(side="bottom", fill="x")
+        self.status_label = ttk.Label(self.status_frame, text="")
+        self.status_label.pack(side="left", padx=10)
+        self.progress = ttk.Progressbar(self.status_frame, mode="indeterminate", length=120)
+
         self.notebook = ttk.Notebook(self)
         self.notebook.pack(expand=True, fill="both")
 
@@ -43,13 +143,118 @@ class MainWindow(tk.Tk):
         self.notebook.add(self.keys_frame, text="Ключи")
         self.notebook.add(self.config_frame, text="Удаленные подключения")
         self.notebook.add(self.settings_frame, text="Настройки")
-        # инициализация UI во вкладках
         self.load_settings()
-        self.init_settings_tab()
-        self.init_keys_tab()
-        self.init_config_tab()
+
+        # содержимое вкладки строится (и заполняется) при первом открытии,
+        # иконка грузится после первой отрисовки окна
+        self._tab_builders = {
+            str(self.keys_frame): self.init_keys_tab,
+            str(self.config_frame): self.init_config_tab,
+            str(self.settings_frame): self.init_settings_tab,
+        }
+        self.notebook.bind("<<NotebookTabChanged>>", lambda e: self.build_current_tab())
+        self.startup.on_first_frame += [self.build_current_tab, self.load_icon, self.start_watcher]
+        self.startup.mark("window_created")
+
+
+    """
+    Строит содержимое открытой вкладки, если она открыта впервые
+    """
+    def build_current_tab(self):
+        if not self.startup.marks.get("first_frame"):
+            return  # до первого кадра окно рисуется с пустыми вкладками
+        builder = self._tab_builders.pop(self.notebook.select(), None)
+        if builder is not None:
+            builder()
+
+    """
+    Иконка приложения: PNG читается самим Tk, без Pillow
+    """
+    def load_icon(self):
+        icon_path = Path(__file__).parent.parent / "assets" / "ssh.png"
+        if icon_path.exists():
+            try:
+                self.icon_img = tk.PhotoImage(file=str(icon_path))  # ссылка нужна, иначе картинку соберёт GC
+                self.iconphoto(False, self.icon_img)
+            except Exception as e:
+                print(f"[WARNING] Не удалось установить иконку: {e}")
 
 
+    def _on_busy_change(self, count, label):
+        if count:
+            self.status_label.config(text=label or "Выполняется...")
+            if not self.progress.winfo_ismapped():
+                self.progress.pack(side="right", padx=10, pady=2)
+                self.progress.start(10)
+        else:
+            self.status_label.config(text="")
+            self.progress.stop()
+            self.progress.pack_forget()
+
+    def on_close(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.tasks.shutdown()
+        audit_log.get_audit_log().close()
+        self.destroy()
+
+
+    """
+    Слежение за файлами: наблюдатель работает в своём потоке и складывает
+    изменения в очередь, главный поток забирает их через after()
+    """
+    def start_watcher(self):
+        self.watcher = Watcher(self._changes.put)
+        self._update_watch()
+        self.watcher.start()
+        self.after(WATCH_POLL_MS, self._poll_changes)
+
+    def _update_watch(self):
+        if self.watcher is not None:
+            self.watcher.watch({key_manager.SSH_DIR} | self._config_watch[0])
+
+    def _poll_changes(self):
+        paths, overflow = set(), False
+        try:
+            while True:
+                changes = self._changes.get_nowait()
+                paths |= changes.paths
+                overflow = overflow or changes.overflow
+        except queue.Empty:
+            pass
+        if paths or overflow:
+            self._on_files_changed(paths, overflow)
+        self.after(WATCH_POLL_MS, self._poll_changes)
+
+    """
+    Изменения на диске: перечитываются только затронутые ключи, а конфиг -
+    только если изменился один из его файлов (разбираются заново лишь
+    изменившиеся файлы, в индексе и списке меняются только их блоки)
+    """
+    def _on_files_changed(self, paths, overflow):
+        ssh_dir = key_manager.SSH_DIR
+        keys_built = str(self.keys_frame) not in self._tab_builders
+        config_built = str(self.config_frame) not in self._tab_builders
+
+        if keys_built:
+            names = {p.name[:-4] if p.name.endswith(".pub") else p.name
+                     for p in paths if p.parent == ssh_dir}
+            names = {n for n in names if n and not n.startswith(".") and n not in NOT_KEY_FILES}
+            if overflow or ssh_dir in paths:
+                self.refresh_keys()
+            elif names:
+                self.tasks.submit(key_manager.refresh_key_infos, names, on_done=self._merge_key_infos,
+                                  lane="keys", label="Обновление ключей...")
+
+        if config_built or keys_built:
+            dirs, patterns = self._config_watch
+            if overflow or any(p in dirs or any(fnmatch(str(p), pattern) for pattern in patterns)
+                               for p in paths):
+                if config_built:
+                    self.refresh_config_list(label="Обновление ~/.ssh/config...")
+                else:
+                    self.refresh_key_usage()
+
     def load_settings(self):
         try:
             with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
@@ -59,13 +264,18 @@ class MainWindow(tk.Tk):
 
         self.auto_copy_var = tk.BooleanVar(value=settings.get("auto_copy", True))
         self.log_to_file_var = tk.BooleanVar(value=settings.get("log_to_file", False))
+        # журнал пишут и ядро, и интерфейс; настройка только включает его
+        audit_log.set_enabled(self.log_to_file_var.get())
         self.ssh_path_value = settings.get("ssh_path", "~/.ssh")
+        # каталог ключей и config; модули ядра читают его при каждом вызове
+        key_manager.set_ssh_dir(self.ssh_path_value or "~/.ssh")
 
     def save_settings(self):
+        audit_log.set_enabled(self.log_to_file_var.get())
         settings = {
             "auto_copy": self.auto_copy_var.get(),
             "log_to_file": self.log_to_file_var.get(),
-            "ssh_path": self.ssh_path_entry.get().strip()
+            "ssh_path": self.ssh_path_value
         }
         try:
             with open(SETTINGS_PATH, "w", encoding="utf-8") as f:
@@ -74,17 +284,25 @@ class MainWindow(tk.Tk):
             print(f"[ERROR] Не удалось сохранить настройки: {e}")
 
 
-    def init_keys_tab(self):
-        # Список ключей
-        self.keys_listbox = tk.Listbox(self.keys_frame, height=20)
-        self.keys_listbox.pack(side="left", fill="y", padx=10, pady=10)
+    """
+    Поле поиска над списком: command вызывается при каждом изменении текста
+    """
+    def _make_filter(self, frame, command):
+        filter_frame = ttk.Frame(frame)
+        filter_frame.pack(side="top", fill="x", padx=10, pady=(10, 0))
+        ttk.Label(filter_frame, text="Поиск:").pack(side="left")
+        var = tk.StringVar()
+        ttk.Entry(filter_frame, textvariable=var).pack(side="left", fill="x", expand=True, padx=(5, 0))
+        var.trace_add("write", lambda *args: command())
+        return var
 
-        scrollbar = tk.Scrollbar(self.keys_frame, orient="vertical")
-        scrollbar.config(command=self.keys_listbox.yview)
-        scrollbar.pack(side="left", fill="y")
-        self.keys_listbox.config(yscrollcommand=scrollbar.set)
+    def init_keys_tab(self):
+        self.keys_filter_var = self._make_filter(self.keys_frame, self._apply_keys_filter)
 
-        self.keys_listbox.bind("<Double-1>", lambda e: self.show_public_key())
+        # Список ключей (виртуальный: в виджете только видимые строки)
+        self.keys_list = VirtualList(self.keys_frame, columns=KEY_COLUMNS, height=17, show_headings=True,
+                                     on_activate=lambda i: self.show_public_key())
+        self.keys_list.pack(side="left", fill="y", padx=10, pady=10)
 
         # Панель действий (кнопки справа)
         button_frame = tk.Frame(self.keys_frame)
@@ -96,27 +314,29 @@ class MainWindow(tk.Tk):
         self.generate_btn = ttk.Button(button_frame, text="Добавить", command=self.generate_key_dialog)
         self.generate_btn.pack(pady=5)
 
+        self.bulk_generate_btn = ttk.Button(button_frame, text="Добавить несколько", command=self.bulk_generate_dialog)
+        self.bulk_generate_btn.pack(pady=5)
+
         self.delete_btn = ttk.Button(button_frame, text="Удалить", command=self.delete_selected_key)
         self.delete_btn.pack(pady=5)
 
         self.view_btn = ttk.Button(button_frame, text="Показать публичный ключ", command=self.show_public_key)
         self.view_btn.pack(pady=5)
 
+        self.rotate_btn = ttk.Button(button_frame, text="Заменить ключ", command=self.rotate_selected_key)
+        self.rotate_btn.pack(pady=5)
+
         self.refresh_keys()
 
 
 
     def init_config_tab(self):
-        # Список хостов
-        self.config_listbox = tk.Listbox(self.config_frame, height=20)
-        self.config_listbox.pack(side="left", fill="y", padx=10, pady=10)
+        self.config_filter_var = self._make_filter(self.config_frame, self._apply_config_filter)
 
-        scrollbar = tk.Scrollbar(self.config_frame, orient="vertical")
-        scrollbar.config(command=self.config_listbox.yview)
-        scrollbar.pack(side="left", fill="y")
-        self.config_listbox.config(yscrollcommand=scrollbar.set)
-
-        self.config_listbox.bind("<Double-1>", lambda e: self.edit_selected_host())
+        # Список хостов (виртуальный: в виджете только видимые строки)
+        self.config_list = VirtualList(self.config_frame, height=18,
+                                       on_activate=lambda i: self.edit_selected_host())
+        self.config_list.pack(side="left", fill="y", padx=10, pady=10)
 
         # Панель кнопок
         button_frame = tk.Frame(self.config_frame)
@@ -126,34 +346,73 @@ class MainWindow(tk.Tk):
         ttk.Button(button_frame, text="Добавить", command=self.add_host_dialog).pack(pady=5)
         ttk.Button(button_frame, text="Редактировать", command=self.edit_selected_host).pack(pady=5)
         ttk.Button(button_frame, text="Удалить", command=self.delete_selected_host).pack(pady=5)
+        ttk.Button(button_frame, text="Проверить", command=self.lint_config).pack(pady=5)
 
         self.refresh_config_list()
 
-    def refresh_config_list(self):
-        self.config_listbox.delete(0, tk.END)
-        all_blocks = ssh_config.read_config()
-        self._config_entries = all_blocks
-
-        if not all_blocks:
+    def refresh_config_list(self, label="Чтение ~/.ssh/config..."):
+        # разбор конфига идёт в фоне, список обновится по готовности
+        self.tasks.submit(load_config_list,
+                          on_done=lambda result: self._show_config_list(*result),
+                          lane="config", channel="config-list",
+                          label=label)
+
+    def _show_config_list(self, merged, keys, haystacks, watch_targets):
+        # набор Include мог поменяться - следим за актуальными каталогами
+        self._config_watch = watch_targets
+        self._update_watch()
+        self.refresh_key_usage()
+        # объединённый конфиг: основной файл и файлы из Include
+        root_path = ssh_config.CONFIG_PATH
+        # в индексе меняются только изменившиеся блоки
+        self.config_index.sync_prepared(haystacks)
+        self._config_keys = keys
+
+        if not merged:
             # Файл пустой или не существует — показываем запись-заглушку
-            self.config_listbox.insert(tk.END, "[Пустой конфиг — нажмите для редактирования]")
-            self._config_entries = [{"type": "empty"}]  # специальный маркер
+            self._config_rows = ["[Пустой конфиг — нажмите для редактирования]"]
+            self._config_payloads = [({"type": "empty"}, root_path)]  # специальный маркер
+            self._config_keys = [None]
+            self._apply_config_filter()
             return
 
-        for i, entry in enumerate(all_blocks):
+        rows = []
+        payloads = []
+        for doc, entry in merged:
             if entry.get("type") == "host":
                 display = f"Host {entry.get('host', '<без имени>')}"
+            elif entry.get("type") == "match":
+                display = f"Match {entry.get('criteria', '')}"
             else:
                 display = "[Глобальные настройки]"
-            self.config_listbox.insert(tk.END, display)
+            if doc.path != root_path:
+                # блок из подключённого файла
+                display += f"  ({doc.path.name})"
+            rows.append(display)
+            payloads.append((entry, doc.path))
+        self._config_rows = rows
+        self._config_payloads = payloads
+        self._apply_config_filter()
+
+    def _apply_config_filter(self):
+        matched = self.config_index.search(self.config_filter_var.get())
+        rows, payloads = self._config_rows, self._config_payloads
+        if matched is not None:
+            # заглушка пустого конфига (ключ None) видна всегда
+            shown = [i for i, key in enumerate(self._config_keys) if key is None or key in matched]
+            rows = [rows[i] for i in shown]
+            payloads = [payloads[i] for i in shown]
+        # в список применяется только разница со старым содержимым
+        self.config_list.set_items(rows, payloads)
 
 
     def get_selected_host_entry(self):
-        try:
-            index = self.config_listbox.curselection()[0]
-            return self._config_entries[index]
-        except IndexError:
-            return None
+        selected = self.config_list.selected_payload()
+        return selected[0] if selected else None
+
+    def get_selected_host_source(self):
+        selected = self.config_list.selected_payload()
+        return selected[1] if selected else None
 
     def delete_selected_host(self):
         entry = self.get_selected_host_entry()
@@ -162,16 +421,46 @@ class MainWindow(tk.Tk):
             return
 
         if entry.get("type") != "host":
-            messagebox.showinfo("Удаление", "Нельзя удалить глобальные настройки или пустой конфиг.")
+            messagebox.showinfo("Удаление", "Нельзя удалить глобальные настройки, блок Match или пустой конфиг.")
             return
 
         host_name = entry.get("host")
         confirm = messagebox.askyesno("Удаление", f"Удалить Host '{host_name}'?")
         if confirm:
-            ssh_config.delete_host(host_name)
-            if self.log_to_file_var.get():
-                log_to_file(f"Удалён хост: {host_name}")
-            self.refresh_config_list()
+            def done(_):
+                self.refresh_config_list()
+
+            self.tasks.submit(ssh_config.delete_host, host_name, on_done=done,
+                              on_error=self._show_task_error, lane="config",
+                              label=f"Удаление {host_name}...")
+
+    def lint_config(self):
+        # проверка читает тот же кэш конфига, что и список хостов
+        self.tasks.submit(lint.lint, on_done=self._show_lint_results,
+                          on_error=self._show_task_error, lane="config",
+                          label="Проверка ~/.ssh/config...")
+
+    def _show_lint_results(self, issues):
+        if not issues:
+            messagebox.showinfo("Проверка конфига", "Проблем не найдено.")
+            return
+
+        dialog = tk.Toplevel(self)
+        dialog.title("Проверка конфига")
+        counts = lint.summarize(issues)
+        summary = ", ".join(f"{LINT_SEVERITY_TITLES[s]}: {n}" for s, n in counts.items() if n)
+        ttk.Label(dialog, text=summary).pack(anchor="w", padx=10, pady=(10, 0))
+
+        results = VirtualList(dialog, columns=LINT_COLUMNS, height=15, show_headings=True,
+                              on_activate=lambda i: messagebox.showinfo(
+                                  "Проверка конфига", issues[i].message, parent=dialog))
+        results.pack(fill="both", expand=True, padx=10, pady=10)
+        results.set_items([(LINT_SEVERITY_TITLES[item.severity], f"{item.path.name}:{item.line}",
+                            item.block, item.message) for item in issues], issues)
+        ttk.Button(dialog, text="Закрыть", command=dialog.destroy).pack(pady=(0, 10))
+
+    def _show_task_error(self, error):
+        messagebox.showerror("Ошибка", str(error))
 
 
     # открытие диалога добавления хоста
@@ -187,7 +476,6 @@ class MainWindow(tk.Tk):
         if entry.get("type") == "empty":
             # открываем глобальный редактор (пустой)
             empty_entry = {"type": "global", "lines": []}
-            self._config_entries = [empty_entry]
             self._global_editor_dialog(existing=empty_entry)
             return
 
@@ -196,8 +484,8 @@ class MainWindow(tk.Tk):
                 "Host": entry.get("host", ""),
                 **entry.get("params", {})
             })
-        elif entry.get("type") == "global":
-            self._global_editor_dialog(existing=entry)
+        elif entry.get("type") in ("global", "match"):
+            self._global_editor_dialog(existing=entry, source=self.get_selected_host_source())
 
     def _host_editor_dialog(self, existing=None):
         # модальное окно редактирования записи
@@ -214,7 +502,6 @@ class MainWindow(tk.Tk):
         dialog.transient(self)
         dialog.grab_set()
 
-        fields = ["Имя хоста", "Пользователь", "Порт", "Идентификационный файл"]
         entries = {}
 
         # поле Host (редактируемое только при добавлении)
@@ -226,13 +513,13 @@ class MainWindow(tk.Tk):
             host_entry.config(state="disabled")
 
         # поля (HostName, User, Port ...)
-        for field in fields:
-            tk.Label(dialog, text=field + ":").pack()
+        for label, option in HOST_FIELDS:
+            tk.Label(dialog, text=label + ":").pack()
             e = ttk.Entry(dialog)
             e.pack(fill="x", padx=10)
-            if existing and field in existing:
-                e.insert(0, existing[field])
-            entries[field] = e
+            if existing:
+                e.insert(0, host_field_value(existing, option))
+            entries[option] = e
 
         # сохранение
         def on_save():
@@ -240,20 +527,17 @@ class MainWindow(tk.Tk):
             if not validators.is_valid_host_alias(host):
                 messagebox.showerror("Ошибка", "Недопустимое имя Host.")
                 return
-            new_entry = {"Host": host}
-            for k in fields:
-                v = entries[k].get().strip()
-                if v:
-                    new_entry[k] = v
-            ssh_config.add_or_update_host(new_entry)
-            if self.log_to_file_var.get():
-                log_to_file(f"Сохранён/обновлён хост: {host}")
-            self.refresh_config_list()
+            new_entry = host_entry_from_fields(host, {option: e.get() for option, e in entries.items()})
+
+            self.tasks.submit(ssh_config.add_or_update_host, new_entry,
+                              on_done=lambda _: self.refresh_config_list(),
+                              on_error=self._show_task_error, lane="config",
+                              label=f"Сохранение {host}...")
             dialog.destroy()
 
         ttk.Button(dialog, text="Сохранить", command=on_save).pack(pady=10)
 
-    def _global_editor_dialog(self, existing):
+    def _global_editor_dialog(self, existing, source=None):
         dialog = tk.Toplevel(self)
         dialog.title("Глобальные настройки")
         dialog.geometry("600x475")
@@ -271,53 +555,18 @@ class MainWindow(tk.Tk):
         original_lines = existing.get("lines", [])
         text.insert("1.0", "".join(original_lines))
 
-        # подсветка
-        def highlight():
-            text.tag_remove("keyword", "1.0", "end")
-            text.tag_remove("comment", "1.0", "end")
-            text.tag_remove("number", "1.0", "end")
-            text.tag_remove("path", "1.0", "end")
-
-            keywords = r"\b(ServerAliveInterval|ControlMaster|ControlPersist|User|Port|HostName|IdentityFile|ForwardAgent|ProxyJump)\b"
-            for match in re.finditer(keywords, text.get("1.0", "end"), flags=re.IGNORECASE):
-                start = f"1.0 + {match.start()} chars"
-                end = f"1.0 + {match.end()} chars"
-                text.tag_add("keyword", start, end)
-
-            for match in re.finditer(r"#.*", text.get("1.0", "end")):
-                start = f"1.0 + {match.start()} chars"
-                end = f"1.0 + {match.end()} chars"
-                text.tag_add("comment", start, end)
-
-            for match in re.finditer(r"\b\d+\b", text.get("1.0", "end")):
-                start = f"1.0 + {match.start()} chars"
-                end = f"1.0 + {match.end()} chars"
-                text.tag_add("number", start, end)
-
-            for match in re.finditer(r"(~|/)[\w/\.-]+", text.get("1.0", "end")):
-                start = f"1.0 + {match.start()} chars"
-                end = f"1.0 + {match.end()} chars"
-                text.tag_add("path", start, end)
-
-        # конфигурация цветов
-        text.tag_config("keyword", foreground="blue")
-        text.tag_config("comment", foreground="gray")
-        text.tag_config("number", foreground="darkgreen")
-        text.tag_config("path", foreground="purple")
-
-        # запуск подсветки при изменении текста
-        def on_key_release(event):
-            highlight()
-
-        text.bind("<KeyRelease>", on_key_release)
-
-        highlight()  # подсветить сразу
+        # подсветка: только изменённые строки, с задержкой после ввода
+        highlighter = ConfigHighlighter(text)
+        highlighter.highlight_all()  # подсветить сразу
 
         def on_save():
             new_lines = text.get("1.0", "end").strip().splitlines(keepends=True)
-            existing["lines"] = [line if line.endswith("\n") else line + "\n" for line in new_lines]
-            ssh_config.write_config(self._config_entries)
-            self.refresh_config_list()
+            new_lines = [line if line.endswith("\n") else line + "\n" for line in new_lines]
+            # переписываем только участок файла с этим блоком
+            self.tasks.submit(ssh_config.replace_block_text, existing, "".join(new_lines), path=source,
+                              on_done=lambda _: self.refresh_config_list(),
+                              on_error=self._show_task_error, lane="config",
+                              label="Сохранение настроек...")
             dialog.destroy()
 
         ttk.Button(dialog, text="Сохранить", command=on_save).pack(pady=10)
@@ -341,30 +590,96 @@ class MainWindow(tk.Tk):
                         variable=self.log_to_file_var,
                         command=self.save_settings).pack(anchor="w", padx=20)
 
-        ttk.Label(frame, text="Путь к ssh (опционально):").pack(anchor="w", padx=20, pady=(20, 0))
+        ttk.Label(frame, text="Каталог ssh (ключи и config):").pack(anchor="w", padx=20, pady=(20, 0))
         self.ssh_path_entry = ttk.Entry(frame)
         self.ssh_path_entry.insert(0, self.ssh_path_value)
         self.ssh_path_entry.pack(fill="x", padx=20)
 
         # сохранение поле пути
-        self.ssh_path_entry.bind("<FocusOut>", lambda e: self.save_settings())
+        self.ssh_path_entry.bind("<FocusOut>", lambda e: self._on_ssh_path_changed())
+
+    def _on_ssh_path_changed(self):
+        value = self.ssh_path_entry.get().strip() or "~/.ssh"
+        if value == self.ssh_path_value:
+            return
+        self.ssh_path_value = value
+        self.save_settings()
+        # кэши конфига сбрасываются в его полосе, потом списки строятся заново
+        self.tasks.submit(key_manager.set_ssh_dir, value, on_done=lambda _: self._on_ssh_dir_switched(),
+                          lane="config", label="Смена каталога ssh...")
+
+    def _on_ssh_dir_switched(self):
+        self._config_watch = (set(), [])
+        self._update_watch()
+        if str(self.keys_frame) not in self._tab_builders:
+            self.refresh_keys()
+        if str(self.config_frame) not in self._tab_builders:
+            self.refresh_config_list()
 
 
     """
     кнопки взаимодействия
     """
     def refresh_keys(self):
-        self.keys_listbox.delete(0, tk.END)
-        keys = key_manager.list_keys()
-        for key in keys:
-            self.keys_listbox.insert(tk.END, key)
+        # сканирование ~/.ssh в фоне, список обновится по готовности
+        self.tasks.submit(key_manager.list_key_infos, on_done=self._show_keys,
+                          lane="keys", channel="keys-list",
+                          label="Сканирование ключей...")
+
+    def _show_keys(self, infos):
+        self._key_infos = infos
+        self.keys_index.sync({info.name: key_tokens(info) for info in infos})
+        self._apply_keys_filter()
+        self.refresh_key_usage()
+
+    """
+    Счётчики использования ключей хостами: индекс читает кэш конфига,
+    поэтому считается в полосе конфига
+    """
+    def refresh_key_usage(self):
+        if str(self.keys_frame) in self._tab_builders:
+            return  # вкладка ключей ещё не открыта
+        names = [info.name for info in self._key_infos]
+        self.tasks.submit(load_key_usage, names, on_done=lambda result: self._show_key_usage(*result),
+                          lane="config", channel="key-usage")
+
+    def _show_key_usage(self, counts, watch_targets):
+        self._config_watch = watch_targets
+        self._update_watch()
+        if counts != self._key_usage:
+            self._key_usage = counts
+            self._apply_keys_filter()
+
+    # точечное обновление: changed - {имя: KeyInfo или None, если ключа больше нет}
+    def _merge_key_infos(self, changed):
+        infos = {info.name: info for info in self._key_infos}
+        for name, info in changed.items():
+            if info is None:
+                if infos.pop(name, None) is not None:
+                    self.keys_index.remove(name)
+            elif infos.get(name) != info:
+                infos[name] = info
+                self.keys_index.add(name, key_tokens(info))
+        self._key_infos = [infos[name] for name in sorted(infos)]
+        self._apply_keys_filter()
+        if any(name not in self._key_usage for name in changed):
+            self.refresh_key_usage()
+
+    def _apply_keys_filter(self):
+        matched = self.keys_index.search(self.keys_filter_var.get())
+        infos = self._key_infos
+        if matched is not None:
+            infos = [info for info in infos if info.name in matched]
+        usage = self._key_usage
+        rows = [(info.name, info.key_type or "?", info.bits or "",
+                 info.fingerprint_sha256 or "", info.comment or "", usage.get(info.name, ""))
+                for info in infos]
+        # в список применяется только разница со старым содержимым
+        self.keys_list.set_items(rows, [info.name for info in infos])
 
 
     def get_selected_key(self):
-        try:
-            return self.keys_listbox.get(self.keys_listbox.curselection())
-        except Exception:
-            return None
+        return self.keys_list.selected_payload()
 
     def delete_selected_key(self):
         key_name = self.get_selected_key()
@@ -372,16 +687,75 @@ class MainWindow(tk.Tk):
             messagebox.showwarning("Выбор ключа", "Выберите ключ для удаления.")
             return
 
-        confirm = messagebox.askyesno("Подтверждение", f"Удалить ключ '{key_name}'?")
+        # перед удалением проверяем, какие хосты ещё ссылаются на ключ
+        self.tasks.submit(key_usage.references, key_name,
+                          on_done=lambda refs: self._confirm_delete_key(key_name, refs),
+                          on_error=lambda e: self._confirm_delete_key(key_name, []),
+                          lane="config", label="Проверка использования ключа...")
+
+    def _confirm_delete_key(self, key_name, refs):
+        if refs:
+            shown = [f"  {ref.label}  ({ref.source.name})" for ref in refs[:10]]
+            if len(refs) > len(shown):
+                shown.append(f"  ... и ещё {len(refs) - len(shown)}")
+            confirm = messagebox.askyesno(
+                "Ключ используется",
+                f"Ключ '{key_name}' указан в IdentityFile у {len(refs)} блоков конфига:\n\n"
+                + "\n".join(shown) + "\n\nПосле удаления эти подключения перестанут работать. Удалить?",
+                icon="warning")
+        else:
+            confirm = messagebox.askyesno("Подтверждение", f"Удалить ключ '{key_name}'?")
         if confirm:
-            success = key_manager.delete_keypair(key_name)
-            if success:
-                if self.log_to_file_var.get():
-                    log_to_file(f"Удалён ключ: {key_name}")
-                messagebox.showinfo("Готово", "Ключ удалён.")
-                self.refresh_keys()
-            else:
-                messagebox.showerror("Ошибка", "Не удалось удалить ключ.")
+            def done(success):
+                if success:
+                    messagebox.showinfo("Готово", "Ключ удалён.")
+                    self.refresh_keys()
+                else:
+                    messagebox.showerror("Ошибка", "Не удалось удалить ключ.")
+
+            self.tasks.submit(key_manager.delete_keypair, key_name, on_done=done,
+                              lane="keys", label=f"Удаление {key_name}...")
+
+    """
+    Замена ключа: новая пара того же типа, IdentityFile во всех блоках
+    переписываются на неё одной записью конфига, старая пара - в архив.
+    План и замена идут в полосе конфига: оба читают его кэш
+    """
+    def rotate_selected_key(self):
+        key_name = self.get_selected_key()
+        if not key_name:
+            messagebox.showwarning("Выбор ключа", "Выберите ключ для замены.")
+            return
+
+        self.tasks.submit(rotation.plan_rotation, [key_name],
+                          on_done=self._confirm_rotate_key, on_error=self._show_task_error,
+                          lane="config", label="Подготовка замены ключа...")
+
+    def _confirm_rotate_key(self, plan):
+        if plan.problems:
+            messagebox.showerror("Ошибка", "\n".join(f"{name}: {problem}" for name, problem in plan.problems.items()))
+            return
+
+        item = plan.items[0]
+        refs = item.references
+        shown = [f"  {ref.label}  ({ref.source.name})" for ref in refs[:10]]
+        if len(refs) > len(shown):
+            shown.append(f"  ... и ещё {len(refs) - len(shown)}")
+        usage = ("IdentityFile будет переписан в блоках:\n\n" + "\n".join(shown)) if refs \
+            else "Ключ не указан ни в одном блоке конфига."
+        if not messagebox.askyesno(
+                "Замена ключа",
+                f"Создать ключ '{item.new_name}' ({item.spec.key_type}) вместо '{item.old_name}'?\n\n"
+                f"{usage}\n\nСтарая пара будет перенесена в {plan.archive_dir}."):
+            return
+
+        def done(result):
+            messagebox.showinfo("Готово", f"Ключ заменён на {result.rotated[item.old_name]}.")
+            self.refresh_keys()
+            self.refresh_config_list()
+
+        self.tasks.submit(rotation.rotate, plan, on_done=done, on_error=self._show_task_error,
+                          lane="config", label=f"Замена {item.old_name}...")
 
 
     def show_public_key(self):
@@ -390,7 +764,11 @@ class MainWindow(tk.Tk):
             messagebox.showwarning("Выбор ключа", "Выберите ключ.")
             return
 
-        pubkey = key_manager.get_public_key(key_name)
+        self.tasks.submit(key_manager.get_public_key, key_name,
+                          on_done=lambda pubkey: self._show_public_key(key_name, pubkey),
+                          lane="keys")
+
+    def _show_public_key(self, key_name, pubkey):
         if pubkey:
             if self.auto_copy_var.get():
                 self.clipboard_clear()
@@ -399,9 +777,12 @@ class MainWindow(tk.Tk):
             else:
                 messagebox.showinfo("Публичный ключ", f"{pubkey}")
 
-            if self.log_to_file_var.get():
-                log_to_file(f"Просмотрен публичный ключ: {key_name}")
+            audit_log.log_event("gui.public_key_viewed", name=key_name, copied=self.auto_copy_var.get())
 
     # открытие диалога генерации ключа
     def generate_key_dialog(self):
-        GenerateKeyDialog(self, on_success=self.refresh_keys)
\ No newline at end of file
+        GenerateKeyDialog(self, on_success=self.refresh_keys, tasks=self.tasks)
+
+    # открытие диалога пакетной генерации ключей
+    def bulk_generate_dialog(self):
+        BulkGenerateKeyDialog(self, on_success=self.refresh_keys, tasks=self.tasks)
\ No newline at end of file
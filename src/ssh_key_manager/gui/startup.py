@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import tkinter as tk
+from typing import Callable, Dict, List, Optional
+
+
+# переменная окружения: при "1" замеры запуска печатаются в stderr
+TIMING_ENV = "SSH_KEY_MANAGER_STARTUP_TIMING"
+
+# если окно так и не отрисовалось (например, скрыто), отложенная
+# инициализация всё равно запускается через это время
+FIRST_FRAME_FALLBACK_MS = 1000
+
+
+"""
+Замер времени запуска окна и запуск отложенной инициализации
+
+started_at - момент начала запуска (time.perf_counter()), по умолчанию
+момент создания объекта. mark(name) отмечает этап, первый Expose окна
+считается первым кадром: после него вызываются функции из
+on_first_frame (построение вкладки, загрузка иконки), а затем отчёт
+{этап: секунды от начала} передаётся в on_report
+"""
+class StartupTimer:
+
+    def __init__(self, root: tk.Misc, started_at: Optional[float] = None,
+                 on_report: Optional[Callable[[Dict[str, float]], None]] = None):
+        self.root = root
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.on_report = on_report if on_report is not None else default_report
+        self.on_first_frame: List[Callable[[], None]] = []
+        self.marks: Dict[str, float] = {}
+        self._done = False
+        self._bind_id = root.bind("<Expose>", self._on_expose, add="+")
+        self._fallback_id = root.after(FIRST_FRAME_FALLBACK_MS, self._first_frame)
+
+    def mark(self, name: str) -> float:
+        elapsed = time.perf_counter() - self.started_at
+        self.marks[name] = elapsed
+        return elapsed
+
+    def _on_expose(self, event=None) -> None:
+        # Expose приходит до отрисовки: сама отрисовка идёт в idle-обработчиках Tk
+        if not self._done:
+            self.root.after_idle(self._first_frame)
+
+    def _first_frame(self) -> None:
+        if self._done:
+            return
+        self._done = True
+        self.mark("first_frame")
+        self.root.unbind("<Expose>", self._bind_id)
+        self.root.after_cancel(self._fallback_id)
+
+        for callback in self.on_first_frame:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[ERROR] отложенная инициализация: {e}")
+        self.mark("deferred_init")
+        self.on_report(dict(self.marks))
+
+
+"""
+Отчёт по умолчанию: печать в stderr, если задана переменная окружения TIMING_ENV
+"""
+def default_report(marks: Dict[str, float]) -> None:
+    if os.environ.get(TIMING_ENV) == "1":
+        line = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in marks.items())
+        print(f"[STARTUP] {line}", file=sys.stderr)
@@ -0,0 +1,176 @@
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+"""
+Хэндл фоновой задачи: позволяет отменить её и узнать, отменена ли она
+"""
+class TaskHandle:
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.cancel_event = threading.Event()
+        self.future: Optional[Future] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    """
+    Отменяет задачу: если она ещё в очереди, она не запустится,
+    если уже идёт - получит сигнал через cancel_event, а её результат
+    не будет доставлен в интерфейс
+    """
+    def cancel(self) -> None:
+        self.cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+
+"""
+Выполнение долгих операций (диск, ssh-keygen) вне главного потока Tk
+
+Задачи выполняются в пулах потоков, а результаты складываются в очередь,
+которую главный поток забирает через after() - виджеты трогаются только
+из главного потока. Задачи одной "полосы" (lane) выполняются строго по
+очереди в одном потоке: так все обращения к кэшу ssh-конфига идут из
+одного места. Новая задача с тем же channel отменяет предыдущую (например,
+повторное нажатие "Обновить")
+"""
+class TaskRunner:
+
+    POLL_INTERVAL_MS = 50
+
+    def __init__(self, root: tk.Misc, max_workers: int = 4,
+                 on_busy_change: Optional[Callable[[int, str], None]] = None):
+        self.root = root
+        self.on_busy_change = on_busy_change
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ssh-km")
+        self._lanes: Dict[str, ThreadPoolExecutor] = {}
+        self._channels: Dict[str, TaskHandle] = {}
+        self._results: "queue.Queue" = queue.Queue()
+        self._active: Dict[TaskHandle, None] = {}
+        self._poll_id: Optional[str] = None
+        self._closed = False
+
+    def _executor(self, lane: Optional[str]) -> ThreadPoolExecutor:
+        if lane is None:
+            return self._pool
+        executor = self._lanes.get(lane)
+        if executor is None:
+            executor = self._lanes[lane] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"ssh-km-{lane}")
+        return executor
+
+    """
+    Запускает fn(*args, **kwargs) в фоне
+
+    on_done(result) / on_error(exc) вызываются в главном потоке Tk
+    cancellable=True - в fn передаётся именованный аргумент cancel (threading.Event)
+    """
+    def submit(self, fn: Callable, *args: Any,
+               on_done: Optional[Callable[[Any], None]] = None,
+               on_error: Optional[Callable[[BaseException], None]] = None,
+               lane: Optional[str] = None,
+               channel: Optional[str] = None,
+               label: str = "",
+               cancellable: bool = False,
+               **kwargs: Any) -> TaskHandle:
+        handle = TaskHandle(label)
+        if cancellable:
+            kwargs["cancel"] = handle.cancel_event
+
+        if channel is not None:
+            previous = self._channels.get(channel)
+            if previous is not None:
+                previous.cancel()
+            self._channels[channel] = handle
+
+        def run() -> None:
+            if handle.cancelled:
+                self._results.put((handle, None, None, on_done, on_error))
+                return
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                self._results.put((handle, None, e, on_done, on_error))
+            else:
+                self._results.put((handle, result, None, on_done, on_error))
+
+        self._active[handle] = None
+        handle.future = self._executor(lane).submit(run)
+        self._notify_busy()
+        self._schedule_poll()
+        return handle
+
+    def _schedule_poll(self) -> None:
+        if self._poll_id is None and not self._closed:
+            self._poll_id = self.root.after(self.POLL_INTERVAL_MS, self._poll)
+
+    def _poll(self) -> None:
+        self._poll_id = None
+        while True:
+            try:
+                handle, result, error, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._finish(handle)
+            if handle.cancelled:
+                continue
+            try:
+                if error is not None:
+                    if on_error is not None:
+                        on_error(error)
+                    else:
+                        print(f"[ERROR] {handle.label or 'фоновая задача'}: {error}")
+                elif on_done is not None:
+                    on_done(result)
+            except Exception as e:
+                print(f"[ERROR] обработчик задачи: {e}")
+
+        # отменённые до запуска задачи в очередь не попадают
+        for handle in [h for h in self._active if h.future is not None and h.future.cancelled()]:
+            self._finish(handle)
+
+        if self._active:
+            self._schedule_poll()
+
+    def _finish(self, handle: TaskHandle) -> None:
+        if handle in self._active:
+            del self._active[handle]
+            self._notify_busy()
+        for channel, current in list(self._channels.items()):
+            if current is handle:
+                del self._channels[channel]
+
+    def _notify_busy(self) -> None:
+        if self.on_busy_change is None:
+            return
+        labels = [h.label for h in self._active if h.label]
+        self.on_busy_change(len(self._active), labels[-1] if labels else "")
+
+    """
+    Количество незавершённых задач
+    """
+    @property
+    def active_count(self) -> int:
+        return len(self._active)
+
+    """
+    Отменяет все задачи и останавливает пулы (при закрытии окна)
+    """
+    def shutdown(self) -> None:
+        self._closed = True
+        for handle in list(self._active):
+            handle.cancel()
+        if self._poll_id is not None:
+            try:
+                self.root.after_cancel(self._poll_id)
+            except tk.TclError:
+                pass
+            self._poll_id = None
+        self._pool.shutdown(wait=False)
+        for executor in self._lanes.values():
+            executor.shutdown(wait=False)
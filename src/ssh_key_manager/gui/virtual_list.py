@@ -0,0 +1,220 @@
+import tkinter as tk
+from tkinter import ttk
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+
+"""
+Разница между старым и новым списком строк: общий префикс и суффикс
+остаются на месте, середина заменяется
+
+Возвращает (позиция, сколько удалено, сколько вставлено)
+"""
+def diff_rows(old: Sequence, new: Sequence) -> Tuple[int, int, int]:
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[len(old) - 1 - suffix] == new[len(new) - 1 - suffix]:
+        suffix += 1
+    return prefix, len(old) - prefix - suffix, len(new) - prefix - suffix
+
+
+"""
+Виртуальный список: в виджете существуют только видимые строки
+
+Данные (строки для показа и связанные с ними объекты) лежат в Python,
+ttk.Treeview держит ровно height строк и при прокрутке только меняет их
+значения. Обновление данных применяется как разница со старым списком:
+выделение и позиция прокрутки сохраняются, а перерисовка нужна, только
+если изменения попали в видимое окно
+
+columns - [(id, заголовок, ширина)], on_activate(index) - двойной щелчок / Enter
+"""
+class VirtualList(ttk.Frame):
+
+    def __init__(self, master: tk.Misc,
+                 columns: Sequence[Tuple[str, str, int]] = (("name", "", 220),),
+                 height: int = 20,
+                 show_headings: bool = False,
+                 on_activate: Optional[Callable[[int], None]] = None,
+                 on_select: Optional[Callable[[int], None]] = None):
+        super().__init__(master)
+        self.height = height
+        self.on_activate = on_activate
+        self.on_select = on_select
+
+        self._rows: List[tuple] = []
+        self._payloads: List[Any] = []
+        self._top = 0
+        self._selected: Optional[int] = None
+        self._shown: List[Optional[tuple]] = []
+
+        self.tree = ttk.Treeview(self, columns=[c[0] for c in columns],
+                                 show="headings" if show_headings else "",
+                                 height=height, selectmode="browse")
+        for col_id, title, width in columns:
+            self.tree.heading(col_id, text=title)
+            self.tree.column(col_id, width=width, stretch=False)
+        self.tree.pack(side="left", fill="y")
+
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side="left", fill="y")
+
+        tree = self.tree
+        tree.bind("<Button-1>", self._on_click)
+        tree.bind("<Double-1>", self._on_double_click)
+        tree.bind("<Return>", lambda e: self._activate())
+        tree.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, "units"))
+        tree.bind("<Button-4>", lambda e: self.scroll(-1, "units"))
+        tree.bind("<Button-5>", lambda e: self.scroll(1, "units"))
+        tree.bind("<Up>", lambda e: self._move_selection(-1))
+        tree.bind("<Down>", lambda e: self._move_selection(1))
+        tree.bind("<Prior>", lambda e: self._move_selection(-self.height))
+        tree.bind("<Next>", lambda e: self._move_selection(self.height))
+        tree.bind("<Home>", lambda e: self._move_selection(-len(self._rows)))
+        tree.bind("<End>", lambda e: self._move_selection(len(self._rows)))
+
+    """
+    Заменяет содержимое списка
+
+    rows - значения колонок для каждой строки, payloads - связанные объекты
+    (по умолчанию сами строки). Возвращает разницу (позиция, удалено, вставлено)
+    """
+    def set_items(self, rows: Sequence[tuple], payloads: Optional[Sequence[Any]] = None) -> Tuple[int, int, int]:
+        rows = [row if isinstance(row, tuple) else (row,) for row in rows]
+        pos, removed, inserted = diff_rows(self._rows, rows)
+        delta = inserted - removed
+
+        self._rows[pos:pos + removed] = rows[pos:pos + inserted]
+        self._payloads = list(payloads) if payloads is not None else list(rows)
+
+        # выделение и прокрутка: сдвигаем, если они ниже изменённого участка
+        if self._selected is not None:
+            if self._selected >= pos + removed:
+                self._selected += delta
+            elif self._selected >= pos:
+                self._selected = None
+        if self._top >= pos + removed:
+            self._top += delta
+        self._top = max(0, min(self._top, len(self._rows) - self.height))
+
+        # перерисовка, только если изменилась длина или видимое окно
+        visible_end = self._top + self.height
+        if delta or (pos < visible_end and pos + max(removed, inserted) > self._top):
+            self._render()
+        return pos, removed, inserted
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    """
+    Индекс выделенной строки или None
+    """
+    def selected_index(self) -> Optional[int]:
+        return self._selected
+
+    """
+    Объект, связанный с выделенной строкой, или None
+    """
+    def selected_payload(self) -> Any:
+        if self._selected is None or self._selected >= len(self._payloads):
+            return None
+        return self._payloads[self._selected]
+
+    def payload(self, index: int) -> Any:
+        return self._payloads[index]
+
+    """
+    Выделяет строку и прокручивает к ней
+    """
+    def select(self, index: Optional[int]) -> None:
+        if index is not None:
+            index = max(0, min(index, len(self._rows) - 1)) if self._rows else None
+        self._selected = index
+        if index is not None:
+            self.see(index)
+        self._render()
+        if index is not None and self.on_select is not None:
+            self.on_select(index)
+
+    """
+    Прокручивает так, чтобы строка index была видна
+    """
+    def see(self, index: int) -> None:
+        if index < self._top:
+            self._top = index
+        elif index >= self._top + self.height:
+            self._top = index - self.height + 1
+
+    """
+    Прокрутка на amount строк ("units") или страниц ("pages")
+    """
+    def scroll(self, amount: int, what: str = "units") -> str:
+        step = self.height if what.startswith("page") else 1
+        self._scroll_to(self._top + amount * step)
+        return "break"
+
+    def _scroll_to(self, top: int) -> None:
+        top = max(0, min(top, len(self._rows) - self.height))
+        if top != self._top:
+            self._top = top
+            self._render()
+
+    def _on_scrollbar(self, action: str, *args: str) -> None:
+        if action == "moveto":
+            self._scroll_to(int(float(args[0]) * len(self._rows)))
+        elif action == "scroll":
+            self.scroll(int(args[0]), args[1])
+
+    def _render(self) -> None:
+        tree = self.tree
+        visible = self._rows[self._top:self._top + self.height]
+
+        # строк в виджете ровно столько, сколько видно
+        while len(self._shown) < len(visible):
+            tree.insert("", "end", iid=str(len(self._shown)))
+            self._shown.append(None)
+        while len(self._shown) > len(visible):
+            tree.delete(str(len(self._shown) - 1))
+            self._shown.pop()
+
+        for i, row in enumerate(visible):
+            if self._shown[i] != row:
+                tree.item(str(i), values=row)
+                self._shown[i] = row
+
+        if self._selected is not None and self._top <= self._selected < self._top + len(visible):
+            tree.selection_set(str(self._selected - self._top))
+        elif tree.selection():
+            tree.selection_remove(*tree.selection())
+
+        total = len(self._rows)
+        if total:
+            self.scrollbar.set(self._top / total, min(1.0, (self._top + self.height) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _on_click(self, event) -> str:
+        self.tree.focus_set()
+        row = self.tree.identify_row(event.y)
+        if row:
+            self.select(self._top + int(row))
+        return "break"
+
+    def _on_double_click(self, event) -> str:
+        self._on_click(event)
+        self._activate()
+        return "break"
+
+    def _activate(self) -> str:
+        if self._selected is not None and self.on_activate is not None:
+            self.on_activate(self._selected)
+        return "break"
+
+    def _move_selection(self, step: int) -> str:
+        if not self._rows:
+            return "break"
+        current = self._selected if self._selected is not None else (self._top - 1 if step > 0 else self._top)
+        self.select(current + step)
+        return "break"
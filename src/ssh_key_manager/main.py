@@ -1,10 +1,12 @@
 import sys
-import tkinter as tk
-from ssh_key_manager.gui.main_window import MainWindow
+import time
 
 def main():
+    # отсчёт времени до первого кадра начинается до импорта Tk и окна
+    started_at = time.perf_counter()
     try:
-        app = MainWindow()
+        from ssh_key_manager.gui.main_window import MainWindow
+        app = MainWindow(started_at=started_at)
         app.mainloop()
     except Exception as e:
         print(f"[ERROR] Application crashed: {e}", file=sys.stderr)
@@ -0,0 +1,229 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+# журнал действий (JSON lines, одна запись на строку)
+LOG_PATH = Path.home() / ".ssh" / "ssh-gui.log"
+
+# переменная окружения: при "1" журнал включён с самого запуска (CLI, скрипты, aio)
+ENABLE_ENV = "SSH_KEY_MANAGER_AUDIT_LOG"
+
+# при превышении размера файл переименовывается в .1, .2, ...
+MAX_LOG_SIZE = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+
+# как часто фоновый поток сбрасывает буфер на диск (секунды)
+FLUSH_INTERVAL = 1.0
+
+# размер буфера файла: запись идёт пачками, а не по строке
+WRITE_BUFFER_SIZE = 64 * 1024
+
+_STOP = object()
+
+
+"""
+Журнал действий с фоновой записью
+
+log() только кладёт запись в очередь - вызывающий поток не ждёт диска.
+Фоновый поток забирает записи пачками, пишет их в постоянно открытый
+файл и сбрасывает буфер не чаще раза в FLUSH_INTERVAL секунд (без fsync
+на каждую строку). При превышении max_size файл ротируется. Пока журнал
+выключен (enabled=False), записи отбрасываются сразу
+"""
+class AuditLog:
+
+    def __init__(self, path: Path = LOG_PATH, max_size: int = MAX_LOG_SIZE,
+                 backup_count: int = BACKUP_COUNT, flush_interval: float = FLUSH_INTERVAL,
+                 enabled: bool = False):
+        self.path = Path(path)
+        self.max_size = max_size
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+
+    """
+    Добавляет запись {"ts", "event", **fields} в очередь на запись
+    """
+    def log(self, event: str, **fields: Any) -> None:
+        if not self.enabled:
+            return
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds"), "event": event}
+        record.update(fields)
+        self._queue.put(record)
+        if self._thread is None:
+            self._start()
+
+    """
+    Замер длительности операции:
+
+        with audit.timed("key.generate", name=name) as rec:
+            rec["ok"] = generate(...)
+
+    По выходу пишется запись с duration_ms; при исключении - ok=False и error
+    """
+    def timed(self, event: str, **fields: Any) -> "_Timed":
+        return _Timed(self, event, fields)
+
+    """
+    Ждёт, пока все записи из очереди окажутся в файле
+    """
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    """
+    Дописывает очередь, закрывает файл и останавливает поток
+    """
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ssh-km-audit", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        last_flush = time.monotonic()
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            lines = []
+            waiters = []
+            # забираем всё, что накопилось, одной пачкой
+            while item is not None:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    lines.append(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            if lines:
+                self._write(lines)
+            now = time.monotonic()
+            if self._file is not None and (waiters or stop or now - last_flush >= self.flush_interval):
+                try:
+                    self._file.flush()
+                except OSError as e:
+                    print(f"[ERROR] audit_log: {e}")
+                last_flush = now
+            for waiter in waiters:
+                waiter.set()
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with self._lock:
+            self._thread = None
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._file = os.fdopen(fd, "a", encoding="utf-8", buffering=WRITE_BUFFER_SIZE)
+        self._size = os.fstat(fd).st_size
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+        for i in range(self.backup_count - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            os.unlink(self.path)
+
+    def _write(self, lines: List[str]) -> None:
+        try:
+            if self._file is None:
+                self._open()
+            # пачка пишется одним вызовом, но файл ротируется на границе строк
+            chunk: List[str] = []
+            for line in lines:
+                size = len(line.encode("utf-8"))
+                if self._size and self._size + size > self.max_size:
+                    self._file.write("".join(chunk))
+                    chunk = []
+                    self._rotate()
+                    self._open()
+                chunk.append(line)
+                self._size += size
+            self._file.write("".join(chunk))
+        except OSError as e:
+            print(f"[ERROR] audit_log: {e}")
+
+
+class _Timed:
+
+    def __init__(self, audit: AuditLog, event: str, fields: Dict[str, Any]):
+        self.audit = audit
+        self.event = event
+        self.fields = fields
+
+    def __enter__(self) -> Dict[str, Any]:
+        self.started = time.perf_counter()
+        return self.fields
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self.audit.enabled:
+            fields = self.fields
+            fields["duration_ms"] = round((time.perf_counter() - self.started) * 1000, 3)
+            if exc is not None:
+                fields["ok"] = False
+                fields["error"] = str(exc)
+            self.audit.log(self.event, **fields)
+        return False
+
+
+# общий журнал приложения (ядро и GUI); GUI потом включает его по своей настройке
+_audit = AuditLog(enabled=os.environ.get(ENABLE_ENV) == "1")
+atexit.register(_audit.close)
+
+
+def get_audit_log() -> AuditLog:
+    return _audit
+
+
+"""
+Включает или выключает общий журнал (настройка "Вести лог работы в файл")
+"""
+def set_enabled(enabled: bool) -> None:
+    _audit.enabled = enabled
+
+
+def log_event(event: str, **fields: Any) -> None:
+    _audit.log(event, **fields)
+
+
+def timed(event: str, **fields: Any) -> _Timed:
+    return _audit.timed(event, **fields)
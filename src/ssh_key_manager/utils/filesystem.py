@@ -1,12 +1,21 @@
 import shutil
+import stat
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional, Tuple
 import os
 
+from ssh_key_manager.utils import validators
+
+# размер буфера для потокового копирования участков файла
+COPY_BUFFER_SIZE = 1 << 20
+
 """
-Создаёт ~/.ssh, если не существует и устанавливает права
+Создаёт каталог ssh (по умолчанию текущий ~/.ssh), если не существует и устанавливает права
 """
-def ensure_ssh_dir_exists() -> None:
-    ssh_path = Path.home() / ".ssh"
+def ensure_ssh_dir_exists(ssh_path: Optional[Path] = None) -> None:
+    ssh_path = Path(ssh_path) if ssh_path is not None else validators.SSH_DIR
     ssh_path.mkdir(mode=0o700, exist_ok=True)
     os.chmod(ssh_path, 0o700)
 
@@ -72,3 +81,95 @@ def write_file(path: Path, content: str) -> bool:
     except Exception as e:
         print(f"[ERROR] write_file: {e}")
         return False
+
+
+
+"""
+копирование length байт из src в dst большими буферизованными кусками
+(с текущих позиций обоих файлов)
+"""
+def copy_range(src: BinaryIO, dst: BinaryIO, length: int) -> None:
+    if length <= 0:
+        return
+    buf = bytearray(min(COPY_BUFFER_SIZE, length))
+    view = memoryview(buf)
+    while length > 0:
+        n = src.readinto(view[:min(len(buf), length)])
+        if not n:
+            raise EOFError("файл короче ожидаемого")
+        dst.write(view[:n])
+        length -= n
+
+
+"""
+fsync каталога, чтобы rename внутри него пережил сбой питания
+"""
+def fsync_dir(path: Path) -> None:
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+"""
+атомарная запись файла
+пишем во временный файл в том же каталоге, затем fsync и rename поверх
+исходного, при ошибке временный файл удаляется, а исходный не меняется
+права исходного файла сохраняются, симлинк не заменяется (пишем в цель)
+"""
+@contextmanager
+def atomic_write(path: Path, mode: int = 0o600) -> Iterator[BinaryIO]:
+    path = Path(os.path.realpath(path))
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        pass
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fchmod(f.fileno(), mode)
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    fsync_dir(path.parent)
+
+
+"""
+атомарная потоковая правка файла
+edits - (начало, конец, данные) по возрастанию без пересечений: байты
+[начало, конец) заменяются данными (пустые данные - удаление, начало ==
+конец - вставка). Остальное копируется большими кусками, хвост файла после
+последней правки - целиком (даже если файл успел дописаться)
+если файла нет, пишутся только данные правок
+"""
+def splice_file(path: Path, edits: List[Tuple[int, int, bytes]]) -> None:
+    with atomic_write(path) as dst:
+        try:
+            src = open(path, "rb")
+        except FileNotFoundError:
+            for _, _, data in edits:
+                dst.write(data)
+            return
+        with src:
+            pos = 0
+            for start, end, data in edits:
+                copy_range(src, dst, start - pos)
+                dst.write(data)
+                src.seek(end)
+                pos = end
+            shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
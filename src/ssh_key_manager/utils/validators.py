@@ -6,6 +6,8 @@ SSH_DIR = Path.home() / ".ssh"
 
 KEY_NAME_REGEX = re.compile(r'^[a-zA-Z0-9_\-\.]+$')
 HOST_ALIAS_REGEX = re.compile(r'^[a-zA-Z0-9_\-\.]+$')
+# имя параметра ssh_config: буквы и цифры (HostName, IdentityFile, ...)
+CONFIG_OPTION_REGEX = re.compile(r'^[a-zA-Z][a-zA-Z0-9]*$')
 
 """
 Проверка имени файла ключа:
@@ -37,6 +39,22 @@ def is_valid_host_alias(alias: str) -> bool:
     return alias.lower() not in forbidden_hosts
 
 
+"""
+Проверяет имя параметра для блока Host: пробел, "=" или перевод строки
+в имени превратили бы одну строку конфига в другую директиву
+"""
+def is_valid_config_option(name: str) -> bool:
+    return CONFIG_OPTION_REGEX.fullmatch(name) is not None
+
+
+"""
+Проверяет значение параметра: перевод строки в значении дописал бы
+в конфиг отдельную строку (например, ProxyCommand)
+"""
+def is_valid_config_value(value: str) -> bool:
+    return "\n" not in value and "\r" not in value
+
+
 """
 Проверка пути:
 - внутри домашней директории
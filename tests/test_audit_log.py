@@ -0,0 +1,51 @@
+import asyncio
+import json
+import shutil
+
+import pytest
+
+from ssh_key_manager import cli
+from ssh_key_manager.core import aio, key_manager
+from ssh_key_manager.utils import audit_log
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    log = audit_log.get_audit_log()
+    monkeypatch.setattr(log, "path", tmp_path / "audit.log")
+    monkeypatch.setattr(log, "enabled", False)
+    previous = key_manager.SSH_DIR
+    key_manager.set_ssh_dir(tmp_path / ".ssh")
+    yield log
+    log.close()
+    key_manager.set_ssh_dir(previous)
+
+
+def _events(log):
+    assert log.flush(5)
+    if not log.path.exists():
+        return []
+    return [json.loads(line) for line in log.path.read_text().splitlines()]
+
+
+def test_disabled_by_default(journal):
+    audit_log.log_event("test.event")
+    assert _events(journal) == []
+
+
+def test_cli_flag_enables_log(journal, capsys):
+    assert cli.main(["--audit-log", "known-hosts", "--file", str(journal.path.parent / "kh"), "prune"]) == 0
+    assert [e["event"] for e in _events(journal)] == ["known_hosts.remove_stale"]
+
+
+@pytest.mark.skipif(shutil.which("ssh-keygen") is None, reason="нужен ssh-keygen")
+def test_aio_generate_is_logged(journal):
+    journal.enabled = True
+    specs = [key_manager.KeySpec("a"), key_manager.KeySpec("b")]
+    results = asyncio.run(aio.generate_keypairs(specs))
+    assert all(r.success for r in results)
+
+    events = _events(journal)
+    assert sorted(e["name"] for e in events if e["event"] == "key.generate") == ["a", "b"]
+    batch = [e for e in events if e["event"] == "key.generate_batch"]
+    assert len(batch) == 1 and batch[0]["count"] == 2 and batch[0]["ok"] is True
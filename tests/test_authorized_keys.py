@@ -0,0 +1,79 @@
+import base64
+import struct
+
+import pytest
+
+from ssh_key_manager.core.authorized_keys import AuthorizedKeys, parse_line, parse_options
+
+
+def _key(seed: int) -> str:
+    name = b"ssh-ed25519"
+    blob = struct.pack(">I", len(name)) + name + struct.pack(">I", 32) + bytes([seed]) * 32
+    return "ssh-ed25519 " + base64.b64encode(blob).decode("ascii")
+
+
+@pytest.mark.parametrize("options, expected", [
+    ("no-pty", [("no-pty", None)]),
+    ('from="10.0.0.1,10.0.0.2",no-pty', [("from", "10.0.0.1,10.0.0.2"), ("no-pty", None)]),
+    ('command="echo \\"a, b\\"",no-agent-forwarding',
+     [("command", 'echo "a, b"'), ("no-agent-forwarding", None)]),
+    ('environment="A=1",environment="B=x y"', [("environment", "A=1"), ("environment", "B=x y")]),
+])
+def test_parse_options(options, expected):
+    assert parse_options(options) == expected
+
+
+def test_parse_line_with_quoted_spaces():
+    options = 'command="echo \\"hi there\\"; exit",from="a,b"'
+    entry = parse_line(f"{options} {_key(1)} user@host\n")
+    assert entry.options == options
+    assert entry.option_list == [("command", 'echo "hi there"; exit'), ("from", "a,b")]
+    assert (entry.key_type, entry.comment) == ("ssh-ed25519", "user@host")
+
+
+def test_parse_line_rejects_garbage():
+    assert parse_line("# comment") is None
+    assert parse_line("   \n") is None
+    assert parse_line("no-pty ssh-ed25519 AAAAnotakey") is False
+    assert parse_line('command="unterminated ' + _key(1)) is False
+
+
+@pytest.fixture
+def keys_file(tmp_path):
+    lines = [f"{_key(1)} первый\n",
+             "garbage line\n",
+             f'command="echo \\"x y\\"" {_key(2)} второй\r\n',
+             f"no-pty {_key(1)} повтор\n",
+             "# комментарий\n",
+             f"{_key(2)} ещё повтор"]
+    path = tmp_path / "authorized_keys"
+    path.write_bytes("".join(lines).encode("utf-8"))
+    return path, lines
+
+
+def test_byte_spans(keys_file):
+    path, lines = keys_file
+    data = path.read_bytes()
+    for entry in AuthorizedKeys(path).entries:
+        assert data[entry.start:entry.end] == lines[entry.line - 1].encode("utf-8")
+
+
+def test_dedupe_removes_exact_spans(keys_file):
+    path, lines = keys_file
+    doc = AuthorizedKeys(path)
+    assert [e.line for e in doc.duplicates()] == [4, 6]
+    assert doc.dedupe() == 2
+    assert path.read_bytes() == "".join(lines[:3] + lines[4:5]).encode("utf-8")
+    assert [e.line for e in doc.entries] == [1, 3]
+    assert doc.invalid == [(2, len(lines[0].encode()), len("".join(lines[:2]).encode()))]
+
+
+def test_remove_and_add(keys_file):
+    path, lines = keys_file
+    doc = AuthorizedKeys(path)
+    assert doc.remove([_key(2)]) == 2
+    assert path.read_bytes() == "".join(lines[:2] + lines[3:5]).encode("utf-8")
+
+    assert doc.add([f"{_key(1)} again", f"{_key(3)} new", "junk"], options="no-pty") == ["exists", "added", "invalid"]
+    assert path.read_text().endswith(f"no-pty {_key(3)} new\n")
+    assert _key(3) in doc
@@ -0,0 +1,24 @@
+from benchmarks.runner import compare, temporary_home
+from ssh_key_manager.core import authorized_keys, key_manager, known_hosts, ssh_config
+
+
+def test_temporary_home_restores_paths(tmp_path):
+    before = (key_manager.SSH_DIR, ssh_config.CONFIG_PATH, known_hosts.KNOWN_HOSTS_PATH,
+              authorized_keys.AUTHORIZED_KEYS_PATH)
+    with temporary_home(tmp_path):
+        assert key_manager.SSH_DIR == tmp_path / ".ssh"
+        assert ssh_config.CONFIG_PATH == tmp_path / ".ssh" / "config"
+        assert authorized_keys.AUTHORIZED_KEYS_PATH == tmp_path / ".ssh" / "authorized_keys"
+    assert (key_manager.SSH_DIR, ssh_config.CONFIG_PATH, known_hosts.KNOWN_HOSTS_PATH,
+            authorized_keys.AUTHORIZED_KEYS_PATH) == before
+
+
+def _results(**ops):
+    return {"results": {"small": {op: {"min": low, "median": median} for op, (low, median) in ops.items()}}}
+
+
+def test_compare_uses_best_run():
+    baseline = _results(fast=(0.00002, 0.00002), slow=(0.010, 0.010), noisy=(0.010, 0.010))
+    current = _results(fast=(0.0002, 0.0002), slow=(0.020, 0.021), noisy=(0.010, 0.050))
+    # короткая операция, выросшая в 10 раз, - регрессия; шумная медиана при том же минимуме - нет
+    assert [(op, ratio) for _, op, _, _, ratio in compare(current, baseline)] == [("fast", 10.0), ("slow", 2.0)]
@@ -0,0 +1,28 @@
+import json
+
+from ssh_key_manager import cli
+from ssh_key_manager.core import lint
+
+
+def _run(capsys, *argv):
+    code = cli.main(list(argv))
+    return code, json.loads(capsys.readouterr().out)
+
+
+def test_command_error_is_json(tmp_path, capsys):
+    code, out = _run(capsys, "lint", "--file", str(tmp_path / "missing"))
+    assert code == 0 and out["ok"] is True
+
+    code, out = _run(capsys, "known-hosts", "--file", str(tmp_path / "kh"), "prune", "--host", "web")
+    assert code == 1 and out["ok"] is False and "--keep" in out["error"]
+
+
+def test_unexpected_error_is_json(tmp_path, capsys, monkeypatch):
+    def broken(path=None):
+        raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+
+    monkeypatch.setattr(lint, "lint", broken)
+    code, out = _run(capsys, "lint", "--file", str(tmp_path / "config"))
+    assert code == 1
+    assert out == {"ok": False, "error": "UnicodeDecodeError: 'utf-8' codec can't decode byte 0xff in position 0: "
+                                         "invalid start byte"}
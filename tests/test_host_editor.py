@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("tkinter")
+
+from ssh_key_manager.core import key_manager, ssh_config
+from ssh_key_manager.gui.main_window import HOST_FIELDS, host_entry_from_fields, host_field_value
+
+
+@pytest.fixture
+def ssh_dir(tmp_path):
+    previous = key_manager.SSH_DIR
+    key_manager.set_ssh_dir(tmp_path)
+    yield tmp_path
+    key_manager.set_ssh_dir(previous)
+
+
+def _existing(host):
+    # как MainWindow передаёт выбранный блок в _host_editor_dialog
+    block = next(b for b in ssh_config.read_config() if b.get("host") == host)
+    return {"Host": block.get("host", ""), **block.get("params", {})}
+
+
+def test_editor_round_trip(ssh_dir):
+    (ssh_dir / "config").write_text("Host web\n    hostname 10.0.0.1\n    User old\n")
+
+    existing = _existing("web")
+    fields = {option: host_field_value(existing, option) for _, option in HOST_FIELDS}
+    assert fields == {"HostName": "10.0.0.1", "User": "old", "Port": "", "IdentityFile": ""}
+
+    fields.update(User=" deploy ", Port="2222")
+    entry = host_entry_from_fields("web", fields)
+    assert entry == {"Host": "web", "HostName": "10.0.0.1", "User": "deploy", "Port": "2222"}
+    assert ssh_config.entry_problem(entry) is None
+    ssh_config.add_or_update_host(entry)
+
+    existing = _existing("web")
+    assert [host_field_value(existing, option) for _, option in HOST_FIELDS] == ["10.0.0.1", "deploy", "2222", ""]
+
+
+def test_new_host_with_every_field(ssh_dir):
+    fields = {option: f"value-{n}" for n, (_, option) in enumerate(HOST_FIELDS)}
+    entry = host_entry_from_fields("db", fields)
+    # подписи полей в конфиг не попадают
+    assert set(entry) == {"Host", "HostName", "User", "Port", "IdentityFile"}
+    ssh_config.add_or_update_host(entry)
+    assert ssh_config.get_host_entry("db")["IdentityFile"] == "value-3"
@@ -0,0 +1,38 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from ssh_key_manager.core import inventory
+
+pytestmark = pytest.mark.skipif(shutil.which("ssh-keygen") is None, reason="нужен ssh-keygen")
+
+
+def _keygen(path, comment="test"):
+    subprocess.run(["ssh-keygen", "-q", "-t", "ed25519", "-N", "", "-C", comment, "-f", str(path)], check=True)
+
+
+def test_scan_root_skips_links_and_fifos(tmp_path):
+    secret = tmp_path / "secret.pub"
+    secret.write_text("ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIOuter outer\n")
+    root = tmp_path / ".ssh"
+    root.mkdir()
+    _keygen(root / "plain", "plain")
+    _keygen(root / "fifo_pub")
+    (root / "fifo_pub.pub").unlink()
+    os.mkfifo(root / "fifo_pub.pub")
+    _keygen(root / "linked_pub")
+    (root / "linked_pub.pub").unlink()
+    (root / "linked_pub.pub").symlink_to(secret)
+    os.mkfifo(root / "pipe")
+    (root / "alias").symlink_to(root / "plain")
+
+    records = {r.name: r for r in inventory.scan_root(root)}
+
+    assert sorted(records) == ["fifo_pub", "linked_pub", "plain"]
+    assert records["plain"].has_public and records["plain"].comment == "plain"
+    # .pub-FIFO и .pub-ссылка не читаются: сведения берутся из приватного ключа
+    assert not records["fifo_pub"].has_public
+    assert not records["linked_pub"].has_public
+    assert records["linked_pub"].comment == "test"
@@ -0,0 +1,146 @@
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from ssh_key_manager.core.known_hosts import KnownHosts
+
+pytestmark = pytest.mark.skipif(shutil.which("ssh-keygen") is None, reason="нужен ssh-keygen")
+
+
+def _public_key(tmp_path: Path, name: str, key_type: str = "ed25519") -> str:
+    subprocess.run(["ssh-keygen", "-q", "-t", key_type, "-N", "", "-C", "", "-f", str(tmp_path / name)],
+                   check=True)
+    return " ".join((tmp_path / f"{name}.pub").read_text().split()[:2])
+
+
+def _keygen_lines(path: Path, *args: str) -> list:
+    out = subprocess.run(["ssh-keygen", "-f", str(path), *args], capture_output=True, text=True).stdout
+    return [line for line in out.splitlines() if line and not line.startswith("#")]
+
+
+def _marked_key(line: str) -> str:
+    fields = line.split()
+    marker = [fields.pop(0)] if fields[0].startswith("@") else []
+    return " ".join(marker + fields[1:3])
+
+
+@pytest.fixture
+def hashed(tmp_path):
+    keys = {name: _public_key(tmp_path, name) for name in ("a", "b", "c", "d", "e", "f")}
+    path = tmp_path / "known_hosts"
+    path.write_text(f"web.example.com {keys['a']}\n"
+                    f"[web.example.com]:2222 {keys['b']}\n"
+                    f"db.example.com,10.0.0.5 {keys['c']}\n")
+    subprocess.run(["ssh-keygen", "-q", "-H", "-f", str(path)], check=True, capture_output=True)
+    # маркеры и шаблоны ssh-keygen -H не хэширует - дописываем открытыми
+    with open(path, "a") as f:
+        f.write(f"@revoked db.example.com {keys['d']}\n"
+                f"@cert-authority *.example.com {keys['e']}\n"
+                f"*.example.com {keys['f']}\n")
+    return path, keys
+
+
+@pytest.mark.parametrize("host, port", [("web.example.com", 22), ("web.example.com", 2222),
+                                        ("db.example.com", 22), ("10.0.0.5", 22), ("missing.example.com", 22)])
+def test_hashed_lookup_matches_keygen(hashed, host, port):
+    path, _ = hashed
+    name = host if port == 22 else f"[{host}]:{port}"
+    expected = sorted(_marked_key(line) for line in _keygen_lines(path, "-F", name))
+    found = sorted(f"{e.marker or ''} {e.key_type} {e.key}".strip() for e in KnownHosts(path).lookup(host, port))
+    assert found == expected
+
+
+@pytest.mark.parametrize("host", ["db.example.com", "web.example.com"])
+def test_remove_host_matches_keygen(hashed, tmp_path, host):
+    path, _ = hashed
+    copy = tmp_path / "known_hosts.keygen"
+    shutil.copy(path, copy)
+    subprocess.run(["ssh-keygen", "-q", "-R", host, "-f", str(copy)], check=True, capture_output=True)
+
+    # строка хоста и шаблон *.example.com удаляются, @revoked и @cert-authority остаются
+    assert KnownHosts(path).remove_host(host) == 2
+    assert path.read_text() == copy.read_text()
+    assert "@revoked" in path.read_text() and "@cert-authority" in path.read_text()
+
+
+def test_stale_only_reports_invalid_lines(hashed):
+    path, _ = hashed
+    valid = path.read_text()
+    with open(path, "a") as f:
+        f.write("broken-line ssh-ed25519\n")
+    doc = KnownHosts(path)
+    assert doc.stale() == [len(valid.splitlines()) + 1]
+    assert doc.remove_stale() == 1
+    assert path.read_text() == valid
+
+
+def test_superseded_requires_kept_key(tmp_path):
+    old, new = _public_key(tmp_path, "old"), _public_key(tmp_path, "new")
+    ecdsa = _public_key(tmp_path, "ec", "ecdsa")
+    path = tmp_path / "known_hosts"
+    path.write_text(f"web {old}\nweb {new}\nweb {ecdsa}\n*.web {old}\n")
+    doc = KnownHosts(path)
+
+    # два ключа одного типа - не повод что-то удалять без явного указания
+    assert doc.stale() == []
+    with pytest.raises(ValueError):
+        doc.superseded("web", "ssh-ed25519 AAAAnotthere")
+    assert doc.superseded("web", new) == [1]
+    assert doc.remove_superseded("web", new) == 1
+    assert path.read_text() == f"web {new}\nweb {ecdsa}\n*.web {old}\n"
+
+
+def test_remove_lines_rejects_other_parse(tmp_path):
+    key = _public_key(tmp_path, "a")
+    path = tmp_path / "known_hosts"
+    path.write_text(f"one {key}\ntwo {key}\n")
+    doc = KnownHosts(path)
+    lines = [e.line for e in doc.entries if e.hosts == "one"]
+    stamp = doc.stamp
+
+    # файл заменён: номер строки 1 теперь указывает на другой хост
+    replacement = tmp_path / "known_hosts.new"
+    replacement.write_text(f"two {key}\n")
+    replacement.replace(path)
+    assert doc.remove_lines(lines, stamp) == 0
+    assert path.read_text() == f"two {key}\n"
+
+    doc.reload()
+    assert doc.remove_lines([1], None) == 0
+    assert doc.remove_lines([1], doc.stamp) == 1
+    assert path.read_text() == ""
+
+
+def test_remove_lines_rejects_rewrite_in_place(tmp_path):
+    key = _public_key(tmp_path, "a")
+    path = tmp_path / "known_hosts"
+    path.write_text(f"one {key}\ntwo {key}\n")
+    doc = KnownHosts(path)
+    lines = [e.line for e in doc.entries if e.hosts == "one"]
+    stamp = doc.stamp
+
+    # тот же inode и размер, но строки поменялись местами
+    with open(path, "r+") as f:
+        f.write(f"two {key}\none {key}\n")
+    assert doc.remove_lines(lines, stamp) == 0
+    assert path.read_text() == f"two {key}\none {key}\n"
+
+    assert doc.remove_host("one") == 1
+    assert path.read_text() == f"two {key}\n"
+
+
+def test_remove_lines_after_append(tmp_path):
+    key = _public_key(tmp_path, "a")
+    path = tmp_path / "known_hosts"
+    path.write_text(f"one {key}\ntwo {key}\n")
+    doc = KnownHosts(path)
+    lines = [e.line for e in doc.entries if e.hosts == "one"]
+    stamp = doc.stamp
+
+    # ssh дописал новый ключ в конец - разобранные строки на месте
+    with open(path, "a") as f:
+        f.write(f"three {key}\n")
+    assert doc.remove_lines(lines, stamp) == 1
+    assert path.read_text() == f"two {key}\nthree {key}\n"
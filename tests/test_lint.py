@@ -0,0 +1,108 @@
+from ssh_key_manager.core import lint
+
+
+def _lint(tmp_path, text, **included):
+    for name, body in included.items():
+        (tmp_path / name).write_text(body)
+    config = tmp_path / "config"
+    config.write_text(text)
+    return lint.lint(config)
+
+
+def _codes(issues):
+    return sorted((issue.code, issue.line, issue.block) for issue in issues)
+
+
+def test_clean_config(tmp_path):
+    key = tmp_path / "id_ed25519"
+    key.write_text("")
+    assert _lint(tmp_path, f"Host web\n    HostName 10.0.0.1\n    IdentityFile {key}\n"
+                           "Host db\n    Port 2222\nHost *\n    User admin\n") == []
+
+
+def test_duplicate_host(tmp_path):
+    issues = _lint(tmp_path, "Host web\n    Port 22\nHost web\n    HostName 10.0.0.1\n")
+    assert _codes(issues) == [("duplicate-host", 3, "Host web")]
+    assert issues[0].severity == "warning"
+
+
+def test_shadowed_host(tmp_path):
+    issues = _lint(tmp_path, "Host *.corp\n    Port 2200\nHost web.corp\n    Port 22\n")
+    assert _codes(issues) == [("shadowed-host", 3, "Host web.corp")]
+
+
+def test_overridden_option(tmp_path):
+    issues = _lint(tmp_path, "Host *.corp\n    Port 2200\nHost web.corp\n    Port 22\n    User deploy\n")
+    assert _codes(issues) == [("overridden-option", 4, "Host web.corp")]
+
+
+def test_global_lines_cover_hosts(tmp_path):
+    issues = _lint(tmp_path, "User admin\nHost web\n    User root\n    Port 22\n")
+    assert _codes(issues) == [("overridden-option", 3, "Host web")]
+
+
+def test_repeated_option(tmp_path):
+    issues = _lint(tmp_path, "Host app\n    HostName 1.2.3.4\n    HostName 5.6.7.8\n")
+    assert _codes(issues) == [("repeated-option", 3, "Host app")]
+    assert issues[0].severity == "info"
+
+
+def test_multi_value_options_are_not_repeated(tmp_path):
+    assert _lint(tmp_path, "Host app\n    LocalForward 1 a:1\n    LocalForward 2 b:2\n") == []
+
+
+def test_unknown_option(tmp_path):
+    issues = _lint(tmp_path, "Host app\n    Colour red\n")
+    assert _codes(issues) == [("unknown-option", 2, "Host app")]
+    assert issues[0].severity == "error"
+
+
+def test_ignore_unknown(tmp_path):
+    assert _lint(tmp_path, "IgnoreUnknown Colour,Use*\nHost app\n    Colour red\n    UseFoo yes\n") == []
+
+
+def test_missing_identity(tmp_path):
+    issues = _lint(tmp_path, f"Host app\n    IdentityFile {tmp_path}/missing\n")
+    assert _codes(issues) == [("missing-identity", 2, "Host app")]
+
+
+def test_identity_host_token(tmp_path):
+    (tmp_path / "key-web").write_text("")
+    issues = _lint(tmp_path, f"Host web db\n    IdentityFile {tmp_path}/key-%h\n"
+                             f"Host web\n    IdentityFile {tmp_path}/key-%h\n")
+    # у блока с несколькими именами %h не раскрывается - проверять нечего
+    assert _codes(issues) == []
+
+
+def test_included_file_lines(tmp_path):
+    issues = _lint(tmp_path, "Include inc\nHost web\n    Port 22\n",
+                   inc="Host app\n    Colour red\n")
+    assert [(issue.path.name, issue.line, issue.code) for issue in issues] == [("inc", 2, "unknown-option")]
+
+
+def test_lines_after_include_belong_to_block(tmp_path):
+    issues = _lint(tmp_path, "Host app\n    Include inc\n    Colour red\n", inc="Port 22\n")
+    assert _codes(issues) == [("unknown-option", 3, "Host app")]
+
+
+def test_guarded_include_does_not_cover(tmp_path):
+    # Host * из файла, подключённого внутри Host a, действует только для a - b он не покрывает
+    issues = _lint(tmp_path, "Host a\n    Include inc\nHost b\n    User y\n", inc="Host *\n    User x\n")
+    assert issues == []
+
+
+def test_summarize(tmp_path):
+    issues = _lint(tmp_path, "Host app\n    Colour red\n    HostName a\n    HostName b\n")
+    assert lint.summarize(issues) == {"error": 1, "warning": 0, "info": 1}
+
+
+def test_deprecated_options_are_warnings(tmp_path):
+    issues = _lint(tmp_path, "Host old\n    UseRoaming no\n    RSAAuthentication yes\n    HostName a\n")
+    assert _codes(issues) == [("deprecated-option", 2, "Host old"), ("deprecated-option", 3, "Host old")]
+    assert {issue.severity for issue in issues} == {"warning"}
+
+
+def test_distro_options(tmp_path):
+    issues = _lint(tmp_path, "Host krb\n    GSSAPIKexAlgorithms gss-curve25519-sha256-\n")
+    assert [(issue.severity, issue.code, issue.line) for issue in issues] == [("warning", "distro-option", 2)]
+    assert _lint(tmp_path, "IgnoreUnknown GSSAPIKex*\nHost krb\n    GSSAPIKexAlgorithms x\n") == []
@@ -0,0 +1,71 @@
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+from ssh_key_manager.core import key_manager, rotation, ssh_config
+
+pytestmark = pytest.mark.skipif(shutil.which("ssh-keygen") is None, reason="нужен ssh-keygen")
+
+
+@pytest.fixture
+def ssh_dir(tmp_path):
+    previous = key_manager.SSH_DIR
+    key_manager.set_ssh_dir(tmp_path)
+    yield tmp_path
+    key_manager.set_ssh_dir(previous)
+
+
+def _keygen(ssh_dir, name):
+    subprocess.run(["ssh-keygen", "-q", "-t", "ed25519", "-N", "", "-C", name, "-f", str(ssh_dir / name)],
+                   check=True)
+
+
+def test_default_identity_without_references(ssh_dir):
+    _keygen(ssh_dir, "id_ed25519")
+    (ssh_dir / "config").write_text("Host web\n    HostName 10.0.0.1\n")
+
+    plan = rotation.plan_rotation(["id_ed25519"])
+    assert plan.items == [] and "IdentityFile" in plan.problems["id_ed25519"]
+    assert [item.old_name for item in rotation.plan_rotation(["id_ed25519"], allow_defaults=True).items] \
+        == ["id_ed25519"]
+
+    (ssh_dir / "config").write_text(f"Host web\n    IdentityFile {ssh_dir}/id_ed25519\n")
+    plan = rotation.plan_rotation(["id_ed25519"])
+    assert plan.problems == {} and len(plan.items[0].references) == 1
+
+
+def test_rollback_holds_config_lock(ssh_dir, monkeypatch):
+    _keygen(ssh_dir, "deploy")
+    config = ssh_dir / "config"
+    original = f"Host web\n    IdentityFile {ssh_dir}/deploy\n"
+    config.write_text(original)
+    plan = rotation.plan_rotation(["deploy"])
+    # архив не создать - ротация откатывается после записи конфига
+    plan.archive_dir.parent.write_text("")
+
+    blocked = []
+
+    def probe():
+        try:
+            with ssh_config.config_lock(timeout=0.2):
+                blocked.append(False)
+        except TimeoutError:
+            blocked.append(True)
+
+    restore = rotation._restore_config
+
+    def checked_restore(backups):
+        assert config.read_text() != original
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+        restore(backups)
+
+    monkeypatch.setattr(rotation, "_restore_config", checked_restore)
+    with pytest.raises(RuntimeError):
+        rotation.rotate(plan)
+    assert blocked == [True]
+    assert config.read_text() == original
+    assert (ssh_dir / "deploy").exists() and not (ssh_dir / plan.items[0].new_name).exists()